@@ -38,5 +38,6 @@ setup(
                       'netCDF4==1.5.3',
                       'defusedxml==0.6.0',
                       'jupyter==1.0.0',
-                      'pyinstaller==4.10']
+                      'pyinstaller==4.10'],
+    extras_require={'columnar': ['pyarrow==15.0.2']}
 )
@@ -12,6 +12,7 @@ from .processing.storm_graph_utilities import *
 from .processing.storm_netCDF import *
 from .processing.storm_options import *
 from .processing.storm_statistics import *
+from .processing.storm_tide_stream import *
 from .processing.wave_stats import *
 
 from .utilities.csv_readers import *
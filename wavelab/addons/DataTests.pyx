@@ -2,7 +2,7 @@ import numpy as np
 cimport numpy as np
 cimport cython
 
-DTYPE = np.int
+DTYPE = np.int_
 DTYPE2 = np.double
 
 ctypedef np.int_t DTYPE_t
@@ -22,11 +22,11 @@ cdef int check_4
 
 @cython.boundscheck(False)
 def run_tests(np.ndarray[DTYPE2_t, ndim=1] data, int interpolate, int air):
-    '''Get the quality control flags of a pressure time series'''
+    '''Get the uint8 quality control flags (see wavelab.utilities.qc) of a pressure time series'''
     
-    qc = []
     bad_data = False
     length = data.shape[0]
+    cdef np.ndarray[np.uint8_t, ndim=1] qc = np.empty(length, dtype=np.uint8)
     
     if interpolate == 0:
         check_4 = 255
@@ -65,7 +65,7 @@ def run_tests(np.ndarray[DTYPE2_t, ndim=1] data, int interpolate, int air):
         else:
             check_3 = 255
             
-        qc.append(bin(check_1 & check_2 & check_3 & check_4)[2:])
+        qc[x] = check_1 & check_2 & check_3 & check_4
 
     if bad_data:
         error_message = "There were some bad data points in the file, please cut them using chopper\n and/or" \
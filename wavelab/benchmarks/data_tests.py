@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+"""
+Checks qc.run_tests against the compiled DataTests addon (or a line by line
+transcription of it when the addon is not built) on the pressure records in
+documentation/data and synthetic records with bad readings, and times them and
+the qc.QCSuite tests on a synthetic 4hz record.
+
+    python ./wavelab/addons/cython_setup.py build_ext --inplace
+    python -m wavelab.benchmarks.data_tests --days 30
+"""
+import os
+import sys
+import timeit
+import argparse
+import numpy as np
+from wavelab.utilities import nc, qc
+
+try:
+    import wavelab.addons.DataTests as DataTests
+    data_test_import = True
+except ImportError:
+    data_test_import = False
+
+DATA_DIR = os.path.join(os.path.dirname(__file__), '..', '..', 'documentation', 'data')
+
+
+def reference_run_tests(data, interpolate, air):
+    """The loop of DataTests.pyx in Python"""
+    flags = np.empty(len(data), dtype=np.uint8)
+    bad_data = False
+    check_4 = 255 if interpolate == 0 else 247
+    upper = 20 if air == 1 else 50
+
+    for x in range(len(data)):
+        check_1 = 255
+        if data[x] > upper or data[x] < 0:
+            check_2 = 253
+            bad_data = True
+        else:
+            check_2 = 255
+        if x > 0 and (data[x] - data[x - 1] > 10 or data[x] - data[x - 1] < -10):
+            check_3 = 251
+            bad_data = True
+        else:
+            check_3 = 255
+        flags[x] = check_1 & check_2 & check_3 & check_4
+
+    return flags, bad_data
+
+
+def reference():
+    if data_test_import is True:
+        return 'DataTests', lambda data, interpolate, air: \
+            DataTests.run_tests(np.asarray(data, dtype=np.double), interpolate, air)
+    return 'python reference', reference_run_tests
+
+
+def sample_records():
+    """(name, pressure, air) of the documentation data"""
+    records = []
+    for fname in sorted(os.listdir(DATA_DIR)) if os.path.isdir(DATA_DIR) else []:
+        path = os.path.join(DATA_DIR, fname)
+        if not fname.endswith('.nc'):
+            continue
+        for name, air in [('sea_pressure', False), ('air_pressure', True)]:
+            if name in nc.open_dataset(path).dataset.variables:
+                records.append((fname, np.asarray(nc.get_variable_data(path, name),
+                                                  dtype=np.float64), air))
+    return records
+
+
+def synthetic_record(days, fs=4, seed=0, bad=True):
+    """Sea pressure in dbar with out of range readings, spikes, jumps and gaps"""
+    rng = np.random.RandomState(seed)
+    t = np.arange(int(days * 86400 * fs)) / fs
+    data = 10.0 + 0.5 * np.sin(2 * np.pi * t / 44712.0) + 0.01 * rng.randn(len(t))
+    if bad:
+        index = rng.randint(0, len(data), (4, max(len(data) // 10000, 1)))
+        data[index[0]] = -1.0
+        data[index[1]] += 45.0
+        data[index[2]] += rng.choice([-10.5, 10.5], index.shape[1])
+        data[index[3]] = np.nan
+    return data
+
+
+def compare(name, data, air, interpolate=False):
+    ref_name, ref_func = reference()
+    expected, expected_bad = ref_func(data, int(interpolate), int(air))
+    flags, bad_data = qc.run_tests(data, interpolate=interpolate, air=air)
+    same = np.array_equal(qc.as_flags(expected), flags) and bool(expected_bad) == bad_data
+    sys.stdout.write('%-38s air=%-5s interpolate=%-5s %6d flagged  %s %s\n'
+                     % (name, air, interpolate, np.count_nonzero(flags != qc.PASSED),
+                        'matches' if same else 'DIFFERS from', ref_name))
+    return same
+
+
+def time_tests(func, data, repeat=3):
+    """Best time of one call in seconds"""
+    return min(timeit.Timer(lambda: func(data)).repeat(repeat=repeat, number=1))
+
+
+def run(days=30):
+    checks = []
+    for name, data, air in sample_records():
+        checks.append(compare(name, data, air))
+    for air in (False, True):
+        for interpolate in (False, True):
+            data = synthetic_record(1, seed=int(air))
+            checks.append(compare('synthetic 1 day 4hz', data, air, interpolate))
+
+    data = synthetic_record(days)
+    sys.stdout.write('\n%g days at 4hz (%d samples)\n' % (days, len(data)))
+    sys.stdout.write('qc.run_tests          %8.3f s\n' % time_tests(qc.run_tests, data))
+    if data_test_import is True:
+        sys.stdout.write('DataTests.run_tests   %8.3f s\n'
+                         % time_tests(lambda x: DataTests.run_tests(x, 0, 0), data))
+    else:
+        sys.stdout.write('DataTests is not built, python reference on one day\n')
+        one_day = data[:4 * 86400]
+        sys.stdout.write('qc.run_tests          %8.3f s\n' % time_tests(qc.run_tests, one_day))
+        sys.stdout.write('reference_run_tests   %8.3f s\n'
+                         % time_tests(lambda x: reference_run_tests(x, 0, 0), one_day, repeat=1))
+
+    sys.stdout.write('\nQCSuite tests on %g days\n' % days)
+    suite = qc.QCSuite(list(qc.TESTS))
+    time = np.arange(len(data)) * 250.0
+    for name in qc.TESTS:
+        seconds = time_tests(lambda x: suite.failed(name, x, time), data)
+        sys.stdout.write('%-22s %8.3f s\n' % (name, seconds))
+
+    return all(checks)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Check and benchmark the pressure data tests.')
+    parser.add_argument('--days', type=float, default=30,
+                        help='length of the synthetic 4hz record used for timing')
+    args = parser.parse_args(sys.argv[1:])
+    run(args.days)
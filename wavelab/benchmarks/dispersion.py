@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+Times the wavenumber solvers in pressure_to_depth.DISPERSION_SOLVERS over
+realistic (window depth x frequency) grids and reports their error against
+a high precision (extended float) solution of the dispersion relation.
+
+    python -m wavelab.benchmarks.dispersion --budget 1e-6
+"""
+import sys
+import timeit
+import argparse
+import numpy as np
+from wavelab.processing import pressure_to_depth as p2d
+from wavelab.processing.wave_stats import band_average_operator
+
+# (minimum depth, maximum depth) in meters of typical deployments
+DEPTH_RANGES = {
+    'shallow': (0.1, 2.0),
+    'nearshore': (1.0, 15.0),
+    'offshore': (10.0, 100.0)
+}
+
+
+def make_grid(depth_range, n_windows=500, window_length=4096, fs=4):
+    """Band averaged wave statistics frequencies against one depth per window"""
+    freqs = band_average_operator(window_length, 1.0 / fs, 32, 0.033333333333, 1.0).freqs
+    omega = 2 * np.pi * freqs[np.newaxis, :]
+    depths = np.linspace(depth_range[0], depth_range[1], n_windows)[:, np.newaxis]
+    return omega, depths
+
+
+def reference_omega_to_k(omega, h):
+    """Solve the dispersion relation in extended precision"""
+    x = np.asarray(omega, dtype=np.longdouble)**2 * np.asarray(h, dtype=np.longdouble) / p2d.GRAVITY
+    return p2d._solve_kh(x, tolerance=1e-18, max_iterations=100, dtype=np.longdouble) / h
+
+
+def time_solver(solver, omega, h, repeat=5, number=10):
+    """Best time of one call in seconds"""
+    timer = timeit.Timer(lambda: solver(omega, h))
+    return min(timer.repeat(repeat=repeat, number=number)) / number
+
+
+def max_relative_error(k, reference):
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return float(np.nanmax(np.abs(np.asarray(k, dtype=np.longdouble) / reference - 1)))
+
+
+def run(n_windows=500, budget=None):
+    """Benchmark every solver on every depth range, return
+    {depth range: [(solver, seconds, max relative error)]}"""
+    
+    # build the lookup table up front so its one time cost is not timed
+    p2d.table_omega_to_k(1.0, 1.0)
+    
+    results = {}
+    for name, depth_range in DEPTH_RANGES.items():
+        omega, h = make_grid(depth_range, n_windows)
+        reference = reference_omega_to_k(omega, h)
+        results[name] = [(method,
+                          time_solver(solver, omega, h),
+                          max_relative_error(solver(omega, h), reference))
+                         for method, solver in p2d.DISPERSION_SOLVERS.items()]
+        
+        sys.stdout.write('\n%s: %d depths from %g to %g m x %d frequencies\n'
+                         % (name, h.shape[0], depth_range[0], depth_range[1], omega.shape[1]))
+        sys.stdout.write('%-12s %12s %16s\n' % ('solver', 'time (ms)', 'max rel. error'))
+        for method, seconds, error in sorted(results[name], key=lambda x: x[1]):
+            sys.stdout.write('%-12s %12.3f %16.2e\n' % (method, seconds * 1e3, error))
+        
+        if budget is not None:
+            sys.stdout.write('fastest within %g: %s\n' % (budget, fastest_solver(results[name], budget)))
+    
+    return results
+
+
+def fastest_solver(results, budget):
+    """Name of the fastest solver whose maximum relative error is within budget"""
+    passing = [x for x in results if x[2] <= budget]
+    if len(passing) == 0:
+        return None
+    return min(passing, key=lambda x: x[1])[0]
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark the dispersion relation solvers.')
+    parser.add_argument('--windows', type=int, default=500,
+                        help='number of wave statistics windows (depths) in each grid')
+    parser.add_argument('--budget', type=float, default=None,
+                        help='maximum relative error allowed when choosing a solver')
+    args = parser.parse_args(sys.argv[1:])
+    run(args.windows, args.budget)
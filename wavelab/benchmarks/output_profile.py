@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""
+Compares the size, write time and windowed read time of storm tide and wave
+statistics netCDF files written with each of nc.OUTPUT_PROFILES on a
+synthetic 4hz record.
+
+    python -m wavelab.benchmarks.output_profile --days 7
+"""
+import os
+import sys
+import shutil
+import tempfile
+import timeit
+import argparse
+import numpy as np
+from netCDF4 import Dataset
+from wavelab.utilities import nc
+
+WINDOW = 4096
+STEP = 2048
+FREQUENCIES = 129
+
+
+def synthetic_record(days, fs=4, seed=0):
+    """Time in ms, sea pressure quantized to the 0.1 mm of a pressure logger
+    and the water level derived from it"""
+    rng = np.random.RandomState(seed)
+    t = np.arange(int(days * 86400 * fs)) / fs
+    pressure = (10.0 + 0.8 * np.sin(2 * np.pi * t / 44712.0)
+                + 0.2 * np.sin(2 * np.pi * 0.12 * t) + 0.02 * rng.randn(len(t)))
+    pressure = np.round(pressure, 4)
+    water_level = pressure / 1.0055 - 9.0
+    return t * 1000, pressure, water_level
+
+
+def synthetic_spectra(n_windows, seed=0):
+    rng = np.random.RandomState(seed)
+    freq = np.linspace(0.0, 0.5, FREQUENCIES)
+    shape = np.exp(-((freq - 0.12) / 0.03) ** 2)
+    return freq, shape[np.newaxis, :] * rng.gamma(16, 1 / 16., (n_windows, FREQUENCIES))
+
+
+def write_water_level(fname, profile, time, pressure, water_level):
+    output = nc.NetCDFBuilder(fname, profile=profile)
+    output.create_dimension('time', len(time))
+    output.create_variable('time', 'f8', ('time',))
+    output.set_variable_data('time', time)
+    output.create_variable('sea_pressure', 'f8', ('time',), fill_value=nc.FILL_VALUE)
+    output.set_variable_data('sea_pressure', pressure)
+    output.append_variable('water_surface_height_above_reference_datum', water_level,
+                           long_name='water_surface_height_above_reference_datum')
+    output.write()
+
+
+def write_spectra(fname, profile, freq, spectra):
+    output = nc.NetCDFBuilder(fname, profile=profile)
+    output.create_dimension('time', spectra.shape[0])
+    output.create_dimension('frequency', len(freq))
+    output.create_variable('frequency', 'f8', ('frequency',))
+    output.set_variable_data('frequency', freq)
+    output.create_variable('power_spectral_density', 'f8', ('time', 'frequency'))
+    output.set_variable_data('power_spectral_density', spectra)
+    output.write()
+
+
+def read_windows(fname, variable_name):
+    """Read the variable one overlapping analysis window at a time"""
+    with Dataset(fname) as ds:
+        var = ds.variables[variable_name]
+        for start in range(0, len(var) - WINDOW + 1, STEP):
+            var[start:start + WINDOW]
+
+
+def read_rows(fname, variable_name, rows=16):
+    with Dataset(fname) as ds:
+        var = ds.variables[variable_name]
+        for start in range(0, var.shape[0], rows):
+            var[start:start + rows]
+
+
+def run(days=7):
+    time, pressure, water_level = synthetic_record(days)
+    freq, spectra = synthetic_spectra(max(int((len(time) - WINDOW) / STEP) + 1, 1))
+    out_dir = tempfile.mkdtemp()
+    sys.stdout.write('%g days at 4hz, %d samples, %d spectra\n' % (days, len(time), len(spectra)))
+    sys.stdout.write('%-22s %10s %8s %10s %12s %10s %10s\n'
+                     % ('profile', 'level MB', 'write s', 'windows s', 'level error',
+                        'psd MB', 'rows s'))
+    try:
+        for name in sorted(nc.OUTPUT_PROFILES):
+            level_fname = os.path.join(out_dir, name + '_stormtide.nc')
+            psd_fname = os.path.join(out_dir, name + '_wave_statistics.nc')
+
+            write_seconds = min(timeit.repeat(
+                lambda: write_water_level(level_fname, name, time, pressure, water_level),
+                number=1, repeat=3))
+            read_seconds = min(timeit.repeat(
+                lambda: read_windows(level_fname, 'sea_pressure'), number=1, repeat=3))
+            error = np.max(np.abs(nc.get_variable_data(
+                level_fname, 'water_surface_height_above_reference_datum') - water_level))
+            nc.invalidate(level_fname)
+
+            write_spectra(psd_fname, name, freq, spectra)
+            row_seconds = min(timeit.repeat(
+                lambda: read_rows(psd_fname, 'power_spectral_density'), number=1, repeat=3))
+
+            sys.stdout.write('%-22s %10.2f %8.2f %10.3f %12.1e %10.2f %10.3f\n'
+                             % (name, os.path.getsize(level_fname) / 1e6, write_seconds,
+                                read_seconds, error, os.path.getsize(psd_fname) / 1e6,
+                                row_seconds))
+    finally:
+        nc.clear_cache()
+        shutil.rmtree(out_dir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark the netCDF output profiles.')
+    parser.add_argument('--days', type=float, default=7,
+                        help='length of the synthetic 4hz record')
+    args = parser.parse_args(sys.argv[1:])
+    run(args.days)
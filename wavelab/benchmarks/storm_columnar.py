@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+"""
+Checks that every table storm_columnar.StormColumnar builds (storm tide with
+the pressure qc, atmospheric pressure, wave statistics, the fixed size list
+spectra and the wave water level) reads back from Feather and Parquet
+identical to the table written, schema and site metadata included, and times
+the writes and reads of a synthetic 4hz record.
+
+Needs pyarrow.
+
+    python -m wavelab.benchmarks.storm_columnar --days 7
+"""
+import os
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+import numpy as np
+from netCDF4 import Dataset
+from wavelab.utilities import qc
+from wavelab.utilities.time_axis import RegularTimeAxis
+from wavelab.processing import storm_columnar
+from wavelab.processing.storm_options import StormOptions
+from wavelab.benchmarks.output_profile import synthetic_record, synthetic_spectra, WINDOW, STEP
+
+STATISTICS = ['H1/3', 'Average Z Cross', 'Peak Wave']
+
+
+def sea_file(fname, flags):
+    """A sea file with only the pressure qc the storm tide table reads"""
+
+    with Dataset(fname, 'w', format='NETCDF4_CLASSIC') as ds:
+        ds.createDimension('time', len(flags))
+        var = ds.createVariable('pressure_qc', qc.DATATYPE, ('time',))
+        var.setncatts(qc.attributes())
+        var[:] = flags
+
+
+def synthetic_options(directory, days, seed=0):
+    """StormOptions with a storm tide, air pressure, wave water level and the
+    statistics and spectra of every window"""
+
+    ms, _, water_level = synthetic_record(days, seed=seed)
+    rng = np.random.RandomState(seed)
+    so = StormOptions()
+    so.sea_fname = os.path.join(directory, 'sea.nc')
+    so.output_fname = os.path.join(directory, 'storm')
+    so.latitude, so.longitude = 30.0, -80.0
+    so.air_latitude, so.air_longitude = 30.0, -80.0
+    so.stn_station_number, so.stn_instrument_id = 'SSS', 'III'
+    so.air_stn_station_number, so.air_stn_instrument_id = 'SSS', 'AAA'
+    so.datum, so.storm_name, so.version = 'NAVD88', 'synthetic', 'benchmark'
+    so.use_filter, so.timezone = 'Butterworth', 'GMT'
+    so.international_units = True
+    so.begin, so.end = 0, len(ms)
+
+    so.sea_time = RegularTimeAxis(ms[0], 250.0, len(ms))
+    so.raw_water_level = water_level
+    so.surge_water_level = np.ma.masked_less(water_level - 0.2 * np.sin(ms / 5e6), -0.5)
+    so.lwt_wave_water_level = water_level - so.surge_water_level.filled(np.nan)
+    so.interpolated_air_pressure = 10.13 + 0.001 * rng.randn(len(ms))
+    so.air_time = ms[::4]
+    so.raw_air_pressure = so.interpolated_air_pressure[::4]
+
+    flags = np.full(len(ms), qc.PASSED, dtype=np.uint8)
+    flags[rng.randint(0, len(ms), 100)] ^= qc.SPIKE
+    sea_file(so.sea_fname, flags)
+
+    n_windows = (len(ms) - WINDOW) // STEP + 1
+    freq, spectra = synthetic_spectra(n_windows, seed)
+    dictionaries = []
+    for scale in (1.0, 1.2, 0.8):
+        stats = {'time': ms[WINDOW // 2::STEP][:n_windows],
+                 'Frequency': [freq] * n_windows,
+                 'Spectrum': spectra * scale,
+                 'HighSpectrum': spectra * scale * 1.1,
+                 'LowSpectrum': spectra * scale * 0.9}
+        for name in STATISTICS:
+            stats[name] = scale * rng.gamma(4, 0.1, n_windows)
+        dictionaries.append(stats)
+    so.stat_dictionary, so.upper_stat_dictionary, so.lower_stat_dictionary = dictionaries
+    return so
+
+
+def tables(columnar, so):
+    """(file name suffix, table) of every output"""
+    return [('_stormtide_unfiltered', columnar.storm_tide_water_level(so, unfiltered=True)),
+            ('_stormtide', columnar.storm_tide_water_level(so)),
+            ('_barometric_pressure', columnar.atmospheric_pressure(so)),
+            ('_stats', columnar.stats(so)),
+            ('_psd', columnar.psd(so)),
+            ('_wave_water_level', columnar.wave_water_level(so))]
+
+
+def check(columnar, so):
+    """Write every table and read it back, True if they are all identical"""
+
+    same = True
+    for suffix, table in tables(columnar, so):
+        start = time.time()
+        fname = columnar.write(table, so, suffix)
+        written = time.time() - start
+        start = time.time()
+        read = storm_columnar.read_table(fname)
+        equal = read.equals(table, check_metadata=True) and \
+            storm_columnar.read_metadata(read) == storm_columnar.read_metadata(table)
+        if suffix == '_psd':
+            equal = equal and np.array_equal(storm_columnar.spectra(read),
+                                              np.asarray(so.stat_dictionary['Spectrum']))
+        read_time = time.time() - start
+        same = same and equal
+        sys.stdout.write('%-8s %-28s %9d rows %8.1f MB  write %6.3f s  read %6.3f s  %s\n'
+                         % (columnar.columnar_format, os.path.basename(fname), read.num_rows,
+                            os.path.getsize(fname) / 1e6, written, read_time,
+                            'identical' if equal else 'DIFFERS'))
+    return same
+
+
+def run(days=7):
+    if storm_columnar.pyarrow_import is False:
+        sys.stdout.write('pyarrow is not installed\n')
+        return False
+
+    directory = tempfile.mkdtemp()
+    so = synthetic_options(directory, days)
+    same = all([check(storm_columnar.StormColumnar(x), so)
+                for x in sorted(storm_columnar.COLUMNAR_FORMATS)])
+    shutil.rmtree(directory)
+    return same
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Check and benchmark the columnar storm outputs.')
+    parser.add_argument('--days', type=float, default=7,
+                        help='length of the synthetic 4hz record')
+    args = parser.parse_args(sys.argv[1:])
+    run(args.days)
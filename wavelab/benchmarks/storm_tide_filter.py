@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+"""
+Checks the storm tide filters in pressure_to_depth against straightforward
+reference implementations on the pressure records in documentation/data and
+times them on a synthetic 4hz record.
+
+    python -m wavelab.benchmarks.storm_tide_filter --days 30
+"""
+import os
+import sys
+import timeit
+import tracemalloc
+import argparse
+import numpy as np
+import pandas as pd
+from wavelab.processing import pressure_to_depth as p2d, storm_tide_stream
+from wavelab.utilities import nc
+
+DATA_DIR = os.path.join(os.path.dirname(__file__), '..', '..', 'documentation', 'data')
+SAMPLE_FILES = ['1_NYRIC_bp.nc', 'NCCAR12248_9983816_air.csv.nc']
+
+
+def reference_rolling_std_filter(data, fs, rolling=False, iterations=3, n_std=1):
+    """rolling_std_filter written as block by block loops, the statistics of every
+    block are computed from its own window"""
+    window = int(360 * fs)
+    filter_data = np.array(data, dtype=np.float64)
+    win_idx = np.arange(len(filter_data))
+    blocks = np.array_split(win_idx, max(int(len(filter_data) / window), 1))
+    
+    for x in range(iterations):
+        stats = []
+        for win in blocks:
+            idx = min(int(np.mean(win)) + 1, len(filter_data) - 1)
+            values = filter_data[max(idx - window + 1, 0):idx + 1]
+            values = values[~np.isnan(values)]
+            if len(values) < 2:
+                stats.append((np.nan, np.nan))
+            else:
+                stats.append((np.mean(values), np.std(values, ddof=1)))
+        
+        # mask after all the statistics of this iteration are taken
+        for win, (mean, std_dev) in zip(blocks, stats):
+            block = filter_data[win]
+            block[block > mean + n_std * std_dev] = np.nan
+            block[block < mean - n_std * std_dev] = np.nan
+            filter_data[win] = block
+    
+    if rolling is True:
+        filter_data = np.array(pd.Series(filter_data).rolling(window, min_periods=1).mean())
+    else:
+        for win in blocks:
+            data_mean = np.nanmean(filter_data[win])
+            filter_data[win] = np.nan
+            filter_data[int(np.mean(win))] = data_mean
+    
+    no_nan_mask = ~np.isnan(filter_data)
+    return np.interp(win_idx, win_idx[no_nan_mask], filter_data[no_nan_mask])
+
+
+def sample_records():
+    """(name, pressure minus its mean, sampling frequency) of the documentation data"""
+    records = []
+    for fname in SAMPLE_FILES:
+        path = os.path.join(DATA_DIR, fname)
+        if os.path.exists(path):
+            pressure = np.asarray(nc.get_air_pressure(path), dtype=np.float64)
+            records.append((fname, pressure - np.mean(pressure), nc.get_frequency(path)))
+    return records
+
+
+def synthetic_record(days, fs=4, seed=0):
+    """Tide, surge, waves and noise in dbar sampled at fs"""
+    rng = np.random.RandomState(seed)
+    t = np.arange(int(days * 86400 * fs)) / fs
+    return (0.5 * np.sin(2 * np.pi * t / 44712.0) + 0.3 * np.exp(-((t - t[-1] / 2) / 86400.0)**2)
+            + 0.1 * np.sin(2 * np.pi * 0.1 * t) + 0.01 * rng.randn(len(t)))
+
+
+def compare(name, data, fs, reference, filter_func, **kwargs):
+    expected = reference(data, fs, **kwargs)
+    result = filter_func(data, fs, **kwargs)
+    error = np.max(np.abs(result - expected))
+    sys.stdout.write('%-34s %-20s max abs difference %.2e dbar\n'
+                     % (name, ' '.join('%s=%s' % x for x in kwargs.items()), error))
+    return error
+
+
+def compare_multirate(name, data, fs, edge_time=3600):
+    """Difference between the multirate and full rate butterworth filters relative to
+    the filtered range, over the whole record and away from its ends"""
+    expected = p2d.butterworth_filter(data, fs)
+    result = p2d.multirate_butterworth_filter(data, fs)
+    scale = np.ptp(expected)
+    edge = int(edge_time * fs)
+    error = np.abs(result - expected) / scale
+    interior = np.max(error[edge:-edge]) if len(error) > 2 * edge else np.nan
+    sys.stdout.write('%-34s max relative difference %.2e, %.2e beyond %d s of the ends\n'
+                     % (name, np.max(error), interior, edge_time))
+    return interior
+
+
+def run_stream(data, streaming_filter, block_size):
+    """Stream data through the filter in blocks, return the output and seconds taken"""
+    start = timeit.default_timer()
+    blocks = (data[i:i + block_size] for i in range(0, len(data), block_size))
+    out = np.concatenate(list(storm_tide_stream.stream_filter(blocks, streaming_filter)))
+    return out, timeit.default_timer() - start
+
+
+def stream_peak_memory(data, streaming_filter, block_size):
+    """Peak traced memory in bytes of streaming data through the filter and
+    discarding the output blocks"""
+    tracemalloc.start()
+    blocks = (data[i:i + block_size] for i in range(0, len(data), block_size))
+    for block in storm_tide_stream.stream_filter(blocks, streaming_filter):
+        pass
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return peak
+
+
+def time_filter(filter_func, data, fs, repeat=3, **kwargs):
+    """Best time of one call in seconds"""
+    return min(timeit.Timer(lambda: filter_func(data, fs, **kwargs)).repeat(repeat=repeat, number=1))
+
+
+def run(days=30):
+    sys.stdout.write('rolling_std_filter against the reference\n')
+    errors = []
+    for name, data, fs in sample_records() + [('synthetic 1 day 4hz', synthetic_record(1), 4)]:
+        for rolling in (False, True):
+            errors.append(compare(name, data, fs, reference_rolling_std_filter,
+                                  p2d.rolling_std_filter, rolling=rolling))
+    
+    sys.stdout.write('\nmultirate_butterworth_filter against butterworth_filter\n')
+    for name, data, fs in sample_records() + [('synthetic 7 day 4hz', synthetic_record(7), 4)]:
+        compare_multirate(name, data, fs)
+    
+    data = synthetic_record(days)
+    sys.stdout.write('\n%g days at 4hz (%d samples)\n' % (days, len(data)))
+    sys.stdout.write('butterworth_filter               %8.2f s\n'
+                     % time_filter(p2d.butterworth_filter, data, 4))
+    sys.stdout.write('multirate_butterworth_filter     %8.2f s\n'
+                     % time_filter(p2d.multirate_butterworth_filter, data, 4))
+    sys.stdout.write('decimated_butterworth_filter     %8.2f s\n'
+                     % time_filter(p2d.decimated_butterworth_filter, data, 4))
+    for rolling in (False, True):
+        sys.stdout.write('rolling_std_filter rolling=%-5s %8.2f s\n'
+                         % (rolling, time_filter(p2d.rolling_std_filter, data, 4, rolling=rolling)))
+    sys.stdout.write('reference rolling=False          %8.2f s\n'
+                     % time_filter(reference_rolling_std_filter, data, 4, repeat=1))
+    
+    # a whole number of 6 minute blocks and the length of a converted RBR day,
+    # which drops the first and last rows
+    sys.stdout.write('\nstreaming filters, one hour blocks\n')
+    block_size = 4 * 3600
+    for data in [synthetic_record(1), synthetic_record(1)[1:-1]]:
+        n = len(data)
+        for name, make_filter, batch in [
+                ('butterworth', lambda: storm_tide_stream.StreamingButterworthFilter(4),
+                 lambda x: p2d.butterworth_filter(x, 4)),
+                ('multirate', lambda: storm_tide_stream.StreamingMultirateButterworthFilter(4),
+                 lambda x: p2d.multirate_butterworth_filter(x, 4)),
+                ('rolling std', lambda: storm_tide_stream.StreamingRollingStdFilter(4, n_samples=n),
+                 lambda x: p2d.rolling_std_filter(x, 4)),
+                ('moving avg', lambda: storm_tide_stream.StreamingRollingStdFilter(
+                    4, rolling=True, n_samples=n),
+                 lambda x: p2d.rolling_std_filter(x, 4, rolling=True))]:
+            out, seconds = run_stream(data, make_filter(), block_size)
+            # the butterworth filter differs within its look-ahead of the ends
+            edge = 4 * 3600 if name == 'butterworth' else 0
+            error = np.max(np.abs(out - batch(data))[edge:n - edge]) / np.ptp(out)
+            peak = stream_peak_memory(data, make_filter(), block_size)
+            sys.stdout.write('%-12s %7d samples %8.2f s  peak %6.1f MB  max relative '
+                             'difference to batch %.1e\n'
+                             % (name, n, seconds, peak / 1e6, error))
+    
+    return max(errors)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark the storm tide filters.')
+    parser.add_argument('--days', type=float, default=30,
+                        help='length of the synthetic 4hz record used for timing')
+    args = parser.parse_args(sys.argv[1:])
+    run(args.days)
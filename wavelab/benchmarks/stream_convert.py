@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""
+Checks the streaming CSV to netCDF conversion (NetCDFWriter.stream, a block of
+rows at a time along an unlimited time dimension) against the in memory one
+on a synthetic multi-day RBR Solo file with a gap, and times both with the
+peak memory tracemalloc traces.
+
+    python -m wavelab.benchmarks.stream_convert --days 7 --block_size 262144
+"""
+import os
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+import tracemalloc
+import numpy as np
+from netCDF4 import Dataset
+from wavelab.processing import pressure_script
+
+# attributes that differ between any two conversions
+VOLATILE_ATTRIBUTES = ('uuid', 'date_created', 'date_modified')
+
+
+def synthetic_file(fname, days, frequency=4, seed=0):
+    """An RBR Solo export with an hour of readings missing on the second day"""
+
+    rng = np.random.RandomState(seed)
+    ms = np.arange(int(days * 86400 * frequency)) * (1000 // frequency)
+    ms = ms[(ms < 86400000 * 1.5) | (ms >= 86400000 * 1.5 + 3600000)]
+    dates = np.datetime64('2020-08-01T00:00:00.000') + ms.astype('timedelta64[ms]')
+    pressure = 14.0 + 0.5 * np.sin(2 * np.pi * ms / 44712000.0) + 0.01 * rng.randn(len(ms))
+
+    with open(fname, 'w') as f:
+        f.write('Model=RBRsolo\nTime zone = UTC\n')
+        for start in range(0, len(ms), 100000):
+            stamps = np.char.replace(np.datetime_as_string(dates[start:start + 100000]), 'T', ' ')
+            f.write(''.join('%s,%.4f,0\n' % x for x in zip(stamps, pressure[start:start + 100000])))
+
+
+def inputs(in_fname, out_fname, block_size=None):
+    return {'in_filename': in_fname, 'out_filename': out_fname, 'creator_name': 'benchmark',
+            'creator_email': '', 'creator_url': '', 'instrument_name': 'RBRSolo',
+            'stn_station_number': 'SSS', 'stn_instrument_id': 'III', 'latitude': 30.0,
+            'longitude': -80.0, 'tz_info': 'UTC', 'daylight_savings': False, 'datum': 'NAVD88',
+            'initial_sensor_orifice_elevation': 0.5, 'final_sensor_orifice_elevation': 0.5,
+            'salinity': 'Salt Water (> 30 ppt)', 'initial_land_surface_elevation': 0.0,
+            'final_land_surface_elevation': 0.0, 'deployment_time': 0, 'retrieval_time': 0,
+            'sea_name': '', 'pressure_type': 'Sea Pressure', 'block_size': block_size,
+            'flat_line_test': True, 'spike_test': True, 'time_gap_test': True}
+
+
+def convert(in_fname, out_fname, block_size=None):
+    """(data issues, seconds, peak traced MB) of a conversion"""
+
+    tracemalloc.start()
+    start = time.time()
+    issues = pressure_script.convert_to_netcdf(inputs(in_fname, out_fname, block_size))
+    seconds = time.time() - start
+    peak = tracemalloc.get_traced_memory()[1] / 2 ** 20
+    tracemalloc.stop()
+    return issues, seconds, peak
+
+
+def attributes(item):
+    return dict((x, str(item.getncattr(x))) for x in item.ncattrs() if x not in VOLATILE_ATTRIBUTES)
+
+
+def same_files(fname, other):
+    """Whether the two files have the same dimension lengths, variables, data
+    and attributes"""
+
+    with Dataset(fname) as a, Dataset(other) as b:
+        if [(x, len(a.dimensions[x])) for x in a.dimensions] != \
+                [(x, len(b.dimensions[x])) for x in b.dimensions]:
+            return False
+        if list(a.variables) != list(b.variables) or attributes(a) != attributes(b):
+            return False
+        for name in a.variables:
+            if a[name].dtype != b[name].dtype or attributes(a[name]) != attributes(b[name]) or \
+                    not np.ma.allequal(a[name][:], b[name][:]):
+                return False
+    return True
+
+
+def run(days=7, block_size=2 ** 18):
+    directory = tempfile.mkdtemp()
+    fname = os.path.join(directory, 'rbr.csv')
+    synthetic_file(fname, days)
+    sys.stdout.write('%g days, %.1f MB\n' % (days, os.path.getsize(fname) / 1e6))
+
+    results = {}
+    for name, size in [('in memory', None), ('streamed', block_size)]:
+        out_fname = os.path.join(directory, name.replace(' ', '_') + '.nc')
+        issues, seconds, peak = convert(fname, out_fname, size)
+        results[name] = (out_fname, issues)
+        sys.stdout.write('%-10s %8.3f s %8.1f MB peak\n' % (name, seconds, peak))
+
+    same = same_files(results['in memory'][0], results['streamed'][0]) and \
+        results['in memory'][1] == results['streamed'][1]
+    sys.stdout.write('the streamed file %s the in memory one\n'
+                     % ('matches' if same else 'DIFFERS from'))
+    shutil.rmtree(directory)
+    return same
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Check and benchmark the streaming conversion.')
+    parser.add_argument('--days', type=float, default=7,
+                        help='length of the synthetic 4hz RBR Solo file')
+    parser.add_argument('--block_size', type=int, default=2 ** 18,
+                        help='rows of the file converted at a time')
+    args = parser.parse_args(sys.argv[1:])
+    run(args.days, args.block_size)
@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+"""
+Checks the NumPy tokenizer of csv_readers.Waveguage against the token by
+token parser it replaced (pandas with a comma line terminator, the burst and
+timestamp loops and an np.hstack per burst) on a synthetic multi-day
+Waveguage file, and times both.
+
+    python -m wavelab.benchmarks.waveguage --days 7
+"""
+import os
+import sys
+import timeit
+import argparse
+import tempfile
+from datetime import datetime, timedelta
+import numpy as np
+import pandas as pd
+import pytz
+from wavelab.utilities import unit_conversion as uc
+from wavelab.utilities.csv_readers import Waveguage
+
+
+def synthetic_file(fname, days, frequency=4, burst_length=2048, interval=600, seed=0):
+    """A Waveguage file with a burst of burst_length readings every interval
+    seconds, one burst is missing every day"""
+
+    rng = np.random.RandomState(seed)
+    start = datetime(2020, 8, 1)
+    with open(fname, 'w') as f:
+        f.write('OSSI WAVEGAUGE LOGGER FRQ%02dHZ' % frequency
+                + ''.join(',H%d' % x for x in range(Waveguage.header_tokens - 1)) + ',\n')
+        for burst in range(int(days * 86400 / interval)):
+            if burst % int(86400 / interval) == 100:
+                continue
+            stamp = start + timedelta(seconds=burst * interval)
+            f.write(stamp.strftime('Y%y,M%m,D%d,H%H,M%M,S%S') + ',\n')
+            t = np.arange(burst_length) / frequency
+            values = 0.5 + 0.1 * np.sin(2 * np.pi * t / 8.0) + 0.005 * rng.randn(burst_length)
+            f.write(','.join('%+.4f' % x for x in values) + ',\n')
+        f.write('END,')
+
+
+class ReferenceWaveguage(object):
+    """The token by token Waveguage parser, the frequency read as an int"""
+
+    def __init__(self, in_filename, tzinfo=pytz.utc):
+        self.in_filename = in_filename
+        self.tzinfo = tzinfo
+        self.fill_value = np.float64(-1.0e+10)
+
+    def read(self):
+        data = self.get_data()
+        chunks = self.get_pressure_chunks(data)
+        timestamps = self.get_times(data)
+        with open(self.in_filename) as f:
+            self.frequency = int(f.readline()[25:27])
+        utc_millisecond_data = self.get_ms_data(timestamps, chunks)
+        pressure_data = self.make_pressure_array(timestamps, chunks) * 10.0 + uc.ATM_TO_DBAR
+        return pressure_data, utc_millisecond_data
+
+    def make_pressure_array(self, t, chunks):
+        final = np.zeros(0, dtype=np.float64)
+        prev_stamp = None
+        prev_press = None
+        for stamp, press in zip(t, chunks):
+            if prev_stamp:
+                n = int(round((stamp - prev_stamp).total_seconds() * self.frequency)) - len(prev_press)
+                narr = np.zeros(n, dtype=np.float64) + self.fill_value
+                final = np.hstack((final, prev_press, narr))
+            prev_stamp = stamp
+            prev_press = press
+        final = np.hstack((final, chunks[-1]))
+        return final
+
+    def get_pressure_chunks(self, data):
+        master = [[]]
+        i = 0
+        for e in data:
+            if e.startswith('+') or e.startswith('-'):
+                if len(e) == 7:
+                    master[i].append(np.float64(e))
+            else:
+                if master[i] != []:
+                    master.append([])
+                    i += 1
+        master.pop()
+        return master
+
+    def get_ms_data(self, timestamps, chunks):
+        total_stamp_ms = (timestamps[-1] - timestamps[0]).total_seconds() * 1000
+        total_ms = total_stamp_ms + 1000 * len(chunks[-1]) / self.frequency
+        offset = (timestamps[0] - uc.EPOCH_START).total_seconds() * 1e3
+        utc_ms_data = np.arange(total_ms, step=(1000 / self.frequency), dtype='int64')
+        utc_ms_data += int(offset)
+        return utc_ms_data
+
+    def get_times(self, p):
+        c = p.map(lambda x: not (x.startswith('+') or x.startswith('-')))
+        p = p[c][14:-1]
+        added, stamps = '', []
+        for i, s in enumerate(p):
+            added += s
+            if i % 6 == 5:
+                stamps.append(added)
+                added = ''
+        return [datetime.strptime(stamp, 'Y%yM%mD%dH%HM%MS%S').replace(tzinfo=self.tzinfo)
+                for stamp in stamps]
+
+    def get_data(self):
+        data = pd.read_csv(self.in_filename, skiprows=0, header=None,
+                           lineterminator=',', sep=',', engine='c', names=['p'])
+        data.p = data.p.apply(lambda x: x.strip())
+        return data.p
+
+
+def read_waveguage(fname):
+    reader = Waveguage()
+    reader.in_filename = fname
+    reader.tz_info = 'GMT'
+    reader.daylight_savings = False
+    reader.read()
+    return reader
+
+
+def run(days=7, repeat=3):
+    fname = os.path.join(tempfile.mkdtemp(), 'waveguage.csv')
+    synthetic_file(fname, days)
+    sys.stdout.write('%g days, %.1f MB\n' % (days, os.path.getsize(fname) / 1e6))
+
+    reader = read_waveguage(fname)
+    pressure, ms = ReferenceWaveguage(fname).read()
+    # the token by token parser scaled its fill value with the readings
+    filled = reader.time_grid.filled
+    same = np.array_equal(np.asarray(reader.utc_millisecond_data), ms) and \
+        np.array_equal(filled, pressure == reader.fill_value * 10.0 + uc.ATM_TO_DBAR) and \
+        np.array_equal(reader.pressure_data[~filled], pressure[~filled]) and \
+        np.all(reader.pressure_data[filled] == reader.fill_value)
+    sys.stdout.write('%d samples, %s, %s the token by token parser\n'
+                     % (len(pressure), reader.time_grid.report(),
+                        'matches' if same else 'DIFFERS from'))
+
+    for name, func in [('Waveguage.read', lambda: read_waveguage(fname)),
+                       ('token by token', lambda: ReferenceWaveguage(fname).read())]:
+        seconds = min(timeit.Timer(func).repeat(repeat=repeat, number=1))
+        sys.stdout.write('%-16s %8.3f s\n' % (name, seconds))
+
+    os.remove(fname)
+    return same
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Check and benchmark the Waveguage parser.')
+    parser.add_argument('--days', type=float, default=7,
+                        help='length of the synthetic Waveguage file')
+    args = parser.parse_args(sys.argv[1:])
+    run(args.days)
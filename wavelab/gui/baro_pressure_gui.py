@@ -12,6 +12,7 @@ import os
 from collections import OrderedDict
 from wavelab.processing.pressure_script import convert_to_netcdf
 from wavelab.utilities.utils import MessageDialog
+from wavelab.gui.sea_pressure_gui import QC_FIELDS
 import json
 import re
 
@@ -48,6 +49,7 @@ LOCAL_FIELDS = OrderedDict([
                             'Local Control Point'], True]),
     ('initial_sensor_orifice_elevation', ['Sensor orifice elevation at deployment time(feet):', '', False]),
     ('final_sensor_orifice_elevation', ['Sensor orifice elevation at retrieval time(feet):', '', False])])
+LOCAL_FIELDS.update(QC_FIELDS)
 
 
 class BaroPressureGUI:
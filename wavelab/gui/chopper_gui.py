@@ -132,7 +132,7 @@ class Chopper:
         plt.rcParams['figure.facecolor'] = 'silver'
         
         #get date times from netCDF file
-        self.t_dates = nc.get_time(self.fname)
+        self.t_dates = nc.get_time_axis(self.fname)
         
         
         
@@ -42,11 +42,12 @@ import wavelab.gui.chopper_gui as chopper
 import wavelab.gui.sea_pressure_gui as script1
 import wavelab.gui.baro_pressure_gui as script1_air
 from wavelab.utilities.get_image import get_image
-from wavelab.utilities.nc import get_frequency
+from wavelab.utilities.nc import get_frequency, clear_cache
 from wavelab.utilities.utils import MessageDialog
 from wavelab.processing.storm_options import StormOptions
 from wavelab.processing.storm_graph import StormGraph, comparison_plot
 from wavelab.processing.storm_csv import StormCSV
+from wavelab.processing.storm_columnar import StormColumnar
 from wavelab.processing.storm_netCDF import Storm_netCDF
 from wavelab.processing.storm_statistics import StormStatistics
 import webbrowser
@@ -65,13 +66,16 @@ def storm_processing(data_dict, queue):
 
     for idx, val in enumerate([(so.filter1, 'Butterworth'),
                                (so.filter2, 'Moving Avg 3 Std Devs'),
-                               (so.filter3, 'NOAA 3 Std Devs')]):
+                               (so.filter3, 'NOAA 3 Std Devs'),
+                               (so.filter4, 'Multirate Butterworth')]):
 
         if val[0] is True:
 
             # To reprocess filter
             so.surge_sea_pressure = None
+            so.decimated_surge_sea_pressure = None
             so.surge_water_level = None
+            so.decimated_surge_water_level = None
             # ---
 
             so.use_filter = val[1]
@@ -89,6 +93,13 @@ def storm_processing(data_dict, queue):
             del scv
             gc.collect()
 
+            if so.columnar_format is not None:
+                scol = StormColumnar(so.columnar_format)
+                scol.process_columnar(so)
+                scol = None
+                del scol
+                gc.collect()
+
             sg = StormGraph()
             sg.international_units = so.international_units
             sg.process_graphs(so)
@@ -326,6 +337,7 @@ if __name__ == '__main__':
             self.filter1 = BooleanVar(value=True)
             self.filter2 = BooleanVar(value=True)
             self.filter3 = BooleanVar(value=True)
+            self.filter4 = BooleanVar(value=False)
 
             # buttonf1 = Checkbutton(self.side3, text='Butterworth Filter', variable=self.filter1)
             # buttonf2 = Checkbutton(self.side3, text='Moving Avg 3 Std Deviations', variable=self.filter2)
@@ -338,6 +350,10 @@ if __name__ == '__main__':
             # self.TzLabel = Label(self.side3, text=' ')
             # self.TzLabel.pack(padx=2, pady=5)
 
+            # filters the storm tide at about 20 times the cutoff instead of the butterworth filter
+            buttonf4 = Checkbutton(self.side3, text='Multirate Butterworth Filter', variable=self.filter4)
+            buttonf4.pack(anchor=W, padx=0, pady=2)
+
     #         self.TzLabel = Label(self.side2, text='Clip water level graph:')
     #         self.TzLabel.pack(padx = 2,pady = 2)
 
@@ -481,6 +497,13 @@ if __name__ == '__main__':
                         MessageDialog(root, message=message, title='Error!')
                         return
 
+                if self.so.netCDF['Wave Water Level'].get() is True or \
+                   self.so.csv['Wave Water Level'].get() is True:
+                    message = ("Sampling rate is over the minimum to resolve waves, "
+                               "please deselect 'Wave Water Level'")
+                    MessageDialog(root, message=message, title='Error!')
+                    return
+
             self.so.clear_data()
             self.so.international_units = False
 
@@ -494,9 +517,10 @@ if __name__ == '__main__':
             # self.so.filter1 = self.filter1.get()
             # self.so.filter2 = self.filter2.get()
             # self.so.filter3 = self.filter3.get()
-            self.so.filter1 = True
+            self.so.filter1 = not self.filter4.get()
             self.so.filter2 = False
             self.so.filter3 = False
+            self.so.filter4 = self.filter4.get()
 
             self.so.timezone = self.tzstringvar.get()
             self.so.daylight_savings = self.daylightSavings.get()
@@ -559,6 +583,8 @@ if __name__ == '__main__':
             data_dict = self.so.info_dict
             queue = mp.Queue()
 
+            # the processing runs in its own process, do not hand it open netCDF handles
+            clear_cache()
             p = mp.Process(target=storm_processing, args=(data_dict,queue))
             p.start()
             p.join()
@@ -71,6 +71,11 @@ WATER_ONLY_FIELDS = OrderedDict([
         'SW Atlantic (limit-20 W)', 'SW Pacific (limit-147 E to 140 W)'],
                   False]),
     ])
+QC_FIELDS = OrderedDict([
+    ('flat_line_test', ['Flat line (stuck sensor) QC test', False]),
+    ('spike_test', ['Spike QC test', False]),
+    ('attenuated_signal_test', ['Attenuated signal QC test', False]),
+    ('time_gap_test', ['Time gap QC test', False])])
 
 
 class SeaPressureGUI:
@@ -83,6 +88,7 @@ class SeaPressureGUI:
         self.local_fields = LOCAL_FIELDS
         if not air_pressure:
             self.local_fields.update(WATER_ONLY_FIELDS)
+        self.local_fields.update(QC_FIELDS)
         parent.title("Sea GUI (CSV -> NetCDF)")
         self.air_pressure = air_pressure
         self.datafiles = OrderedDict()
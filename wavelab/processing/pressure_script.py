@@ -5,14 +5,13 @@ and assigns and prepares the attributest to be assigned to netCDF variables
 and attributes.
 """
 import sys
-import time
 import argparse
 import numpy as np
 import wavelab.utilities.nc as nc
 from pytz import timezone
 from wavelab.utilities.csv_readers import Leveltroll, MeasureSysLogger, House, \
     Hobo, RBRSolo, Waveguage, NOAA_Station, West_Coast_Station, VanEssen
-from wavelab.utilities import unit_conversion as uc
+from wavelab.utilities import unit_conversion as uc, qc
 
 INSTRUMENTS = {
     'LevelTroll': Leveltroll,
@@ -34,6 +33,13 @@ def convert_to_netcdf(inputs):
     instrument.user_data_start_flag = 0
     for key in translated:
         setattr(instrument, key, translated[key])
+
+    # readers that can stream the file convert it a block of rows at a time
+    if instrument.block_size and hasattr(instrument, 'read_blocks') \
+            and instrument.included_baro != True:
+        instrument.stream(pressure_type=translated['pressure_type'])
+        return instrument.bad_data, instrument.error_message
+
     instrument.read()
     if instrument.bad_data:
         return instrument.bad_data, instrument.error_message
@@ -44,10 +50,9 @@ def convert_to_netcdf(inputs):
         instrument.pressure_data = instrument.air_pressure_data
         idx = instrument.out_filename.rfind('.csv')
         instrument.out_filename = instrument.out_filename[:idx] + 'air' + instrument.out_filename[idx:]
-        time.sleep(1)
         instrument.write(pressure_type='Air Pressure')
         
-    return instrument.bad_data, None
+    return instrument.bad_data, instrument.error_message
 
 
 DATATYPES = {
@@ -131,6 +136,16 @@ def process_file(args):
         args['offset'] = args.offset
         args['included_baro'] = args.included_baro
 
+    if 'output_profile' in args:
+        inputs['output_profile'] = args.output_profile
+
+    if 'block_size' in args:
+        inputs['block_size'] = args.block_size
+
+    if 'qc_tests' in args and args.qc_tests is not None:
+        for name in args.qc_tests:
+            inputs[name + '_test'] = True
+
     # checks for the correct file type
     if check_file_type(inputs['in_filename']) == False:
         return 2
@@ -169,7 +184,7 @@ def process_file(args):
          
     try:
         nc.chop_netcdf(inputs['out_filename'], ''.join([inputs['out_filename'], 'chop.nc']),
-                       start_index, end_index, air_pressure)
+                       start_index, end_index, air_pressure, profile=inputs.get('output_profile'))
     except:
         return 5
 
@@ -229,6 +244,12 @@ if __name__ == '__main__':
                         help='first date for chopping the time series')
     parser.add_argument('good_end_date',
                         help='last date for chopping the time series')
+    parser.add_argument('--output_profile', choices=sorted(nc.OUTPUT_PROFILES),
+                        help='storage of the netCDF variables, e.g. compressed')
+    parser.add_argument('--block_size', type=int,
+                        help='convert the file this many rows at a time in bounded memory')
+    parser.add_argument('--qc_tests', nargs='*', choices=list(qc.TESTS),
+                        help='optional quality control tests to run on the pressure')
 
     args = parser.parse_args(sys.argv[1:])
     code = process_file(args)
@@ -16,50 +16,97 @@ BRACKISH_WATER_DENSITY = 1015
 FRESH_WATER_DENSITY = 1000
 FILL_VALUE = uc.FILL_VALUE
 
-
-def combo_method(time, pressure, device_d, water_d, tstep = 4):
-    """Convert pressure series into depth series using fft method."""
+# 6 minute storm tide low pass cutoff in Hz
+STORM_TIDE_CUTOFF = 0.002777777777775
+
+
+def combo_method(time, pressure, device_d, water_d, tstep=0.25, window=4096, step=2048,
+                 hi_cut='auto', method='newton', batch=256):
+    """Convert a pressure series (dbar) into a wave water level series (meters)
+    with linear wave theory.
+
+    The series is split into windows of window samples every step samples
+    (4096 and 2048, about 17 minutes at 4hz), each window is linearly detrended
+    and converted with the depth of that window, and the windows are recombined
+    by weighted overlap-add. device_d (negative, sensor depth below the surface)
+    and water_d may be scalars or one value per sample. time is only used for
+    the length of the series. Samples only covered by windows with missing data
+    are NaN."""
+    pressure = np.asarray(pressure, dtype=np.float64)
+    series_len = len(pressure)
+    if window % step != 0:
+        raise ValueError("window must be a multiple of step")
+    overlap = window // step
+    
+    # reflect the ends so every sample is covered by a full set of windows
+    pad_end = step * (overlap - 1) + (-series_len) % step
+    pad = np.pad(pressure, (step * (overlap - 1), pad_end), mode='reflect')
+    n_windows = (len(pad) - window) // step + 1
+    p_windows = _windows(pad, window, step)
     
-    # this creates a split for each fill value since the fourier functions
-    # handle fill values gracefully
-#     split_idx = (pressure == FILL_VALUE)
-#     idx = np.where(split_idx[1:] ^ split_idx[:-1])[0] + 1
-
-    # for the purposes of our method we will take windows of every 4096 amounting to 17 minutes and whatever seconds
-    # in order to maximize the i utility of the fourier functions
-    increment_size = 2048
-    current_start_index = 0
-    current_end_index = 4096
-    series_len = len(time)
-    len_finished = False
-    dchunks, tchunks = [], []
+    # one depth per window
+    device_w = _window_average(device_d, series_len, step * (overlap - 1), pad_end, window, step)
+    water_w = _window_average(water_d, series_len, step * (overlap - 1), pad_end, window, step)
+    if hi_cut == 'auto':
+        hi_cut = auto_cutoff(water_w)
+    hi_cut = np.broadcast_to(hi_cut, (n_windows,))
     
+    # sqrt hann analysis and synthesis windows, their product overlap-adds to a constant
+    taper = np.sqrt(np.hanning(window + 1)[:-1])
+    x = np.arange(window) - (window - 1) / 2.0
+    freqs = np.fft.rfftfreq(window, d=tstep)
     
-    while len_finished == False:
-
-        device_chunk = device_d[current_start_index, current_end_index]
-        p_chunk = pressure[current_start_index, current_end_index]
-        t_chunk = time[current_start_index, current_end_index]
-        h_chunk = water_d[current_start_index, current_end_index]
-         
-        device_d_average = np.average(device_chunk)
+    wave = np.zeros((n_windows + overlap - 1, step))
+    weight = np.zeros((n_windows + overlap - 1, step))
+    for start in range(0, n_windows, batch):
+        stop = min(start + batch, n_windows)
+        p_chunk = p_windows[start:stop]
+        device_chunk, water_chunk = device_w[start:stop], water_w[start:stop]
+        
         # removing the linear trend
-        coeff = np.polyfit(t_chunk, p_chunk, 1)
-        static_p = coeff[1] + coeff[0]*t_chunk
-        wave_p = p_chunk - static_p
-         
-        # applying linear wave theory to the wave and device slices
-        wave_y = pressure_to_depth_lwt(wave_p, device_d_average, h_chunk, tstep)
-        wave_y = np.pad(wave_y, (0, len(t_chunk) - len(wave_y)), mode='edge')
-        dchunks.append(hydrostatic_method(static_p) + wave_y)
-        tchunks.append(t_chunk)
+        detrended = p_chunk - np.mean(p_chunk, axis=1)[:, np.newaxis]
+        slope = np.dot(detrended, x) / np.dot(x, x)
+        detrended -= slope[:, np.newaxis] * x
         
-        if current_end_index >= series_len:
-            len_finished = True
-            
-        current_start_index += increment_size
-        current_end_index += increment_size
-    return (dchunks,tchunks)
+        # windows that cannot be converted do not contribute
+        valid = ~np.isnan(slope) & (device_chunk <= 0) & (-device_chunk <= water_chunk)
+        device_chunk = np.where(valid, device_chunk, 0)[:, np.newaxis]
+        water_chunk = np.where(valid, water_chunk, 1)[:, np.newaxis]
+        
+        # applying linear wave theory to every window at once
+        p_amps = np.fft.rfft(np.where(valid[:, np.newaxis], detrended, 0) * 1e4 * taper, axis=1)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            wavenumbers = solve_dispersion(2 * np.pi * freqs[np.newaxis, :], water_chunk, method)
+        d_amps = pressure_to_eta(p_amps, wavenumbers, device_chunk, water_chunk)
+        d_amps[freqs[np.newaxis, :] >= hi_cut[start:stop, np.newaxis]] = 0
+        wave_y = np.fft.irfft(d_amps, n=window, axis=1) * taper
+        
+        w = valid[:, np.newaxis] * taper**2
+        for i in range(overlap):
+            wave[start + i:stop + i] += wave_y[:, i * step:(i + 1) * step]
+            weight[start + i:stop + i] += w[:, i * step:(i + 1) * step]
+    
+    wave, weight = wave.reshape(-1), weight.reshape(-1)
+    wave = np.divide(wave, weight, out=np.full(len(wave), np.nan), where=weight > 1e-2)
+    return wave[step * (overlap - 1):step * (overlap - 1) + series_len]
+
+
+def _windows(series, window, step):
+    """Read only (n_windows x window) view of series, one row every step samples"""
+    n_windows = (len(series) - window) // step + 1
+    stride = series.strides[0]
+    return np.lib.stride_tricks.as_strided(series, shape=(n_windows, window),
+                                           strides=(stride * step, stride), writeable=False)
+
+
+def _window_average(values, series_len, pad_start, pad_end, window, step):
+    """Average a scalar or per sample series over the windows of the padded series"""
+    values = np.asarray(values, dtype=np.float64)
+    n_windows = (series_len + pad_start + pad_end - window) // step + 1
+    if values.ndim == 0:
+        return np.full(n_windows, float(values))
+    padded = np.pad(values, (pad_start, pad_end), mode='edge')
+    return np.mean(_windows(padded, window, step), axis=1)
 
 
 def hydrostatic_method(pressure, density="salt"):
@@ -104,10 +151,107 @@ def k_to_omega(wavenumber, water_d):
     return np.sqrt(wavenumber * GRAVITY * np.tanh(wavenumber * water_d))
 
 
-def lo_omega_to_k(omega, h):
+def exact_omega_to_k(omega, h, tolerance=1e-12, max_iterations=50):
+    """Converts angular frequency to wavenumber for water waves by solving the
+    dimensionless dispersion relation kh * tanh(kh) = omega**2 * h / g with
+    Newton iterations until every element has converged."""
+    x = np.asarray(omega, dtype=np.float64)**2 * np.asarray(h, dtype=np.float64) / GRAVITY
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.nan_to_num(_solve_kh(x, tolerance, max_iterations) / h)
+
+
+def _solve_kh(x, tolerance=1e-12, max_iterations=50, dtype=np.float64):
+    """Solve y * tanh(y) = x for y = kh, elements stop iterating once converged."""
+    x = np.asarray(x, dtype=dtype)
+    
+    # Eckart's approximation as first guess (within 5% everywhere)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        y = x / np.sqrt(np.tanh(x))
+    y = np.where(x > 0, y, 0.0)
+    active = np.flatnonzero(x > 0)
+    flat_y = y.reshape(-1)
+    flat_x = np.broadcast_to(x, y.shape).reshape(-1)
+    
+    for _ in range(max_iterations):
+        if len(active) == 0:
+            break
+        ya, xa = flat_y[active], flat_x[active]
+        th = np.tanh(ya)
+        step = (ya * th - xa) / (th + ya * (1 - th**2))
+        flat_y[active] = ya - step
+        active = active[np.abs(step) > tolerance * np.abs(ya)]
+    
+    return flat_y.reshape(y.shape)
+
+
+class DispersionTable(object):
+    """Lookup table of dimensionless wavenumber kh against x = omega**2 * h / g.
+
+    The relation kh * tanh(kh) = x depends only on x, so one table serves every
+    depth and frequency. kh is tabulated on a uniform grid of s = sqrt(x), where
+    it is close to linear in shallow water and quadratic in deep water, so the
+    grid index comes straight from s and no search is needed. The grid is refined
+    until the linear interpolation error at every interval midpoint is below
+    tolerance (relative). Values beyond s_max are solved exactly."""
+
+    def __init__(self, s_max=7.0, tolerance=1e-7, points=1024):
+        self.s_max = s_max
+        
+        while True:
+            s = np.linspace(0, s_max, points)
+            kh = _solve_kh(s**2)
+            mid_s = (s[1:] + s[:-1]) / 2
+            error = np.max(np.abs((kh[1:] + kh[:-1]) / 2 / _solve_kh(mid_s**2) - 1))
+            if error <= tolerance:
+                break
+            points *= 2
+        
+        self.kh_table = kh
+        self.slope = np.append(np.diff(kh), 0.0)
+        self.scale = (points - 1) / s_max
+        self.max_error = error
+
+    def kh_from_s(self, s):
+        """Interpolate kh for an array of s = omega * sqrt(h / g)"""
+        position = np.asarray(s, dtype=np.float64) * self.scale
+        in_range = position <= len(self.kh_table) - 1
+        index = np.where(in_range, position, 0).astype(np.intp)
+        y = self.kh_table[index] + (position - index) * self.slope[index]
+        
+        if not np.all(in_range):
+            y = np.where(in_range, y, _solve_kh(np.where(in_range, 0.0, s)**2))
+        return y
+
+    def kh(self, x):
+        """Interpolate kh for an array of x = omega**2 * h / g"""
+        return self.kh_from_s(np.sqrt(x))
+
+    def omega_to_k(self, omega, h):
+        """Converts angular frequency to wavenumber for water waves"""
+        h = np.asarray(h, dtype=np.float64)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            s = np.asarray(omega, dtype=np.float64) * np.sqrt(h / GRAVITY)
+            return np.nan_to_num(self.kh_from_s(s) / h)
+
+
+_dispersion_table = None
+
+
+def table_omega_to_k(omega, h):
+    """Converts angular frequency to wavenumber for water waves by interpolating
+    the dispersion table, which is built on first use."""
+    global _dispersion_table
+    if _dispersion_table is None:
+        _dispersion_table = DispersionTable()
+    return _dispersion_table.omega_to_k(omega, h)
+
+
+def lo_omega_to_k(omega, h, table=False):
     """Converts angular frequency to wavenumber for water waves.
     Using Lo approximation
     Approximation to the dispersion relation, Fenton and McKee (1989)."""
+    if table is True:
+        return table_omega_to_k(omega, h)
     T = 2 * np.pi / omega
     Lo = GRAVITY * T**2 / (2 * np.pi)
     l = Lo * np.tanh(((2 * np.pi)*((np.sqrt( h / GRAVITY))/T))**(3/4))**(2/3)
@@ -115,7 +259,10 @@ def lo_omega_to_k(omega, h):
     return np.nan_to_num(2 * np.pi / l) # nan at omega = 0 (low freq limit)
 
 
-def omega_to_k(omega, h):
+def omega_to_k(omega, h, table=False):
+    if table is True:
+        return table_omega_to_k(omega, h)
+
     k = omega / (9.8 * np.sqrt(np.tanh(omega * h / 9.8)))
           
     # tangent iteration to get better estimate of wavenumber
@@ -132,31 +279,63 @@ def echart_omega_to_wavenumber(omega, h):
     return np.nan_to_num(2 * np.pi / ke)
 
 
-def echart_omega_to_k(omega, h):
+def echart_omega_to_k(omega, h, table=False):
+    if table is True:
+        return table_omega_to_k(omega, h)
+
     return  np.nan_to_num(omega/(GRAVITY*np.sqrt(np.tanh(h*(omega/GRAVITY)))))
 
 
-def dalrymple_omega_to_k(omega, h):
+def dalrymple_omega_to_k(omega, h, table=False, tolerance=1e-8, max_iterations=50):
+    if table is True:
+        return table_omega_to_k(omega, h)
+
+    omega, h = np.broadcast_arrays(np.asarray(omega, dtype=np.float64),
+                                   np.asarray(h, dtype=np.float64))
     a0 = (omega*omega*h)/GRAVITY
-    b1 = 1.0 / np.tanh(a0**(3/4.0))
-    a1 = a0*(b1**0.666)
-    da1 = 1000.0
+    with np.errstate(divide='ignore', invalid='ignore'):
+        b1 = 1.0 / np.tanh(a0**(3/4.0))
+        a1 = (a0*(b1**0.666)).reshape(-1)
+    a0 = a0.reshape(-1)
     
-    d1 = np.repeat(1, len(h))
-    while np.max(d1) == 1:
-        d1 = np.abs(da1/a1) > .00000001
-        th = np.tanh(a1)
-        ch = np.cosh(a1)
-        f1 = a0-(a1*th)
-        f2 = -a1*((1.0/ch)**2) - th;
+    # only the elements that have not converged keep iterating
+    active = np.flatnonzero(a0 > 0)
+    for _ in range(max_iterations):
+        if len(active) == 0:
+            break
+        a, th = a1[active], np.tanh(a1[active])
+        ch = np.cosh(a)
+        f1 = a0[active]-(a*th)
+        f2 = -a*((1.0/ch)**2) - th
         da1 = -f1/f2
-        a1 = a1 + da1
-        
-    return a1/h
+        a1[active] = a + da1
+        active = active[np.abs(da1/a1[active]) > tolerance]
+    
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.nan_to_num(a1.reshape(h.shape)/h)
+
+
+DISPERSION_SOLVERS = {
+    'newton': omega_to_k,
+    'lo': lo_omega_to_k,
+    'echart': echart_omega_to_k,
+    'dalrymple': dalrymple_omega_to_k,
+    'exact': exact_omega_to_k,
+    'table': table_omega_to_k
+}
+
+
+def solve_dispersion(omega, h, method='newton'):
+    """Converts angular frequency to wavenumber with the named solver in DISPERSION_SOLVERS"""
+    if method not in DISPERSION_SOLVERS:
+        raise ValueError('Unknown dispersion solver %s, expected one of %s'
+                         % (method, ', '.join(DISPERSION_SOLVERS)))
+    return DISPERSION_SOLVERS[method](omega, h)
     
 
-def pressure_to_depth_lwt(p_dbar, device_d, water_d, tstep, hi_cut='auto'):
-    """Create wave height data from an array of pressure readings."""
+def pressure_to_depth_lwt(p_dbar, device_d, water_d, tstep, hi_cut='auto', method='newton'):
+    """Create wave height data from an array of pressure readings.
+    method names the dispersion solver, see DISPERSION_SOLVERS."""
     if hi_cut == 'auto':
         hi_cut = auto_cutoff(water_d)
         
@@ -176,7 +355,7 @@ def pressure_to_depth_lwt(p_dbar, device_d, water_d, tstep, hi_cut='auto'):
     freqs = np.fft.rfftfreq(len(trimmed_p), d=tstep)
     
     # get the wave numbers by applying properties of the dispersion relation
-    wavenumbers = omega_to_k(2 * np.pi * freqs, water_d)
+    wavenumbers = solve_dispersion(2 * np.pi * freqs, water_d, method)
     
     # convert scaled pressure to water level and converting any value above the cutoff to zero
     d_amps = pressure_to_eta(p_amps, wavenumbers, device_d, water_d)
@@ -191,11 +370,11 @@ def pressure_to_eta(del_p, wavenumber, device_d, water_d):
 
 def _coefficient(wavenumber, device_d, water_d):
     """Return a conversion factor for pressure and wave height."""
-    if device_d > 0:
+    if np.any(np.asarray(device_d) > 0):
         raise ValueError("Device depth > 0, it should be negative.")
-    if water_d < 0:
+    if np.any(np.asarray(water_d) < 0):
         raise ValueError("Water depth < 0, it should be positive.")
-    if -device_d > water_d:
+    if np.any(-np.asarray(device_d) > np.asarray(water_d)):
         raise ValueError("Device depth > water depth.")
     return SALT_WATER_DENSITY * GRAVITY * (np.cosh(wavenumber * (water_d + device_d)) /
                                       np.cosh(wavenumber * water_d))
@@ -211,7 +390,7 @@ def butterworth_filter(data, fs):
     """Performs a 4th order butterworth filter with a 6 min cutoff."""
     if fs >= 1 / 180.:
 
-        cutoff = 0.002777777777775
+        cutoff = STORM_TIDE_CUTOFF
 
         lowcut = cutoff / (.5 * fs)
 
@@ -225,35 +404,142 @@ def butterworth_filter(data, fs):
         return data
 
 
-def rolling_std_filter(data, fs, rolling=False):
-    """Performs a butterworth filter of order 4 with a 1 min cutoff"""
+def multirate_butterworth_filter(data, fs, cutoff=STORM_TIDE_CUTOFF, rate_factor=20, pad_time=3600):
+    """Performs the 4th order butterworth filter with a 6 min cutoff at a reduced
+    rate and interpolates the result back to every sample.
+
+    More than pad_time seconds (one hour) from the ends this matches
+    butterworth_filter to within 1e-5 of the filtered range. In the first and
+    last hour it differs by up to ~3% of the range on a tide, surge and wave
+    record, more where the record starts or ends on a step, because
+    butterworth_filter only extends the series by 15 samples. Callers that do
+    not need every sample should use decimated_butterworth_filter directly."""
+    idx, filtered = decimated_butterworth_filter(data, fs, cutoff, rate_factor, pad_time)
+    if len(idx) == len(data):
+        return filtered
+    return np.interp(np.arange(len(data)), idx, filtered)
+
+
+def decimated_butterworth_filter(data, fs, cutoff=STORM_TIDE_CUTOFF, rate_factor=20, pad_time=3600):
+    """Performs the 4th order butterworth filter with a 6 min cutoff at about
+    rate_factor times the cutoff (every 72nd sample at 4hz).
+
+    The series is odd extended by pad_time seconds at both ends, anti-alias
+    decimated (polyphase) and filtered forwards and backwards with second order
+    sections. Returns the (fractional) sample indices of the filtered values and
+    the values, or every sample filtered at full rate if the series is too short
+    or too slow to decimate."""
+    data = np.asarray(data, dtype=np.float64)
+    q = int(fs / (rate_factor * cutoff))
+    pad = min(int(pad_time * fs), len(data) - 1)
+    if q < 2 or (len(data) + 2 * pad) // q < 16:
+        return np.arange(len(data)), butterworth_filter(data, fs)
+
+    padded = np.concatenate((2 * data[0] - data[pad:0:-1], data, 2 * data[-1] - data[-2:-pad - 2:-1]))
+    decimated = signal.resample_poly(padded, 1, q)
+    sos = signal.butter(4, cutoff / (.5 * fs / q), btype='lowpass', output='sos')
+    filtered = signal.sosfiltfilt(sos, decimated)
+
+    # sample k of the decimated series lines up with sample k * q of the padded series
+    return np.arange(len(filtered)) * q - pad, filtered
+
+
+def rolling_std_filter(data, fs, rolling=False, iterations=3, n_std=1):
+    """Low pass filter that removes outliers and averages over 6 minute windows.
+
+    The series is split into blocks of about 6 minutes. On each iteration the
+    samples of a block further than n_std standard deviations from the mean of
+    the 6 minutes ending at the block center are masked, the statistics ignore
+    samples masked on earlier iterations. The remaining samples are then
+    averaged with a trailing 6 minute moving average (rolling) or one mean per
+    block, and masked samples are interpolated. Runs in linear time."""
 
     if fs >= 1 / 180.:
 
         window = int(360 * fs)
-        filter_data = data.copy()
+        filter_data = np.array(data, dtype=np.float64)
         win_idx = np.arange(len(filter_data))
-        means = np.array(pd.Series(filter_data).rolling(window).mean())
-        std_devs = np.array(pd.Series(filter_data).rolling(window).std())
+        
+        # the statistics are taken after the block centers
+        sizes = block_sizes(len(filter_data), window)
+        n_blocks = len(sizes)
+        starts = np.cumsum(sizes) - sizes
+        centers = np.minimum(starts + (sizes - 1) // 2 + 1, len(filter_data) - 1)
+        
+        # 2-D views of the longer leading blocks and the remaining blocks
+        split = (len(filter_data) % n_blocks) * sizes[0]
+        long_blocks = filter_data[:split].reshape(-1, sizes[0])
+        short_blocks = filter_data[split:].reshape(-1, sizes[-1])
 
-        for x in range(3):
-            for win in np.array_split(win_idx, int(len(filter_data) / window)):
-                idx = int(np.mean(win)) + 1
-                filter_data[win][filter_data[win] > means[idx] + std_devs[idx]] = np.nan
-                filter_data[win][filter_data[win] < means[idx] - std_devs[idx]] = np.nan
+        for x in range(iterations):
+            means, std_devs = _trailing_stats(filter_data, window, centers)
+            
+            # mask the outliers in place through the block views
+            bounds = ((long_blocks, slice(0, len(long_blocks))),
+                      (short_blocks, slice(len(long_blocks), n_blocks)))
+            with np.errstate(invalid='ignore'):
+                for block, sl in bounds:
+                    block[np.abs(block - means[sl, np.newaxis]) >
+                          n_std * std_devs[sl, np.newaxis]] = np.nan
 
         if rolling is True:
-            filter_data = np.array(pd.Series(filter_data).rolling(window).mean())
+            filter_data = _trailing_mean(filter_data, window)
         else:
-            for win in np.array_split(win_idx, int(len(filter_data) / window)):
-                data_mean = np.nanmean(filter_data[win])
-                filter_data[win] = np.nan
-                filter_data[int(np.mean(win))] = data_mean
-
-        no_nan_mask = np.repeat(True, len(filter_data)) ^ np.isnan(filter_data)
+            valid = ~np.isnan(filter_data)
+            sums = np.add.reduceat(np.where(valid, filter_data, 0), starts)
+            counts = np.add.reduceat(valid, starts)
+            with np.errstate(invalid='ignore', divide='ignore'):
+                block_means = sums / counts
+            filter_data = np.full(len(filter_data), np.nan)
+            filter_data[starts + (sizes - 1) // 2] = block_means
+
+        no_nan_mask = ~np.isnan(filter_data)
         filter_data = np.interp(win_idx, win_idx[no_nan_mask], filter_data[no_nan_mask])
 
         return filter_data
 
     else:
         return data
+
+
+def block_sizes(n_samples, window):
+    """Sizes of the blocks of the rolling std filters, the blocks np.array_split
+    splits n_samples into: n_samples // window blocks (at least one), the
+    longer ones first"""
+    n_blocks = max(int(n_samples / window), 1)
+    sizes = np.full(n_blocks, n_samples // n_blocks)
+    sizes[:n_samples % n_blocks] += 1
+    return sizes
+
+
+def _trailing_stats(data, window, idx):
+    """Mean and standard deviation (ddof 1) of the valid samples in the window
+    ending at each idx, NaN where there are fewer than two"""
+    padded = np.concatenate((np.full(window - 1, np.nan), data))
+    values = _windows(padded, window, 1)[idx]
+    
+    valid = ~np.isnan(values)
+    n = np.sum(valid, axis=1)
+    values[~valid] = 0
+    with np.errstate(invalid='ignore', divide='ignore'):
+        means = np.sum(values, axis=1) / n
+        values -= means[:, np.newaxis]
+        values[~valid] = 0
+        std_devs = np.sqrt(np.sum(values**2, axis=1) / (n - 1))
+    means[n < 2] = np.nan
+    std_devs[n < 2] = np.nan
+    return means, std_devs
+
+
+def _trailing_mean(data, window):
+    """Mean of the valid samples in the window ending at every sample"""
+    valid = ~np.isnan(data)
+    shift = np.mean(data[valid]) if np.any(valid) else 0
+    
+    # cumulative sums of the shifted samples keep their precision over long records
+    sums = np.concatenate(([0], np.cumsum(np.where(valid, data - shift, 0))))
+    counts = np.concatenate(([0], np.cumsum(valid)))
+    end = np.arange(1, len(data) + 1)
+    start = np.maximum(end - window, 0)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return (sums[end] - sums[start]) / (counts[end] - counts[start]) + shift
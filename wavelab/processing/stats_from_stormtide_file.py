@@ -32,6 +32,7 @@ if __name__ == '__main__':
     so.netCDF['Storm Tide with Unfiltered Water Level'] = Bool(False)
     so.netCDF['Storm Tide Water Level'] = Bool(False)
     so.netCDF['Wave Statistics'] = Bool(True)
+    so.netCDF['Wave Water Level'] = Bool(False)
 
     so.timezone = 'GMT'
     so.daylight_savings = False
@@ -0,0 +1,239 @@
+#!/usr/bin/env python3
+"""
+This module extracts the relevant information from the StormOptions object
+and creates the outputs selected in StormOptions.csv as typed columnar
+Parquet or Arrow Feather files, a columnar counterpart to storm_csv.
+
+Times are UTC millisecond timestamps, levels and pressures are in meters and
+decibars whatever the CSV units and the site metadata (location, STN ids,
+datum, version, filter) is stored as JSON under the b'wavelab' key of the
+schema metadata. Uncompressed Feather files (the default) load with
+read_table as a zero copy memory map.
+
+Requires pyarrow.
+"""
+import os
+import json
+import numpy as np
+from wavelab.utilities import nc, qc
+from wavelab.processing.wave_stats import WAVE_HEIGHT_FACTORS
+
+try:
+    import pyarrow as pa
+    import pyarrow.feather as feather
+    import pyarrow.parquet as pq
+    pyarrow_import = True
+except ImportError:
+    pyarrow_import = False
+
+# file extension of each columnar format
+COLUMNAR_FORMATS = {
+    'feather': '.feather',
+    'parquet': '.parquet'
+}
+
+METADATA_KEY = b'wavelab'
+
+
+class StormColumnar(object):
+    """Writes the CSV outputs as Parquet or Feather tables"""
+
+    def __init__(self, columnar_format='feather', level_dtype=np.float64):
+        if columnar_format not in COLUMNAR_FORMATS:
+            raise ValueError("unknown columnar format: %s" % columnar_format)
+
+        self.columnar_format = columnar_format
+        self.level_dtype = np.dtype(level_dtype)
+
+    def process_columnar(self, so):
+        if pyarrow_import is False:
+            raise ImportError("columnar output requires pyarrow")
+
+        if so.csv['Storm Tide with Unfiltered Water Level'].get() is True:
+            so.get_meta_data()
+            so.get_raw_water_level()
+            so.get_surge_water_level()
+            self.write(self.storm_tide_water_level(so, unfiltered=True), so, '_stormtide_unfiltered')
+
+        if so.csv['Storm Tide Water Level'].get() is True:
+            so.get_meta_data()
+            so.get_raw_water_level()
+            so.get_surge_water_level()
+            self.write(self.storm_tide_water_level(so), so, '_stormtide')
+
+        if so.csv['Atmospheric Pressure'].get() is True:
+            so.get_air_meta_data()
+            so.get_air_time()
+            so.get_raw_air_pressure()
+            self.write(self.atmospheric_pressure(so), so, '_barometric_pressure')
+
+        if so.csv['Stats'].get() is True:
+            if nc.get_frequency(so.sea_fname) >= 4:
+                so.get_meta_data()
+                so.get_air_meta_data()
+                so.get_wave_statistics()
+                self.write(self.stats(so), so, '_stats')
+
+        if so.csv['PSD'].get() is True:
+            if nc.get_frequency(so.sea_fname) >= 4:
+                so.get_meta_data()
+                so.get_air_meta_data()
+                so.get_wave_statistics()
+                self.write(self.psd(so), so, '_psd')
+
+        if so.csv['Wave Water Level'].get() is True:
+            if nc.get_frequency(so.sea_fname) >= 4:
+                so.get_meta_data()
+                so.get_lwt_wave_water_level()
+                self.write(self.wave_water_level(so), so, '_wave_water_level')
+
+    @staticmethod
+    def time_array(time):
+        """UTC timestamps of times in ms"""
+        ms = np.round(np.asarray(time, dtype=np.float64)).astype(np.int64)
+        return pa.array(ms, type=pa.timestamp('ms', tz='UTC'))
+
+    @staticmethod
+    def field(name, array, units=None):
+        metadata = None if units is None else {'units': units}
+        return pa.field(name, array.type, metadata=metadata), array
+
+    def level_array(self, values):
+        return pa.array(np.ma.filled(np.ma.asarray(values, dtype=self.level_dtype), np.nan))
+
+    @staticmethod
+    def pressure_qc(so):
+        """The uint8 pressure qc flags of the sea time, None if the sea file has none"""
+        if 'pressure_qc' not in nc.open_dataset(so.sea_fname).dataset.variables:
+            return None
+        return qc.as_flags(nc.get_flags(so.sea_fname, so.begin, so.end))
+
+    @staticmethod
+    def metadata(so, air=False):
+        """The site and processing metadata of an output"""
+
+        def value(x):
+            if x is None or isinstance(x, str):
+                return x
+            return np.ma.getdata(x).item()
+
+        if air is False:
+            site = {'latitude': value(so.latitude), 'longitude': value(so.longitude),
+                    'stn_station_number': value(so.stn_station_number),
+                    'stn_instrument_id': value(so.stn_instrument_id)}
+        else:
+            site = {'latitude': value(so.air_latitude), 'longitude': value(so.air_longitude),
+                    'stn_station_number': value(so.air_stn_station_number),
+                    'stn_instrument_id': value(so.air_stn_instrument_id)}
+
+        site.update({'datum': value(so.datum),
+                     'storm_name': so.storm_name,
+                     'version': so.version,
+                     'filter': so.use_filter,
+                     'timezone': so.timezone,
+                     'daylight_savings': so.daylight_savings,
+                     'sea_file': os.path.basename(so.sea_fname) if so.sea_fname else None,
+                     'air_file': os.path.basename(so.air_fname) if so.air_fname else None})
+        return site
+
+    def table(self, fields, so, air=False, extra_metadata=None):
+        metadata = self.metadata(so, air)
+        if extra_metadata is not None:
+            metadata.update(extra_metadata)
+        schema = pa.schema([x[0] for x in fields],
+                           metadata={METADATA_KEY: json.dumps(metadata).encode('utf-8')})
+        return pa.Table.from_arrays([x[1] for x in fields], schema=schema)
+
+    def storm_tide_water_level(self, so, unfiltered=False):
+        fields = [self.field('time', self.time_array(so.sea_time)),
+                  self.field('storm_tide_water_level', self.level_array(so.surge_water_level),
+                             'meters')]
+        if unfiltered is True:
+            fields.append(self.field('unfiltered_water_level',
+                                     self.level_array(so.raw_water_level), 'meters'))
+        if so.interpolated_air_pressure is not None:
+            fields.append(self.field('air_pressure',
+                                     self.level_array(so.interpolated_air_pressure), 'decibars'))
+
+        flags = self.pressure_qc(so)
+        if flags is not None and len(flags) == len(so.sea_time):
+            fields.append(self.field('pressure_qc', pa.array(flags)))
+        return self.table(fields, so)
+
+    def wave_water_level(self, so):
+        fields = [self.field('time', self.time_array(so.sea_time)),
+                  self.field('wave_water_level', self.level_array(so.lwt_wave_water_level),
+                             'meters')]
+        return self.table(fields, so)
+
+    def atmospheric_pressure(self, so):
+        fields = [self.field('time', self.time_array(so.air_time)),
+                  self.field('air_pressure', self.level_array(so.raw_air_pressure), 'decibars')]
+        return self.table(fields, so, air=True)
+
+    def stats(self, so):
+        """Every statistic in the stat dictionary with its upper and lower bounds"""
+
+        units = 'meters' if so.international_units is True else 'feet'
+        fields = [self.field('time', self.time_array(so.stat_dictionary['time']))]
+        for name in sorted(so.stat_dictionary):
+            if name in ['time', 'Frequency', 'Spectrum', 'HighSpectrum', 'LowSpectrum']:
+                continue
+            for column, stats in [(name, so.stat_dictionary),
+                                  (name + ' upper', so.upper_stat_dictionary),
+                                  (name + ' lower', so.lower_stat_dictionary)]:
+                if stats is not None and name in stats:
+                    fields.append(self.field(column,
+                                             pa.array(np.asarray(stats[name], dtype=np.float64)),
+                                             units if name in WAVE_HEIGHT_FACTORS else None))
+        return self.table(fields, so)
+
+    def psd(self, so):
+        """The spectra of every window as fixed size list columns, the frequencies
+        are in the metadata"""
+
+        freq = np.asarray(so.stat_dictionary['Frequency'])[0]
+        fields = [self.field('time', self.time_array(so.stat_dictionary['time']))]
+        for name, column in [('Spectrum', 'power_spectral_density'),
+                             ('HighSpectrum', 'power_spectral_density_upper'),
+                             ('LowSpectrum', 'power_spectral_density_lower')]:
+            spectra = np.asarray(so.stat_dictionary[name], dtype=np.float64).reshape(-1, len(freq))
+            # the child is named as Parquet's nested types name it so both formats
+            # read back with the schema written
+            values = pa.FixedSizeListArray.from_arrays(
+                pa.array(spectra.ravel()),
+                type=pa.list_(pa.field('element', pa.float64()), len(freq)))
+            fields.append(self.field(column, values, 'm^2/Hz'))
+        return self.table(fields, so, extra_metadata={'frequency': freq.tolist(),
+                                                      'frequency_units': 'Hz'})
+
+    def write(self, table, so, suffix):
+        out_file_name = ''.join([so.output_fname, suffix, COLUMNAR_FORMATS[self.columnar_format]])
+
+        if self.columnar_format == 'feather':
+            # uncompressed so the file can be memory mapped without a copy
+            feather.write_feather(table, out_file_name, compression='uncompressed')
+        else:
+            pq.write_table(table, out_file_name)
+        return out_file_name
+
+
+def read_table(fname):
+    """Read a columnar output, Feather files are memory mapped"""
+
+    if pyarrow_import is False:
+        raise ImportError("columnar output requires pyarrow")
+    if fname.endswith(COLUMNAR_FORMATS['feather']):
+        return feather.read_table(fname, memory_map=True)
+    return pq.read_table(fname, memory_map=True)
+
+
+def read_metadata(table):
+    """The site and processing metadata of a table from read_table"""
+    return json.loads(table.schema.metadata[METADATA_KEY].decode('utf-8'))
+
+
+def spectra(table, column='power_spectral_density'):
+    """A (windows x frequencies) array of a psd table column"""
+    values = table.column(column).combine_chunks()
+    return values.flatten().to_numpy().reshape(len(values), values.type.list_size)
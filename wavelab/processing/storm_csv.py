@@ -6,7 +6,6 @@ and creates output files in CSV format.
 import pandas as pd
 from wavelab.utilities.nc import get_frequency
 from wavelab.utilities import unit_conversion as uc
-import pytz
 import csv as csv_package
 
 
@@ -49,21 +48,24 @@ class StormCSV(object):
                 so.get_wave_statistics()
                 self.psd(so)
 
+        if so.csv['Wave Water Level'].get() is True:
+            if get_frequency(so.sea_fname) >= 4:
+                so.get_meta_data()
+                so.get_lwt_wave_water_level()
+                self.wave_water_level(so)
+
     @staticmethod
     def format_time(so, time_type='sea'):
         """Get the appropriate datetime string based on the user input"""
         
         if time_type == 'sea':
-            format_time = [uc.convert_ms_to_date(x, pytz.utc) for x in so.sea_time]
+            time = so.sea_time
         if time_type == 'air':
-            format_time = [uc.convert_ms_to_date(x, pytz.utc) for x in so.air_time]
+            time = so.air_time
         if time_type == 'stat':
-            format_time = [uc.convert_ms_to_date(x, pytz.utc) for x in so.stat_dictionary['time']]
-            
-        format_time = uc.adjust_from_gmt(format_time, so.timezone, so.daylight_savings)
-        format_time = [x.strftime('%m/%d/%y %H:%M:%S')for x in format_time]
-            
-        return format_time  
+            time = so.stat_dictionary['time']
+
+        return uc.format_ms(time, so.timezone, so.daylight_savings, '%m/%d/%y %H:%M:%S')
 
     @staticmethod
     def write_header(out_file_name, so, air=False, write_type="normal"):
@@ -92,8 +94,14 @@ class StormCSV(object):
         else:
             return f'{so.timezone} Time'
             
-    def storm_tide_and_unfiltered_water_level(self, so):
-        """csv for Storm Surge and Unfiltered Water Level"""
+    @staticmethod
+    def block_index(values, start=0):
+        """Row labels of a block of rows that starts at row start of the file"""
+        return pd.RangeIndex(start, start + len(values))
+
+    def storm_tide_and_unfiltered_water_level(self, so, start=0):
+        """csv for Storm Surge and Unfiltered Water Level, rows after the first
+        block of a streamed record are appended with start > 0"""
         
         # adjust date times to appropriate time zone
         format_time = self.format_time(so)
@@ -119,20 +127,22 @@ class StormCSV(object):
                                   format_air_pressure_label: format_air_pressure,
                                   format_surge_label: format_surge_water_level,
                                   format_unfiltered_label : format_unfiltered_water_level
-                                  })
+                                  }, index=self.block_index(format_time, start))
         
         out_file_name = ''.join([so.output_fname,'_stormtide_unfiltered','.csv'])
             
-        self.write_header(out_file_name, so)
+        if start == 0:
+            self.write_header(out_file_name, so)
 
         excel_file.to_csv(path_or_buf=out_file_name,
                           mode='a',
+                          header=start == 0,
                           columns=[time_column,
                                    format_unfiltered_label,
                                    format_surge_label,
                                    format_air_pressure_label])
      
-    def storm_tide_water_level(self, so):
+    def storm_tide_water_level(self, so, start=0):
         
         # adjust date times to appropriate time zone
         format_time = self.format_time(so)
@@ -153,19 +163,48 @@ class StormCSV(object):
         excel_file = pd.DataFrame({time_column: format_time,
                                   format_air_pressure_label: format_air_pressure,
                                   format_surge_label : format_surge_water_level,
-                                  })
+                                  }, index=self.block_index(format_time, start))
         
         out_file_name = ''.join([so.output_fname,'_stormtide','.csv'])
             
-        self.write_header(out_file_name, so)
+        if start == 0:
+            self.write_header(out_file_name, so)
          
         # save excel file to path
         excel_file.to_csv(path_or_buf=out_file_name,
-                          mode='a', columns=[time_column,
+                          mode='a', header=start == 0, columns=[time_column,
                                              format_surge_label,
                                              format_air_pressure_label])
 
-    def stats(self, so):
+    def wave_water_level(self, so):
+        
+        # adjust date times to appropriate time zone
+        format_time = self.format_time(so)
+
+        if self.int_units is True:
+            format_wave_water_level = so.lwt_wave_water_level
+            format_wave_label = 'Wave Water Level in Meters'
+        else:
+            format_wave_water_level = so.lwt_wave_water_level * uc.METER_TO_FEET
+            format_wave_label = 'Wave Water Level in Feet'
+        
+        time_column = self.time_column_format(so)
+
+        excel_file = pd.DataFrame({time_column: format_time,
+                                  format_wave_label: format_wave_water_level})
+        
+        out_file_name = ''.join([so.output_fname,'_wave_water_level','.csv'])
+            
+        self.write_header(out_file_name, so)
+         
+        excel_file.to_csv(path_or_buf=out_file_name,
+                          mode='a', columns=[time_column,
+                                             format_wave_label])
+
+    def stats(self, so, start=0):
+        """csv of the wave statistics, the rows of later windows of a streamed
+        record are appended with start > 0"""
+
         # adjust dates to the appropriate timezone
         format_time = self.format_time(so, time_type = 'stat')
         
@@ -184,21 +223,26 @@ class StormCSV(object):
         excel_file = pd.DataFrame({time_column: format_time,
                                   format_hm0_label: format_hm0,
                                   format_tm0_label : format_tm0,
-                                  format_tp_label : format_tp})
+                                  format_tp_label : format_tp},
+                                  index=self.block_index(format_time, start))
         
         out_file_name = ''.join([so.output_fname,'_stats','.csv'])
             
-        self.write_header(out_file_name, so)
+        if start == 0:
+            self.write_header(out_file_name, so)
 
         excel_file.to_csv(path_or_buf=out_file_name,
                           mode='a',
+                          header=start == 0,
                           columns=[time_column,
                                    format_hm0_label,
                                    format_tm0_label,
                                    format_tp_label])
            
-    def psd(self, so):
-        
+    def psd(self, so, start=0):
+        """csv of the power spectral density of every window, the rows of later
+        windows of a streamed record are appended with start > 0"""
+
         columns = []
         value_dict = {}
         format_time = self.format_time(so, time_type = 'stat')
@@ -217,13 +261,15 @@ class StormCSV(object):
             columns.append(column_name)
             value_dict[column_name] = vals
 
-        excel_file = pd.DataFrame(value_dict)
+        excel_file = pd.DataFrame(value_dict, index=self.block_index(format_time, start))
 
         out_file_name = ''.join([so.output_fname, '_psd', '.csv'])
-        self.write_header(out_file_name, so, write_type='PSD')
+        if start == 0:
+            self.write_header(out_file_name, so, write_type='PSD')
 
         excel_file.to_csv(path_or_buf=out_file_name,
                           mode='a',
+                          header=start == 0,
                           columns=columns)
         
     def atmospheric_pressure(self, so):
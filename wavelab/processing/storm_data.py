@@ -4,7 +4,7 @@ water level and wave statistics data.
 """
 import numpy as np
 from wavelab.utilities import nc, unit_conversion as uc
-from wavelab.processing import wave_stats, pressure_to_depth as p2d
+from wavelab.processing import wave_stats, pressure_to_depth as p2d, storm_tide_stream
 
 
 class StormData(object):
@@ -15,8 +15,12 @@ class StormData(object):
         self.fs = 4
 
     @staticmethod
-    def extract_time(fname):
-        return nc.get_time(fname)
+    def extract_time(fname, begin=None, end=None):
+        return nc.get_time(fname, begin, end)
+
+    @staticmethod
+    def extract_time_axis(fname, begin=None, end=None):
+        return nc.get_time_axis(fname, begin, end)
 
     @staticmethod
     def convert_formatted_time(time_data, tzinfo, daylight_savings):
@@ -25,8 +29,8 @@ class StormData(object):
         return uc.adjust_from_gmt(date_times, tzinfo, daylight_savings)
 
     @staticmethod
-    def extract_raw_sea_pressure(fname):
-        return nc.get_pressure(fname)
+    def extract_raw_sea_pressure(fname, begin=None, end=None):
+        return nc.get_pressure(fname, begin, end)
 
     @staticmethod
     def extract_raw_air_pressure(fname):
@@ -102,11 +106,27 @@ class StormData(object):
     def derive_surge_sea_pressure(self, sea_pressure_data, sea_pressure_mean, use_filter=None):
         if use_filter == 'Butterworth':
             return p2d.butterworth_filter(sea_pressure_data - sea_pressure_mean, self.fs)
+        elif use_filter == 'Multirate Butterworth':
+            return p2d.multirate_butterworth_filter(sea_pressure_data - sea_pressure_mean, self.fs)
         elif use_filter == 'Moving Avg 3 Std Devs':
             return p2d.rolling_std_filter(sea_pressure_data - sea_pressure_mean, self.fs, rolling=True)
         else:
             return p2d.rolling_std_filter(sea_pressure_data - sea_pressure_mean, self.fs, rolling=False)
 
+    def derive_decimated_surge_sea_pressure(self, sea_pressure_data, sea_pressure_mean):
+        """Storm tide pressure of the multirate butterworth filter at its reduced rate
+        and the sample indices the values line up with"""
+        return p2d.decimated_butterworth_filter(sea_pressure_data - sea_pressure_mean, self.fs)
+
+    def stream_surge_sea_pressure(self, sea_pressure_blocks, sea_pressure_mean, use_filter=None,
+                                  n_samples=None):
+        """Streaming derive_surge_sea_pressure, yields surge pressure blocks as they are
+        ready while holding only the filter state and look-ahead in memory. n_samples,
+        the length of the whole series, makes the rolling filters match the batch ones"""
+        streaming_filter = storm_tide_stream.make_stream_filter(self.fs, use_filter, n_samples)
+        return storm_tide_stream.stream_filter((np.asarray(x) - sea_pressure_mean for x in sea_pressure_blocks),
+                                               streaming_filter)
+
     @staticmethod
     def derive_wave_sea_pressure(sea_pressure_data, surge_pressure_data, salinity):
         return sea_pressure_data - surge_pressure_data
@@ -125,146 +145,79 @@ class StormData(object):
                                                                  salinity)
 
     @staticmethod
-    def derive_lwt_wave_water_level(sea_time, pressure_data, water_depth, sensor_orifice_elevation):
-        '''ugh I'm using the term water depth again... ill change it'''
-        
-        #removed parameter for timestep since 4hz is necessary for accurate linear wave theory calculations
-        return p2d.combo_method(sea_time, pressure_data,
-                                sensor_orifice_elevation, water_depth)
+    def derive_lwt_wave_water_level(sea_time, pressure_data, device_depth, water_depth, tstep, method='newton'):
+        """Wave water level from pressure with linear wave theory, device_depth is the
+        (negative) depth of the sensor below the surface"""
+        return p2d.combo_method(sea_time, pressure_data, device_depth, water_depth,
+                                tstep=tstep, method=method)
 
     def derive_statistics(self, p_chunks, t_chunks, elev_chunks, orif_chunks, instrument_error,
-                          wchunks=None, meters=True, salinity = "salt"):
+                          wchunks=None, meters=True, salinity = "salt", statistics=None):
+        """Calculate the spectra of every window and the named statistics (all of
+        wave_stats.STATISTICS by default) from them"""
         
         if meters is True:
             units = 1
         else:
             units = uc.METER_TO_FEET
        
-        func_dict = {
-                    'T1/3': lambda spec, freqs, time, depth: self.stats.significant_wave_period(spec,
-                                                                                                freqs,
-                                                                                                depth,
-                                                                                                time[1]-time[0]),
-                    'H1/3': lambda spec, freqs, time, depth: self.stats.significant_wave_height(spec,
-                                                                                                freqs,
-                                                                                                time,
-                                                                                                depth * units),
-                    'H10%': lambda spec, freqs, time, depth: self.stats.ten_percent_wave_height(spec,
-                                                                                                freqs,
-                                                                                                time,
-                                                                                                depth * units),
-                    'H1%': lambda spec, freqs, time, depth: self.stats.one_percent_wave_height(spec,
-                                                                                               freqs,
-                                                                                               time,
-                                                                                               depth * units),
-                    'RMS': lambda spec, freqs, time, depth: self.stats.rms_wave_height(spec,
-                                                                                       freqs,
-                                                                                       time,
-                                                                                       depth * units),
-                    'Median': lambda spec, freqs, time, depth: self.stats.median_wave_height(spec,
-                                                                                             freqs,
-                                                                                             time,
-                                                                                             depth * units),
-                    'Maximum': lambda spec, freqs, time, depth: self.stats.maximum_wave_height(spec,
-                                                                                               freqs,
-                                                                                               time,
-                                                                                               depth * units),
-                    'Average': lambda spec, freqs, time, depth: self.stats.average_wave_height(spec,
-                                                                                               freqs,
-                                                                                               time,
-                                                                                               depth * units),
-                    'Average Z Cross': lambda spec, freqs, time, depth: self.stats.average_zero_crossing_period(spec,
-                                                                                                                freqs,
-                                                                                                                time,
-                                                                                                                depth),
-                    'Mean Wave Period': lambda spec, freqs, time, depth: self.stats.mean_wave_period(spec,
-                                                                                                     freqs,
-                                                                                                     time,
-                                                                                                     depth),
-                    'Crest': lambda spec, freqs, time, depth: self.stats.crest_wave_period(spec,
-                                                                                          freqs,
-                                                                                          time,
-                                                                                          depth),
-                    'Peak Wave': lambda spec, freqs, time, depth: self.stats.peak_wave_period(spec,
-                                                                                              freqs,
-                                                                                              time,
-                                                                                              depth)
-                    }
-        
         stat_dict, upper_stat_dict, lower_stat_dict = {}, {}, {}
-        stat_dict['time'] = [np.average(t) * 1000 for t in t_chunks]
-    
-        stat_dict['Frequency'], stat_dict['Spectrum'] = [], []
-        stat_dict['HighSpectrum'], stat_dict['LowSpectrum'] = [], []
-        
-        # to adjust the units of the wave height calculations
-        wave_height_funcs = ['H1/3', 'H10%', 'H1%', 'Median', 'RMS', 'Maximum', 'Average']
+        p_chunks = np.asarray(p_chunks, dtype=np.float64)
+        t_chunks = np.asarray(t_chunks, dtype=np.float64)
+        stat_dict['time'] = np.mean(t_chunks, axis=-1) * 1000
         
-        for x in range(0,len(t_chunks)):
+        # per window elevations may come in as window means or as full windows
+        elevation = self.window_means(elev_chunks)
+        instrument_height = np.abs(elevation - self.window_means(orif_chunks))
+        water_depth = np.mean(p2d.hydrostatic_method(p_chunks, salinity), axis=-1) + instrument_height
+
+        # every window shares the sampling rate so all spectra come from one batched fft
+        tstep = t_chunks[0][1] - t_chunks[0][0] if len(t_chunks) > 0 else 1.0 / self.fs
+        freq, amp, high, low = self.stats.batch_power_spectrum(p_chunks,
+                                                               tstep,
+                                                               instrument_height,
+                                                               water_depth)
+
+        stat_dict['Frequency'] = np.broadcast_to(freq, amp.shape)
+        stat_dict['Spectrum'] = amp
+        stat_dict['HighSpectrum'] = high
+        stat_dict['LowSpectrum'] = low
             
-            elevation = np.mean(elev_chunks[x])
-            instrument_height = np.abs(elevation - np.mean(orif_chunks[x]))
-            water_depth = np.mean(p2d.hydrostatic_method(p_chunks[x], salinity)) + instrument_height
-
-            freq, amp, high, low = self.stats.power_spectrum(p_chunks[x],
-                                                             t_chunks[x][1]-t_chunks[x][0],
-                                                             instrument_height,
-                                                             water_depth)
-
-
-
-            stat_dict['Frequency'].append(freq)
-            stat_dict['Spectrum'].append(amp)
-            stat_dict['HighSpectrum'].append(high)
-            stat_dict['LowSpectrum'].append(low)
-            
-        for y in func_dict:
-            stat_dict[y] = []
-            upper_stat_dict[y] = []
-            lower_stat_dict[y] = []
-            
-        for x in range(0,len(stat_dict['time'])):
-            for y in func_dict:
-             
-                if y in wave_height_funcs:
-                    stat_dict[y].append(self.process_chunk(func_dict[y],
-                                                           t_chunks[x],
-                                                           p_chunks[x],
-                                                           stat_dict['Spectrum'][x],
-                                                           stat_dict['Frequency'][x]) * units)
-                    upper_stat_dict[y].append(
-                        (self.process_chunk(func_dict[y],
-                                                                 t_chunks[x],
-                                                                 p_chunks[x],
-                                                                 stat_dict['HighSpectrum'][x],
-                                                                 stat_dict['Frequency'][x]) + instrument_error)
-                                              * units)
-                    lower_stat_dict[y].append(
-                        (self.process_chunk(func_dict[y],
-                                                                 t_chunks[x],
-                                                                 p_chunks[x],
-                                                                 stat_dict['LowSpectrum'][x],
-                                                                 stat_dict['Frequency'][x]) - instrument_error)
-                                              * units)
-                else:
-                    stat_dict[y].append(self.process_chunk(func_dict[y],
-                                                           t_chunks[x],
-                                                           p_chunks[x],
-                                                           stat_dict['Spectrum'][x],
-                                                           stat_dict['Frequency'][x]))
-                    upper_stat_dict[y].append(self.process_chunk(func_dict[y],
-                                                                 t_chunks[x],
-                                                                 p_chunks[x],
-                                                                 stat_dict['HighSpectrum'][x],
-                                                                 stat_dict['Frequency'][x]))
-                    lower_stat_dict[y].append(self.process_chunk(func_dict[y],
-                                                                 t_chunks[x],
-                                                                 p_chunks[x],
-                                                                 stat_dict['LowSpectrum'][x],
-                                                                 stat_dict['Frequency'][x]))
+        # every statistic comes from one moment table per spectrum, the
+        # trapezoid weighted frequency powers are shared by all three spectra
+        # and only the moments the requested statistics depend on are integrated
+        orders = self.stats.moment_orders(statistics)
+        weights = self.stats.moment_weights(freq, orders)
+        estimate = self.stats.moment_statistics(self.stats.moment_table(amp, weights, orders),
+                                                freq, statistics)
+        upper = self.stats.moment_statistics(self.stats.moment_table(high, weights, orders),
+                                             freq, statistics)
+        lower = self.stats.moment_statistics(self.stats.moment_table(low, weights, orders),
+                                             freq, statistics)
+
+        for y in estimate:
+
+            # to adjust the units of the wave height calculations
+            if y in wave_stats.WAVE_HEIGHT_FACTORS:
+                stat_dict[y] = estimate[y] * units
+                upper_stat_dict[y] = (upper[y] + instrument_error) * units
+                lower_stat_dict[y] = (lower[y] - instrument_error) * units
+            else:
+                stat_dict[y] = estimate[y]
+                upper_stat_dict[y] = upper[y]
+                lower_stat_dict[y] = lower[y]
       
         return [stat_dict, upper_stat_dict, lower_stat_dict]
 
+    @staticmethod
+    def window_means(chunks):
+        """Return one value per window from either per window values or
+        a 2-D (n_windows x window) array"""
+        chunks = np.asarray(chunks, dtype=np.float64)
+        if chunks.ndim > 1:
+            return np.mean(chunks, axis=-1)
+        return chunks
+
     @staticmethod
     def process_chunk(stat_func, t_chunk, d_chunk, spec, freq):
         if np.isnan(np.sum(d_chunk)) is True:
@@ -29,6 +29,8 @@ class StormGraph(object):
         self.figure = None
         self.grid_spec = None
         self.time_nums = None
+        self.surge_time_nums = None
+        self.surge_depth = None
         self.wind_time_nums = None
         self.df = None
         self.international_units = False
@@ -55,6 +57,7 @@ class StormGraph(object):
                 so.get_raw_water_level()
                 so.get_surge_water_level()
 
+            so.get_decimated_surge_water_level()
             so.test_water_elevation_below_sensor_orifice_elevation()
 
             self.create_header(so)
@@ -76,6 +79,7 @@ class StormGraph(object):
                 so.get_air_meta_data()
             so.get_raw_water_level()
             so.get_surge_water_level()
+            so.get_decimated_surge_water_level()
             so.test_water_elevation_below_sensor_orifice_elevation()
             self.create_header(so)
             self.storm_tide_water_level(so)
@@ -142,32 +146,28 @@ class StormGraph(object):
 
         del new_dates
 
-        time = so.sea_time
-        self.time_nums = np.linspace(first_date, last_date, len(time))
-        self.time_nums2 = np.linspace(first_date, last_date, len(time))
+        self.time_nums = np.linspace(first_date, last_date, len(so.sea_time))
+        self.time_nums2 = np.linspace(first_date, last_date, len(so.sea_time))
+
+        # the storm tide is plotted at the reduced rate of the multirate butterworth filter
+        self.surge_time_nums = self.time_nums[so.surge_water_level_index]
 
         if so.level_troll is True:
             so.interpolated_air_pressure = np.zeros(so.surge_water_level.shape[0])
 
         if self.international_units is True:
             # create dataframe in meters
-            graph_data = {'Pressure': pd.Series(so.interpolated_air_pressure,
-                                                index=time),
-                          # 'PressureQC': pd.Series(air_qc, index=time),
-                          'SurgeDepth': pd.Series(so.surge_water_level,
-                                                  index=time),
-                          'RawDepth': pd.Series(so.raw_water_level,
-                                                index=time)}
+            graph_data = {'Pressure': pd.Series(so.interpolated_air_pressure),
+                          # 'PressureQC': pd.Series(air_qc),
+                          'RawDepth': pd.Series(so.raw_water_level)}
+            self.surge_depth = so.decimated_surge_water_level
         else:
             # create dataframe
-            graph_data = {'Pressure': pd.Series(so.interpolated_air_pressure * uc.DBAR_TO_INCHES_OF_MERCURY,
-                                                index=time),
-                          # 'PressureQC': pd.Series(air_qc, index=time),
-                          'SurgeDepth': pd.Series(so.surge_water_level * uc.METER_TO_FEET,
-                                                  index=time),
-                          'RawDepth': pd.Series(so.raw_water_level * uc.METER_TO_FEET,
-                                                index=time)
+            graph_data = {'Pressure': pd.Series(so.interpolated_air_pressure * uc.DBAR_TO_INCHES_OF_MERCURY),
+                          # 'PressureQC': pd.Series(air_qc),
+                          'RawDepth': pd.Series(so.raw_water_level * uc.METER_TO_FEET)
                     }
+            self.surge_depth = so.decimated_surge_water_level * uc.METER_TO_FEET
 
         self.df = pd.DataFrame(graph_data)
 
@@ -307,21 +307,21 @@ class StormGraph(object):
         depth_min_start = np.min(self.df.RawDepth)
 
         depth_idx = np.nanargmax(so.raw_water_level)
-        tide_idx = np.nanargmax(so.surge_water_level)
+        tide_idx = np.nanargmax(so.decimated_surge_water_level)
 
         # get the sensor min, max depth, and storm tide in max in the appropriate units
         if self.international_units is True:
             sensor_min = np.min(so.sensor_orifice_elevation)
             depth_max = so.raw_water_level[depth_idx]
-            tide_max = so.surge_water_level[tide_idx]
+            tide_max = so.decimated_surge_water_level[tide_idx]
         else:
             sensor_min = np.min(so.sensor_orifice_elevation * uc.METER_TO_FEET)
             depth_max = so.raw_water_level[depth_idx] * uc.METER_TO_FEET
-            tide_max = so.surge_water_level[tide_idx] * uc.METER_TO_FEET
+            tide_max = so.decimated_surge_water_level[tide_idx] * uc.METER_TO_FEET
 
         # calculate and format the datetime of the unfiltered and storm tide maximum
 
-        tide_time = mdates.num2date(self.time_nums[tide_idx], pytz.timezone('GMT'))
+        tide_time = mdates.num2date(self.surge_time_nums[tide_idx], pytz.timezone('GMT'))
         depth_time = mdates.num2date(self.time_nums[depth_idx], pytz.timezone('GMT'))
 
         #         tide_time, depth_time = uc.adjust_from_gmt([tide_time,depth_time], \
@@ -331,7 +331,7 @@ class StormGraph(object):
         depth_time = datetime.strftime(depth_time, '%Y-%m-%d %H:%M:%S')
 
         depth_num = self.time_nums[depth_idx]
-        tide_num = self.time_nums[tide_idx]
+        tide_num = self.surge_time_nums[tide_idx]
 
         depth_min = np.floor(depth_min_start * 100.0) / 100.0
 
@@ -394,10 +394,10 @@ class StormGraph(object):
             add_entry(entry, 'Barometric Pressure')
 
         if graph_stormtide:
-            entry, = ax.plot(self.time_nums, self.df.SurgeDepth, color="#045a8d" )
+            entry, = ax.plot(self.surge_time_nums, self.surge_depth, color="#045a8d" )
             add_entry(entry, 'Storm Tide (Butterworth 6-minute Filtered) Water Elevation')
 
-        entry, = ax.plot(self.time_nums, np.repeat(sensor_min, len(self.df.SurgeDepth)), linestyle="--",
+        entry, = ax.plot(self.time_nums, np.repeat(sensor_min, len(self.time_nums)), linestyle="--",
                       color="#fd8d3c")
         add_entry(entry, "Minimum Recordable Water Elevation")
 
@@ -409,7 +409,7 @@ class StormGraph(object):
             entry = ax.axhspan(so.reference_elevation, tide_max, alpha=0.25,
                                              color='#add8e6', linewidth=0)
             add_entry(entry, f'Water Depth Above {so.reference_name}')
-            entry, = ax.plot(self.time_nums, np.repeat(so.reference_elevation, len(self.df.SurgeDepth)),
+            entry, = ax.plot(self.time_nums, np.repeat(so.reference_elevation, len(self.time_nums)),
                                           linestyle="--", color="#000000")
             add_entry(entry, so.reference_name)
             inst_accuracy_y = 1.105
@@ -501,21 +501,21 @@ class StormGraph(object):
         ax.set_xlabel(f'Timezone: { so.timezone}')
         
         # plan on rebuilding the flow of execution, ignore spaghetti for now
-        depth_min_start = np.nanmin(so.surge_water_level)
+        depth_min_start = np.nanmin(so.decimated_surge_water_level)
         
-        tide_idx = np.nanargmax(so.surge_water_level)
+        tide_idx = np.nanargmax(so.decimated_surge_water_level)
         
         if self.international_units is True:
             sensor_min = np.min(so.sensor_orifice_elevation)
-            tide_max = so.surge_water_level[tide_idx]
+            tide_max = so.decimated_surge_water_level[tide_idx]
         else:
             sensor_min = np.min(so.sensor_orifice_elevation * uc.METER_TO_FEET)
-            tide_max = so.surge_water_level[tide_idx] * uc.METER_TO_FEET
+            tide_max = so.decimated_surge_water_level[tide_idx] * uc.METER_TO_FEET
 
-        tide_time = mdates.num2date(self.time_nums[tide_idx], pytz.timezone('GMT'))
+        tide_time = mdates.num2date(self.surge_time_nums[tide_idx], pytz.timezone('GMT'))
         
         tide_time = datetime.strftime(tide_time, '%Y-%m-%d %H:%M:%S')
-        tide_num = self.time_nums[tide_idx]
+        tide_num = self.surge_time_nums[tide_idx]
 
         depth_min = np.floor(depth_min_start * 100.0)/100.0
        
@@ -559,8 +559,8 @@ class StormGraph(object):
 
         if so.level_troll is False:
             p1, = par1.plot(self.time_nums, self.df.Pressure, color="red")
-        p2, = ax.plot(self.time_nums,self.df.SurgeDepth, color="#045a8d")
-        p3, = ax.plot(self.time_nums,np.repeat(sensor_min, len(self.df.SurgeDepth)), linestyle="--", color="#fd8d3c")
+        p2, = ax.plot(self.surge_time_nums,self.surge_depth, color="#045a8d")
+        p3, = ax.plot(self.time_nums,np.repeat(sensor_min, len(self.time_nums)), linestyle="--", color="#fd8d3c")
         p6,  = ax.plot(tide_num,tide_max, '^', markersize=10, color='#045a8d', alpha=1)
 
         ref = False
@@ -569,7 +569,7 @@ class StormGraph(object):
         if so.reference_elevation is not None and so.reference_elevation != '':
             ref = True
             p7 = ax.axhspan(so.reference_elevation, tide_max, alpha=0.25, color='#add8e6', linewidth=0)
-            p8, = ax.plot(self.time_nums, np.repeat(so.reference_elevation, len(self.df.SurgeDepth)), linestyle="--",
+            p8, = ax.plot(self.time_nums, np.repeat(so.reference_elevation, len(self.time_nums)), linestyle="--",
                           color="#000000")
             legend_y = 1.385
             inst_accuracy_y = 1.115
@@ -4,7 +4,6 @@ Class to output water level and wave statistics netCDF files
 from wavelab.utilities import nc
 from wavelab.processing.storm_options import StormOptions
 import uuid
-import time
 
 
 class Storm_netCDF(object):
@@ -21,16 +20,12 @@ class Storm_netCDF(object):
             so.get_wave_water_level()
             self.storm_tide_and_unfiltered_water_level(so)
 
-        time.sleep(2)
-
         if so.netCDF['Storm Tide Water Level'].get() is True:
             so.get_meta_data()
             so.get_raw_water_level()
             so.get_surge_water_level()
             self.storm_tide_water_level(so)
 
-        time.sleep(2)
-
         if so.netCDF['Wave Statistics'].get() is True:
             if nc.get_frequency(so.sea_fname) >= 4:
                 so.get_meta_data()
@@ -40,197 +35,252 @@ class Storm_netCDF(object):
                 so.get_wave_statistics()
                 self.wave_statistics(so)
 
+        if so.netCDF['Wave Water Level'].get() is True:
+            if nc.get_frequency(so.sea_fname) >= 4:
+                so.get_meta_data()
+                so.get_lwt_wave_water_level()
+                self.wave_water_level(so)
+
     @staticmethod
-    def common_attributes(so, file_name, step):
+    def stepped(values, step, data=True):
+        """values[::step], or None when the data is written later in blocks"""
+        return values[::step] if data is True else None
+
+    def common_attributes(self, so, output, step, data=True):
+        """Set the attributes shared by the water level files on the
+        nc.NetCDFBuilder output"""
 
-        # nc.set_var_attribute(water_fname, 'sea_pressure', 'sea_uuid', sea_uuid)
-        nc.set_global_attribute(file_name, 'uuid', str(uuid.uuid4()))
+        output.set_global_attribute('uuid', str(uuid.uuid4()))
     
         # append air pressure
         if so.level_troll is False:
             instr_dict = nc.get_instrument_data(so.air_fname, 'air_pressure')
-            nc.append_air_pressure(file_name, so.interpolated_air_pressure[::step], so.air_fname)
-            nc.set_instrument_data(file_name, 'air_pressure', instr_dict)
+            output.append_air_pressure(self.stepped(so.interpolated_air_pressure, step, data),
+                                       so.air_fname)
+            output.set_instrument_data('air_pressure', instr_dict)
     
         # update the lat and lon comments
-        lat_comment = nc.get_variable_attr(file_name, 'latitude', 'comment')
-        nc.set_var_attribute(file_name,
-                             'latitude',
-                             'comment',
-                             ''.join([lat_comment,
-                                      ' Latitude of sea pressure sensor used to derive ',
-                                      'sea surface elevation.']))
-
-        lon_comment = nc.get_variable_attr(file_name,
-                                           'longitude',
-                                           'comment')
-
-        nc.set_var_attribute(file_name,
-                             'longitude',
-                             'comment',
-                             ''.join([lon_comment,
-                                      ' Longitude of sea pressure sensor used to derive ',
-                                      'sea surface elevation.']))
+        lat_comment = output.get_variable_attr('latitude', 'comment')
+        output.set_var_attribute('latitude',
+                                 'comment',
+                                 ''.join([lat_comment,
+                                          ' Latitude of sea pressure sensor used to derive ',
+                                          'sea surface elevation.']))
+
+        lon_comment = output.get_variable_attr('longitude', 'comment')
+
+        output.set_var_attribute('longitude',
+                                 'comment',
+                                 ''.join([lon_comment,
+                                          ' Longitude of sea pressure sensor used to derive ',
+                                          'sea surface elevation.']))
     
         # set sea_pressure instrument data to global variables in water_level netCDF
         sea_instr_data = nc.get_instrument_data(so.sea_fname, 'sea_pressure')
         for x in sea_instr_data:
             attrname = ''.join(['sea_pressure_',x])
-            nc.set_global_attribute(file_name, attrname, sea_instr_data[x])
-        lat = nc.get_variable_data(file_name, 'latitude')
-        lon = nc.get_variable_data(file_name, 'longitude')
+            output.set_global_attribute(attrname, sea_instr_data[x])
+        lat = output.get_variable_data('latitude')
+        lon = output.get_variable_data('longitude')
    
-        first_stamp = nc.get_global_attribute(file_name, 'time_coverage_start')
-        last_stamp = nc.get_global_attribute(file_name, 'time_coverage_end')
+        first_stamp = output.get_global_attribute('time_coverage_start')
+        last_stamp = output.get_global_attribute('time_coverage_end')
         
-        nc.set_global_attribute(file_name, 'title', 'Calculation of water level at %.4f latitude,'
-                                ' %.4f degrees longitude from the date range of %s to %s.'
-                                % (lat, lon, first_stamp, last_stamp))
+        output.set_global_attribute('title', 'Calculation of water level at %.4f latitude,'
+                                    ' %.4f degrees longitude from the date range of %s to %s.'
+                                    % (lat, lon, first_stamp, last_stamp))
 
-        nc.set_global_attribute(file_name, 'version', '{0}'.format(so.version))
-        nc.set_global_attribute(file_name, 'storm_name', so.storm_name)
+        output.set_global_attribute('version', '{0}'.format(so.version))
+        output.set_global_attribute('storm_name', so.storm_name)
 
     def storm_tide_and_unfiltered_water_level(self, so):
+        self.build_storm_tide_and_unfiltered_water_level(so).write()
+
+    def build_storm_tide_and_unfiltered_water_level(self, so, data=True):
+        """nc.NetCDFBuilder of the storm tide with unfiltered water level file, with
+        data False the time series are left empty for a streaming writer"""
 
         out_fname2 = ''.join([so.output_fname,'_stormtide_unfiltered', '.nc'])
         
         step = 1
-        nc.custom_copy(so.sea_fname, out_fname2, so.begin, so.end, mode='storm_surge', step=step)
-        self.common_attributes(so, out_fname2, step)
+        output = nc.build_custom_copy(so.sea_fname, out_fname2, so.begin, so.end,
+                                      mode='storm_surge', step=step, profile=so.output_profile,
+                                      copy_data=data)
+        self.common_attributes(so, output, step, data)
 
         has_air = " 4) air pressure" if so.level_troll is False else ""
 
-        nc.set_global_attribute(out_fname2, 'summary', 'This file contains four time series: '
-                                '1) sea pressure 2) sea surface elevation'
-                                ' 3) unfiltered sea surface elevation%s.'
-                                ' The third was derived'
-                                ' from a time series of high frequency sea pressure measurements'
-                                ' adjusted using the former and then lowpass filtered to remove'
-                                ' waves of period 6 minutes or less. The fourth is also sea surface elevation'
-                                ' with no such filter.')
+        output.set_global_attribute('summary', 'This file contains four time series: '
+                                    '1) sea pressure 2) sea surface elevation'
+                                    ' 3) unfiltered sea surface elevation%s.'
+                                    ' The third was derived'
+                                    ' from a time series of high frequency sea pressure measurements'
+                                    ' adjusted using the former and then lowpass filtered to remove'
+                                    ' waves of period 6 minutes or less. The fourth is also sea surface elevation'
+                                    ' with no such filter.')
         
-        nc.append_depth(out_fname2, so.surge_water_level[::step])
+        output.append_depth(self.stepped(so.surge_water_level, step, data))
         sea_uuid = nc.get_global_attribute(so.sea_fname, 'uuid')
 
-        nc.append_variable(out_fname2,
-                           'unfiltered_water_surface_height_above_reference_datum',
-                           so.raw_water_level[::step],
-                           'Unfiltered Sea Surface Elevation',
-                           'unfiltered_water_surface_height_above_reference_datum')
-
-        nc.set_var_attribute(out_fname2,
-                             'water_surface_height_above_reference_datum',
-                             'sea_uuid',
-                             sea_uuid)
-        nc.set_var_attribute(out_fname2,
-                             'water_surface_height_above_reference_datum',
-                             'combined_level_accuracy_in_meters+-',
-                             so.combined_level_accuracy_in_meters)
-
-        nc.set_var_attribute(out_fname2,
-                             'unfiltered_water_surface_height_above_reference_datum',
-                             'sea_uuid', sea_uuid)
-        nc.set_var_attribute(out_fname2,
-                             'unfiltered_water_surface_height_above_reference_datum',
-                             'units',
-                             'meters')
-        nc.set_var_attribute(out_fname2,
-                             'unfiltered_water_surface_height_above_reference_datum',
-                             'nodc_name',
-                             'WATER LEVEL')
-        nc.set_var_attribute(out_fname2,
-                             'unfiltered_water_surface_height_above_reference_datum',
-                             'ioos_category',
-                             'sea_level')
-        nc.set_var_attribute(out_fname2,
-                             'unfiltered_water_surface_height_above_reference_datum',
-                             'combined_level_accuracy_in_meters+-',
-                             so.combined_level_accuracy_in_meters)
+        output.append_variable('unfiltered_water_surface_height_above_reference_datum',
+                               self.stepped(so.raw_water_level, step, data),
+                               'Unfiltered Sea Surface Elevation',
+                               'unfiltered_water_surface_height_above_reference_datum')
+
+        output.set_var_attribute('water_surface_height_above_reference_datum',
+                                 'sea_uuid',
+                                 sea_uuid)
+        output.set_var_attribute('water_surface_height_above_reference_datum',
+                                 'combined_level_accuracy_in_meters+-',
+                                 so.combined_level_accuracy_in_meters)
+
+        output.set_var_attribute('unfiltered_water_surface_height_above_reference_datum',
+                                 'sea_uuid', sea_uuid)
+        output.set_var_attribute('unfiltered_water_surface_height_above_reference_datum',
+                                 'units',
+                                 'meters')
+        output.set_var_attribute('unfiltered_water_surface_height_above_reference_datum',
+                                 'nodc_name',
+                                 'WATER LEVEL')
+        output.set_var_attribute('unfiltered_water_surface_height_above_reference_datum',
+                                 'ioos_category',
+                                 'sea_level')
+        output.set_var_attribute('unfiltered_water_surface_height_above_reference_datum',
+                                 'combined_level_accuracy_in_meters+-',
+                                 so.combined_level_accuracy_in_meters)
 
         if so.level_troll is False:
             air_uuid = nc.get_global_attribute(so.air_fname, 'uuid')
-            nc.set_var_attribute(out_fname2, 'air_pressure', 'air_uuid', air_uuid)
-            nc.set_var_attribute(out_fname2,
-                                 'water_surface_height_above_reference_datum',
-                                 'air_uuid',
-                                 air_uuid)
-            nc.set_var_attribute(out_fname2,
-                                 'unfiltered_water_surface_height_above_reference_datum',
-                                 'air_uuid',
-                                 air_uuid)
+            output.set_var_attribute('air_pressure', 'air_uuid', air_uuid)
+            output.set_var_attribute('water_surface_height_above_reference_datum',
+                                     'air_uuid',
+                                     air_uuid)
+            output.set_var_attribute('unfiltered_water_surface_height_above_reference_datum',
+                                     'air_uuid',
+                                     air_uuid)
 
+        return output
 
     def storm_tide_water_level(self, so):
+        self.build_storm_tide_water_level(so).write()
+
+    def build_storm_tide_water_level(self, so, data=True):
+        """nc.NetCDFBuilder of the storm tide water level file, with data False
+        the time series are left empty for a streaming writer"""
 
         out_fname2 = ''.join([so.output_fname, '_stormtide', '.nc'])
         
         step = 1
-        nc.custom_copy(so.sea_fname, out_fname2, so.begin, so.end, mode ='storm_surge', step=step)
+        output = nc.build_custom_copy(so.sea_fname, out_fname2, so.begin, so.end,
+                                      mode='storm_surge', step=step, profile=so.output_profile,
+                                      copy_data=data)
         
-        self.common_attributes(so, out_fname2, step)
+        self.common_attributes(so, output, step, data)
 
         has_air = " 3) air pressure" if so.level_troll is False else ""
 
-        nc.set_global_attribute(out_fname2,
-                                'summary',
-                                'This file contains three time series: 1)' 
-                                ' sea pressure 2) sea surface elevation%s.  The second was derived'
-                                ' from a time series of high frequency sea pressure measurements '
-                                ' adjusted using the former and then lowpass filtered to remove '
-                                ' waves of period 6 minutes or less.' % has_air)
+        output.set_global_attribute('summary',
+                                    'This file contains three time series: 1)' 
+                                    ' sea pressure 2) sea surface elevation%s.  The second was derived'
+                                    ' from a time series of high frequency sea pressure measurements '
+                                    ' adjusted using the former and then lowpass filtered to remove '
+                                    ' waves of period 6 minutes or less.' % has_air)
         
-        nc.append_depth(out_fname2, so.surge_water_level[::step])
+        output.append_depth(self.stepped(so.surge_water_level, step, data))
         
         sea_uuid = nc.get_global_attribute(so.sea_fname, 'uuid')
 
-        nc.set_var_attribute(out_fname2,
-                             'water_surface_height_above_reference_datum',
-                             'sea_uuid',
-                             sea_uuid)
-        nc.set_var_attribute(out_fname2,
-                             'water_surface_height_above_reference_datum',
-                             'combined_level_accuracy_in_meters+-',
-                             so.combined_level_accuracy_in_meters)
+        output.set_var_attribute('water_surface_height_above_reference_datum',
+                                 'sea_uuid',
+                                 sea_uuid)
+        output.set_var_attribute('water_surface_height_above_reference_datum',
+                                 'combined_level_accuracy_in_meters+-',
+                                 so.combined_level_accuracy_in_meters)
+
+        if so.level_troll is False:
+            air_uuid = nc.get_global_attribute(so.air_fname, 'uuid')
+            output.set_var_attribute('air_pressure', 'air_uuid', air_uuid)
+            output.set_var_attribute('water_surface_height_above_reference_datum',
+                                     'air_uuid',
+                                     air_uuid)
+
+        return output
+
+    def wave_water_level(self, so):
+
+        out_fname2 = ''.join([so.output_fname, '_wave_water_level', '.nc'])
+
+        step = 1
+        output = nc.build_custom_copy(so.sea_fname, out_fname2, so.begin, so.end,
+                                      mode='storm_surge', step=step, profile=so.output_profile)
+
+        self.common_attributes(so, output, step)
+
+        output.set_global_attribute('summary',
+                                    'This file contains a time series of wave water level derived from'
+                                    ' high frequency sea pressure measurements with linear wave theory.'
+                                    ' The pressure was converted in overlapping windows of 4096 samples'
+                                    ' using the water depth of each window.')
+
+        output.append_variable('wave_water_level',
+                               so.lwt_wave_water_level[::step],
+                               'Linear Wave Theory Wave Water Level',
+                               'wave_water_level')
+
+        sea_uuid = nc.get_global_attribute(so.sea_fname, 'uuid')
+
+        output.set_var_attribute('wave_water_level', 'sea_uuid', sea_uuid)
+        output.set_var_attribute('wave_water_level', 'units', 'meters')
+        output.set_var_attribute('wave_water_level', 'nodc_name', 'WATER LEVEL')
+        output.set_var_attribute('wave_water_level', 'ioos_category', 'sea_level')
+        output.set_var_attribute('wave_water_level',
+                                 'combined_level_accuracy_in_meters+-',
+                                 so.combined_level_accuracy_in_meters)
 
         if so.level_troll is False:
             air_uuid = nc.get_global_attribute(so.air_fname, 'uuid')
-            nc.set_var_attribute(out_fname2, 'air_pressure', 'air_uuid', air_uuid)
-            nc.set_var_attribute(out_fname2,
-                                 'water_surface_height_above_reference_datum',
-                                 'air_uuid',
-                                 air_uuid)
+            output.set_var_attribute('air_pressure', 'air_uuid', air_uuid)
+            output.set_var_attribute('wave_water_level', 'air_uuid', air_uuid)
+
+        output.write()
 
     @staticmethod
     def wave_statistics(so):
+        Storm_netCDF.build_wave_statistics(so).write()
+
+    @staticmethod
+    def build_wave_statistics(so, data=True, n_times=None):
+        """nc.NetCDFBuilder of the wave statistics file, with data False the
+        statistics along time are left empty for a streaming writer and the
+        file has n_times windows"""
 
         out_fname2 = ''.join([so.output_fname, '_wave_statistics', '.nc'])
         step = 1
-        nc.wave_stats_copy(so.sea_fname, out_fname2, so)
+        output = nc.build_wave_stats_copy(so.sea_fname, out_fname2, so, profile=so.output_profile,
+                                          n_times=n_times, copy_data=data)
 
         sea_uuid = nc.get_global_attribute(so.sea_fname, 'uuid')
         air_uuid = nc.get_global_attribute(so.air_fname, 'uuid')
 
-        nc.set_global_attribute(out_fname2,
-                                'sea_uuid',
-                                sea_uuid)
+        output.set_global_attribute('sea_uuid',
+                                    sea_uuid)
+
+        output.set_global_attribute('air_uuid',
+                                    air_uuid)
 
-        nc.set_global_attribute(out_fname2,
-                                'air_uuid',
-                                air_uuid)
+        output.set_global_attribute('summary',
+                                    'This file contains time, frequency, power spectral density, and wave statistics.'
+                                    '  For both wave heights and the power spectral density, the 90% confidence intervals'
+                                    ' were derived. Documentation can be found at '
+                                    'https://code.usgs.gov/wavelab/wavelab/-/blob/master/documentation/notebooks/index.md.')
 
-        nc.set_global_attribute(out_fname2,
-                                'summary',
-                                'This file contains time, frequency, power spectral density, and wave statistics.'
-                                '  For both wave heights and the power spectral density, the 90% confidence intervals'
-                                ' were derived. Documentation can be found at '
-                                'https://code.usgs.gov/wavelab/wavelab/-/blob/master/documentation/notebooks/index.md.')
+        output.set_global_attribute('combined_instrument_accuracy_in_meters+-',
+                                    so.combined_level_accuracy_in_meters)
 
-        nc.set_global_attribute(out_fname2,
-                                'combined_instrument_accuracy_in_meters+-',
-                                so.combined_level_accuracy_in_meters)
+        output.set_global_attribute('version', '{0}'.format(so.version))
+        output.set_global_attribute('storm_name', so.storm_name)
 
-        nc.set_global_attribute(out_fname2, 'version', '{0}'.format(so.version))
-        nc.set_global_attribute(out_fname2, 'storm_name', so.storm_name)
+        return output
 
 
 if __name__ == '__main__':
@@ -258,6 +308,7 @@ if __name__ == '__main__':
     so.netCDF['Storm Tide with Unfiltered Water Level'] = Bool(True)
     so.netCDF['Storm Tide Water Level'] = Bool(True)
     so.netCDF['Wave Statistics'] = Bool(False)
+    so.netCDF['Wave Water Level'] = Bool(False)
 
     so.timezone = 'GMT'
     so.daylight_savings = False
@@ -4,10 +4,20 @@ extract data from input netCDF files and output
 netCDF, CSV, and visualizations
 """
 from wavelab.processing.storm_data import StormData
-from wavelab.processing import pressure_to_depth as p2d
+from wavelab.processing import pressure_to_depth as p2d, wave_stats
 import numpy as np
 from wavelab.utilities import nc, unit_conversion as uc
 
+# wave statistics each output needs, keyed by (output group, output name).
+# Outputs that only need the spectra (PSD csv and contour plot) are not listed.
+STATISTIC_OUTPUTS = {
+    ('csv', 'Stats'): ['H1/3', 'Average Z Cross', 'Peak Wave'],
+    ('netCDF', 'Wave Statistics'): list(wave_stats.STATISTICS),
+    ('statistics', 'H1/3'): ['H1/3'],
+    ('statistics', 'Average Z Cross'): ['Average Z Cross'],
+    ('statistics', 'Peak Wave'): ['Peak Wave']
+}
+
 
 class StormOptions(StormData):
     """options to interface between main gui and storm operations"""
@@ -18,7 +28,8 @@ class StormOptions(StormData):
         self.netCDF = {
                        'Storm Tide with Unfiltered Water Level': None,
                        'Storm Tide Water Level': None,
-                       'Wave Statistics': None
+                       'Wave Statistics': None,
+                       'Wave Water Level': None
                        }
         
         self.csv = {
@@ -26,7 +37,8 @@ class StormOptions(StormData):
                     'Storm Tide Water Level': None,
                     'Atmospheric Pressure': None,
                     'Stats': None,
-                    'PSD': None
+                    'PSD': None,
+                    'Wave Water Level': None
                     }
         
         self.graph = {
@@ -72,10 +84,15 @@ class StormOptions(StormData):
         self.interpolated_air_pressure = None
         self.sea_pressure_mean = None
         self.surge_sea_pressure = None
+        self.surge_sea_pressure_index = None
+        self.decimated_surge_sea_pressure = None
         self.wave_sea_pressure = None
         self.raw_water_level = None
         self.surge_water_level = None
+        self.surge_water_level_index = None
+        self.decimated_surge_water_level = None
         self.wave_water_level = None
+        self.lwt_wave_water_level = None
         self.chunked = False
         self.wave_water_level_chunks = None
         self.elevation_chunks = None
@@ -111,9 +128,14 @@ class StormOptions(StormData):
         self.stat_dictionary = None
         self.upper_stat_dictionary = None
         self.lower_stat_dictionary = None
+        self.requested_statistics = None
         self.stn_instrument_id = None
         self.air_stn_instrument_id = None
         self.international_units = False
+        # nc.OUTPUT_PROFILES name or nc.OutputProfile of the netCDF outputs
+        self.output_profile = None
+        # storm_columnar.COLUMNAR_FORMATS name to also write the csv outputs as, or None
+        self.columnar_format = None
         self.salinity = None
         self.clip = None
         self.clip_query = None
@@ -129,13 +151,14 @@ class StormOptions(StormData):
         self.filter1 = None
         self.filter2 = None
         self.filter3 = None
+        self.filter4 = None
         self.use_filter = None
         self.storm_name = None
         self.version = None
         
     def get_sea_time(self):
         if self.sea_time is None:
-            self.sea_time = self.extract_time(self.sea_fname)
+            self.sea_time = self.extract_time_axis(self.sea_fname)
             
         return self.sea_time
     
@@ -204,14 +227,14 @@ class StormOptions(StormData):
         if self.corrected_sea_pressure is None:
             if self.level_troll is True:
                 self.slice_series()
-                self.sea_time = self.extract_time(self.sea_fname)
+                self.sea_time = self.extract_time_axis(self.sea_fname)
                 self.get_sea_pressure()
                 self.corrected_sea_pressure = self.raw_sea_pressure
             elif self.from_water_level_file is False:
                 self.slice_series()
                 self.corrected_sea_pressure = self.raw_sea_pressure - self.interpolated_air_pressure
             else:
-                self.sea_time = self.extract_time(self.sea_fname)
+                self.sea_time = self.extract_time_axis(self.sea_fname)
                 self.raw_water_level = nc.get_variable_data(self.sea_fname
                                                             , 'unfiltered_water_surface_height_above_reference_datum')
                 self.interpolated_air_pressure = nc.get_air_pressure(self.sea_fname)
@@ -238,6 +261,7 @@ class StormOptions(StormData):
         self.combined_level_accuracy_in_meters = sea_accuracy + air_accuracy
     
     def slice_all(self):
+        self.sea_time = np.array(self.sea_time)
         self.sea_time[np.where(self.sea_time < 1475806770000)] = np.NaN
         self.sea_time[np.where(self.sea_time > 1475867310000)] = np.NaN
         sea_itemindex = np.where(~np.isnan(self.sea_time))
@@ -254,24 +278,33 @@ class StormOptions(StormData):
     def slice_series(self):
         if self.sliced is False:
             if self.level_troll is False:
-                self.get_interpolated_air_pressure()
+                self.get_air_time()
+                self.get_raw_air_pressure()
+                self.get_salinity()
+
+                # only read the part of the sea record the air record covers
+                series_len = nc.get_length(self.sea_fname)
+                first, last = nc.get_time_range(self.sea_fname, self.air_time[0], self.air_time[-1])
+                sea_time = self.extract_time_axis(self.sea_fname, first, last)
+                interpolated_air_pressure = self.interpolate_air_pressure(sea_time,
+                                                                          self.air_time,
+                                                                          self.raw_air_pressure)
 
-                self.get_sea_time()
-                self.get_sea_pressure()
-                self.get_sensor_orifice_elevation()
-                self.get_land_surface_elevation()
                 # get the indexes for the first and last point which the sea and air times overlap
-
-                itemindex = np.where(~np.isnan(self.interpolated_air_pressure))
-                self.begin = begin = itemindex[0][0]
-                self.end = end = itemindex[0][len(itemindex[0]) - 1]
+                itemindex = np.where(~np.isnan(interpolated_air_pressure))
+                begin = itemindex[0][0]
+                end = itemindex[0][len(itemindex[0]) - 1]
+                self.begin = first + begin
+                self.end = first + end
 
                 # slice all data to include all instances where the times overlap
-                self.interpolated_air_pressure = self.interpolated_air_pressure[begin:end]
-                self.raw_sea_pressure = self.raw_sea_pressure[begin:end]
-                self.sea_time = self.sea_time[begin:end]
-                self.sensor_orifice_elevation = self.sensor_orifice_elevation[begin:end]
-                self.land_surface_elevation = self.land_surface_elevation[begin:end]
+                self.interpolated_air_pressure = interpolated_air_pressure[begin:end]
+                self.sea_time = sea_time[begin:end]
+                self.raw_sea_pressure = self.extract_raw_sea_pressure(self.sea_fname, self.begin, self.end)
+                self.sensor_orifice_elevation = np.array(
+                    self.extract_sensor_orifice_elevation(self.sea_fname, series_len))[self.begin:self.end]
+                self.land_surface_elevation = self.extract_land_surface_elevation(
+                    self.sea_fname, series_len)[self.begin:self.end]
 
             self.sliced = True
 
@@ -301,6 +334,14 @@ class StormOptions(StormData):
     def get_surge_sea_pressure(self):
         if self.surge_sea_pressure is None:
             
+            if self.use_filter == 'Multirate Butterworth':
+                # interpolate the reduced rate values back to every sample
+                self.get_decimated_surge_sea_pressure()
+                self.surge_sea_pressure = np.interp(np.arange(len(self.corrected_sea_pressure)),
+                                                    self.surge_sea_pressure_index,
+                                                    self.decimated_surge_sea_pressure)
+                return
+            
             if self.from_water_level_file is False:
                 self.slice_series()
                 
@@ -313,6 +354,22 @@ class StormOptions(StormData):
                                                                      self.sea_pressure_mean,
                                                                      self.use_filter)
 
+    def get_decimated_surge_sea_pressure(self):
+        """Storm tide pressure of the multirate butterworth filter at its reduced rate,
+        the indices include the odd extension past both ends of the series"""
+        if self.decimated_surge_sea_pressure is None:
+            
+            if self.from_water_level_file is False:
+                self.slice_series()
+                
+            self.get_corrected_pressure()
+            
+            difference = (self.sea_time[1] - self.sea_time[0]) / 1000
+            self.fs = 1/difference
+            
+            self.surge_sea_pressure_index, self.decimated_surge_sea_pressure = \
+                self.derive_decimated_surge_sea_pressure(self.corrected_sea_pressure, self.sea_pressure_mean)
+
     def get_wave_sea_pressure(self):
         if self.wave_sea_pressure is None:
             self.get_surge_sea_pressure()
@@ -326,14 +383,7 @@ class StormOptions(StormData):
             self.get_combined_level_accuracy()
             
             if self.raw_water_level is None:
-                hydrostatic = True
-                try:
-                    if nc.get_variable_attr(self.sea_fname, 'sea_pressure', 'instrument_make') == "TD-Diver":
-                        hydrostatic = False
-                except:
-                    pass
-
-                if hydrostatic:
+                if self.hydrostatic():
                     self.raw_water_level = np.array(self.derive_raw_water_level(self.corrected_sea_pressure,
                                                                                  self.sensor_orifice_elevation,
                                                                                  self.salinity))
@@ -351,14 +401,7 @@ class StormOptions(StormData):
                 self.surge_water_level = nc.get_variable_data(self.sea_fname,
                                                               "water_surface_height_above_reference_datum")
             else:
-                hydrostatic = True
-                try:
-                    if nc.get_variable_attr(self.sea_fname, 'sea_pressure', 'instrument_make') == "TD-Diver":
-                        hydrostatic = False
-                except:
-                    pass
-
-                if hydrostatic:
+                if self.hydrostatic():
                     self.surge_water_level = np.array(self.derive_filtered_water_level(self.surge_sea_pressure,
                                                                           self.sea_pressure_mean,
                                                                           self.sensor_orifice_elevation,
@@ -367,18 +410,69 @@ class StormOptions(StormData):
                     self.surge_water_level = np.array(self.surge_sea_pressure + self.sea_pressure_mean +
                                                       self.sensor_orifice_elevation)
             
+    def get_decimated_surge_water_level(self):
+        """Storm tide water level for the outputs that do not need every sample, at the
+        reduced rate of the multirate butterworth filter with the first and last
+        sample added, or every sample for the other filters. surge_water_level_index
+        holds the sample indices of the values"""
+        if self.decimated_surge_water_level is None:
+            if self.use_filter != 'Multirate Butterworth' or self.from_water_level_file:
+                self.get_surge_water_level()
+                self.surge_water_level_index = np.arange(len(self.surge_water_level))
+                self.decimated_surge_water_level = self.surge_water_level
+                return
+            
+            self.get_sensor_orifice_elevation()
+            self.get_decimated_surge_sea_pressure()
+            
+            last = len(self.corrected_sea_pressure) - 1
+            index = self.surge_sea_pressure_index
+            index = np.concatenate(([0], index[(index > 0) & (index < last)], [last]))
+            surge = np.interp(index, self.surge_sea_pressure_index, self.decimated_surge_sea_pressure)
+            orifice = self.sensor_orifice_elevation[index]
+            
+            if self.hydrostatic():
+                surge_water_level = np.array(self.derive_filtered_water_level(surge, self.sea_pressure_mean,
+                                                                              orifice, self.salinity))
+            else:
+                surge_water_level = np.array(surge + self.sea_pressure_mean + orifice)
+            
+            # the full rate series may have been clipped already
+            if self.elev_test is True:
+                surge_water_level[surge_water_level < self.clip_elevation()] = np.nan
+            
+            self.surge_water_level_index = index
+            self.decimated_surge_water_level = surge_water_level
+
+    def hydrostatic(self):
+        """False for the TD-Diver sea files, which record water level instead of pressure"""
+        try:
+            if nc.get_variable_attr(self.sea_fname, 'sea_pressure', 'instrument_make') == "TD-Diver":
+                return False
+        except:
+            pass
+        return True
+
+    def clip_elevation(self):
+        """Water levels below this elevation are clipped from the storm tide graphs"""
+        if self.international_units is True:
+            clip_scale = .1 / uc.METER_TO_FEET
+        else:
+            clip_scale = .1
+            
+        if self.clip is None or self.clip is False:
+            clip_scale = 0
+        
+        return self.sensor_orifice_elevation[0] + clip_scale
+
     def test_water_elevation_below_sensor_orifice_elevation(self):
         if self.elev_test is False:
-            if self.international_units is True:
-                clip_scale = .1 / uc.METER_TO_FEET
-            else:
-                clip_scale = .1
-                
-            if self.clip is None or self.clip is False:
-                clip_scale = 0
+            clip_elevation = self.clip_elevation()
 
-            surge_query = np.where(self.surge_water_level < self.sensor_orifice_elevation[0] + clip_scale)
-            raw_query = np.where(self.raw_water_level < self.sensor_orifice_elevation[0] + clip_scale)
+            surge_query = np.where(self.surge_water_level < clip_elevation)
+            raw_query = np.where(self.raw_water_level < clip_elevation)
+            if self.decimated_surge_water_level is not None:
+                self.decimated_surge_water_level[self.decimated_surge_water_level < clip_elevation] = np.nan
 
             if len(surge_query[0]) == 0 or np.nanmax(surge_query[0]) == np.nan:
                 self.clip_query = raw_query[0]
@@ -390,49 +484,61 @@ class StormOptions(StormData):
 
             self.elev_test = True
 
-    def get_wave_water_level(self, method = 'hyrdostatic'):
-        if self.wave_water_level_chunks is None:
+    def get_wave_water_level(self, method='hydrostatic'):
+        if method == 'lwt':
+            self.get_lwt_wave_water_level()
+            self.wave_water_level = self.lwt_wave_water_level
+        elif self.wave_water_level_chunks is None:
             self.get_raw_water_level()
             self.get_surge_water_level()
                 
-#             if method == 'hyrdostatic':
             self.wave_water_level = self.raw_water_level - self.surge_water_level
+
+    def get_lwt_wave_water_level(self):
+        """Full length wave water level from linear wave theory"""
+        if self.lwt_wave_water_level is None:
+            self.get_corrected_pressure()
+            self.get_sensor_orifice_elevation()
+            self.get_land_surface_elevation()
+            self.get_combined_level_accuracy()
+            
+            instrument_height = np.abs(self.land_surface_elevation - self.sensor_orifice_elevation)
+            device_depth = p2d.hydrostatic_method(self.corrected_sea_pressure, self.salinity)
+            self.lwt_wave_water_level = self.derive_lwt_wave_water_level(self.sea_time,
+                                                                         self.corrected_sea_pressure,
+                                                                         -device_depth,
+                                                                         device_depth + instrument_height,
+                                                                         (self.sea_time[1] - self.sea_time[0]) / 1000.0,
+                                                                         self.stats.dispersion_method)
                 
     def chunk_data(self):
         """Created a chunked time series with 50% overlap (About 17 mins with 4hz data)"""
 
         if self.chunked is False:
-            start_index = 0
-            end_index = 4096
+            window = 4096
             increment = 2048
-            self.wave_time_chunks, \
-                self.pressure_chunks, self.wind_speed_chunks = [], [], []
-            self.elevation_chunks, self.sensor_orifice_chunks = [], []
             
             '''WIND SPEED MAY PROVE USEFUL WHEN CALCULATED WITH FETCH FOR FUTURE JONSWAP DATA
             DISSEMINATION'''
             if self.wind_speed is not None:
                 ws = np.interp(self.sea_time,self.wind_time,self.wind_speed)
+                self.wind_speed_chunks = self.stats.split_into_windows(
+                    ws / uc.METERS_PER_SECOND_TO_MILES_PER_HOUR, window, increment)
             else:
                 self.wind_speed_chunks = None
                 
             c_pressure = self.corrected_sea_pressure
 
 #             c_pressure[self.clip_query] = np.NaN
-            
-            while end_index <= len(c_pressure):
-                self.wave_time_chunks.append(self.sea_time[start_index:end_index] / 1000)
-                self.pressure_chunks.append(c_pressure[start_index:end_index])
-                self.elevation_chunks.append(np.mean(self.land_surface_elevation[start_index:end_index]))
-                self.sensor_orifice_chunks.append(np.mean(self.sensor_orifice_elevation[start_index:end_index]))
-                
-                if self.wind_speed is not None:
-                    self.wind_speed_chunks.append(ws[start_index:end_index] / 
-                                                  uc.METERS_PER_SECOND_TO_MILES_PER_HOUR)
-                
-                
-                start_index += increment
-                end_index += increment
+
+            # strided (n_windows x 4096) views, no per window copies are made
+            self.wave_time_chunks = self.stats.split_into_windows(np.asarray(self.sea_time) / 1000,
+                                                                  window, increment)
+            self.pressure_chunks = self.stats.split_into_windows(c_pressure, window, increment)
+            self.elevation_chunks = np.mean(self.stats.split_into_windows(self.land_surface_elevation,
+                                                                          window, increment), axis=1)
+            self.sensor_orifice_chunks = np.mean(self.stats.split_into_windows(self.sensor_orifice_elevation,
+                                                                               window, increment), axis=1)
                 
             self.chunked = True
 
@@ -452,7 +558,28 @@ class StormOptions(StormData):
                                        self.elevation_chunks,
                                        self.sensor_orifice_chunks,
                                        meters=self.international_units,
-                                       instrument_error=self.combined_level_accuracy_in_meters)
+                                       instrument_error=self.combined_level_accuracy_in_meters,
+                                       statistics=self.get_required_statistics())
+
+    def get_required_statistics(self):
+        """Return the wave statistics needed by the selected outputs, the
+        requested_statistics if they were set, or None (all) if no output is selected"""
+        if self.requested_statistics is not None:
+            return [x for x in wave_stats.STATISTICS if x in self.requested_statistics]
+
+        any_selected = False
+        required = set()
+        for group in ['netCDF', 'csv', 'graph', 'statistics']:
+            for x in getattr(self, group):
+                selected = getattr(self, group)[x]
+                if selected is not None and selected.get() is True:
+                    any_selected = True
+                    required.update(STATISTIC_OUTPUTS.get((group, x), []))
+
+        if any_selected is False:
+            return None
+
+        return [x for x in wave_stats.STATISTICS if x in required]
             
     def check_file_types(self):
         try:
@@ -609,20 +736,24 @@ class StormOptions(StormData):
         self.info_dict['filter1'] = self.filter1
         self.info_dict['filter2'] = self.filter2
         self.info_dict['filter3'] = self.filter3
+        self.info_dict['filter4'] = self.filter4
         self.info_dict['storm_name'] = self.storm_name
         self.info_dict['version'] = self.version
+        self.info_dict['columnar_format'] = self.columnar_format
 
         self.info_dict['netCDF'] = {
             'Storm Tide with Unfiltered Water Level': self.netCDF['Storm Tide with Unfiltered Water Level'].get(),
             'Storm Tide Water Level': self.netCDF['Storm Tide Water Level'].get(),
-            'Wave Statistics': self.netCDF['Wave Statistics'].get()
+            'Wave Statistics': self.netCDF['Wave Statistics'].get(),
+            'Wave Water Level': self.netCDF['Wave Water Level'].get()
         }
         self.info_dict['csv'] = {
             'Storm Tide with Unfiltered Water Level': self.csv['Storm Tide with Unfiltered Water Level'].get(),
             'Storm Tide Water Level': self.csv['Storm Tide Water Level'].get(),
             'Atmospheric Pressure': self.csv['Atmospheric Pressure'].get(),
             'Stats': self.csv['Stats'].get(),
-            'PSD': self.csv['PSD'].get()
+            'PSD': self.csv['PSD'].get(),
+            'Wave Water Level': self.csv['Wave Water Level'].get()
         }
 
         self.info_dict['graph'] = {
@@ -656,19 +787,23 @@ class StormOptions(StormData):
         self.filter1 = self.info_dict['filter1']
         self.filter2 = self.info_dict['filter2']
         self.filter3 = self.info_dict['filter3']
+        self.filter4 = self.info_dict['filter4']
         self.version = self.info_dict['version']
+        self.columnar_format = self.info_dict.get('columnar_format')
         self.storm_name = self.info_dict['storm_name']
         self.netCDF = {
             'Storm Tide with Unfiltered Water Level': Bool(self.info_dict['netCDF']['Storm Tide with Unfiltered Water Level']),
             'Storm Tide Water Level': Bool(self.info_dict['netCDF']['Storm Tide Water Level']),
-            'Wave Statistics': Bool(self.info_dict['netCDF']['Wave Statistics'])
+            'Wave Statistics': Bool(self.info_dict['netCDF']['Wave Statistics']),
+            'Wave Water Level': Bool(self.info_dict['netCDF']['Wave Water Level'])
         }
         self.csv = {
             'Storm Tide with Unfiltered Water Level': Bool(self.info_dict['csv']['Storm Tide with Unfiltered Water Level']),
             'Storm Tide Water Level': Bool(self.info_dict['csv']['Storm Tide Water Level']),
             'Atmospheric Pressure': Bool(self.info_dict['csv']['Atmospheric Pressure']),
             'Stats': Bool(self.info_dict['csv']['Stats']),
-            'PSD': Bool(self.info_dict['csv']['PSD'])
+            'PSD': Bool(self.info_dict['csv']['PSD']),
+            'Wave Water Level': Bool(self.info_dict['csv']['Wave Water Level'])
         }
 
         self.graph = {
@@ -704,10 +839,15 @@ class StormOptions(StormData):
         self.interpolated_air_pressure = None
         self.sea_pressure_mean = None
         self.surge_sea_pressure = None
+        self.surge_sea_pressure_index = None
+        self.decimated_surge_sea_pressure = None
         self.wave_sea_pressure = None
         self.raw_water_level = None
         self.surge_water_level = None
+        self.surge_water_level_index = None
+        self.decimated_surge_water_level = None
         self.wave_water_level = None
+        self.lwt_wave_water_level = None
         self.chunked = False
         self.wave_water_level_chunks = None
         self.elevation_chunks = None
@@ -742,9 +882,12 @@ class StormOptions(StormData):
         self.stat_dictionary = None
         self.upper_stat_dictionary = None
         self.lower_stat_dictionary = None
+        self.requested_statistics = None
         self.stn_instrument_id = None
         self.air_stn_instrument_id = None
         self.international_units = False
+        self.output_profile = None
+        self.columnar_format = None
         self.salinity = None
         self.clip = None
         self.clip_query = None
@@ -760,10 +903,14 @@ class StormOptions(StormData):
         self.filter1 = None
         self.filter2 = None
         self.filter3 = None
+        self.filter4 = None
         self.use_filter = None
         self.storm_name = None
         self.version = None
 
+        # release the netCDF handles kept open by the previous run
+        nc.clear_cache()
+
 
 class Bool(object):
 
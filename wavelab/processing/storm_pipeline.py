@@ -0,0 +1,477 @@
+#!/usr/bin/env python3
+"""
+Out-of-core storm tide processing. The sea and air pressure files are read in
+blocks on a background thread while the previous block is processed. Each
+block is barometrically corrected and run through the streaming storm tide
+filters of storm_tide_stream. The storm tide netCDF and CSV rows are written
+as the filter releases them, and the wave statistics and spectra of every
+analysis window are computed and written as soon as the window is complete.
+Peak memory is a few blocks plus the filter look-ahead, whatever the length of
+the record.
+"""
+import sys
+import copy
+import queue
+import argparse
+import threading
+import numpy as np
+from wavelab.utilities import nc, unit_conversion as uc
+from wavelab.processing import storm_tide_stream
+from wavelab.processing.storm_options import StormOptions, Bool
+from wavelab.processing.storm_netCDF import Storm_netCDF
+from wavelab.processing.storm_csv import StormCSV
+
+# samples per block, 18 hours of 4hz data
+BLOCK_SIZE = 2 ** 18
+# blocks read ahead of the one being processed
+PREFETCH_BLOCKS = 2
+WINDOW = 4096
+STEP = 2048
+
+# (output group, output name) the pipeline can write, the others need the whole record
+STREAMED_OUTPUTS = [
+    ('netCDF', 'Storm Tide with Unfiltered Water Level'),
+    ('netCDF', 'Storm Tide Water Level'),
+    ('netCDF', 'Wave Statistics'),
+    ('csv', 'Storm Tide with Unfiltered Water Level'),
+    ('csv', 'Storm Tide Water Level'),
+    ('csv', 'Atmospheric Pressure'),
+    ('csv', 'Stats'),
+    ('csv', 'PSD')
+]
+
+_DONE = object()
+
+
+class Prefetcher(object):
+    """Iterates over an iterable on a background thread, keeping up to size
+    items ready ahead of the consumer. An exception raised by the iterable is
+    raised again in the consumer."""
+
+    def __init__(self, iterable, size=PREFETCH_BLOCKS):
+        self.queue = queue.Queue(maxsize=max(size, 1))
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self._run, args=(iter(iterable),))
+        self.thread.daemon = True
+        self.thread.start()
+
+    def _run(self, iterator):
+        try:
+            for item in iterator:
+                if self._put((item, None)) is False:
+                    return
+        except BaseException as error:
+            self._put((None, error))
+            return
+        self._put(_DONE)
+
+    def _put(self, item):
+        while not self.stopped.is_set():
+            try:
+                self.queue.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def __iter__(self):
+        try:
+            while True:
+                item = self.queue.get()
+                if item is _DONE:
+                    return
+                value, error = item
+                if error is not None:
+                    raise error
+                yield value
+        finally:
+            self.close()
+
+    def close(self):
+        self.stopped.set()
+        self.thread.join()
+
+
+def linspace_block(start, stop, num, begin, end):
+    """np.linspace(start, stop, num)[begin:end] computed without the other values"""
+
+    start = np.asanyarray(start) * 1.0
+    stop = np.asanyarray(stop) * 1.0
+    dtype = np.result_type(start, stop, float(num))
+    delta = stop - start
+    div = num - 1
+
+    values = np.arange(begin, end, dtype=dtype)
+    if div > 0:
+        step = delta / div
+        if step == 0:
+            values = values / div * delta
+        else:
+            values = values * step
+    else:
+        values = values * delta
+    values += start
+
+    if div > 0 and end == num and end > begin:
+        values[-1] = stop
+    return values.astype(dtype, copy=False)
+
+
+class BlockQueue(object):
+    """First in first out queue of the per sample fields of the blocks waiting
+    for the storm tide filter to release them"""
+
+    def __init__(self):
+        self.fields = None
+
+    def __len__(self):
+        return 0 if self.fields is None else len(self.fields['time'])
+
+    def append(self, **fields):
+        if self.fields is None:
+            self.fields = fields
+        else:
+            self.fields = {x: None if fields[x] is None else np.ma.concatenate((self.fields[x], fields[x]))
+                           for x in fields}
+
+    def pop(self, length):
+        out = {x: None if self.fields[x] is None else self.fields[x][:length] for x in self.fields}
+        self.fields = {x: None if self.fields[x] is None else self.fields[x][length:] for x in self.fields}
+        return out
+
+
+class StormPipeline(object):
+    """Streams the storm tide and wave statistics outputs selected in a
+    StormOptions. Only the outputs in STREAMED_OUTPUTS are supported. The
+    storm tide is filtered with the streaming filters, which match the batch
+    filters up to the look-ahead of the butterworth filter."""
+
+    def __init__(self, so, block_size=BLOCK_SIZE, prefetch=PREFETCH_BLOCKS):
+        self.so = so
+        self.block_size = block_size
+        self.prefetch = prefetch
+        self.storm_netCDF = Storm_netCDF()
+        self.storm_csv = StormCSV()
+        self.storm_csv.int_units = so.international_units is not False
+
+        self.begin = None
+        self.end = None
+        self.series_len = None
+        self.orifice = None
+        self.land_surface = None
+        self.hydrostatic = True
+        self.writers = []
+        self.window_tail = None
+        self.n_windows = 0
+        self.statistics_writer = None
+        self.statistics_position = 0
+
+    def selected(self, group, name):
+        selection = getattr(self.so, group).get(name)
+        return selection is not None and selection.get() is True
+
+    def wave_statistics_selected(self):
+        return (self.selected('netCDF', 'Wave Statistics') or self.selected('csv', 'Stats')
+                or self.selected('csv', 'PSD')) and nc.get_frequency(self.so.sea_fname) >= 4
+
+    def run(self):
+        """Process the record and write every selected output"""
+        so = self.so
+        unsupported = ['%s %s' % (group, name) for group in ['netCDF', 'csv']
+                       for name in getattr(so, group)
+                       if self.selected(group, name) and (group, name) not in STREAMED_OUTPUTS]
+        if len(unsupported) > 0:
+            raise ValueError("Outputs not supported by the streaming pipeline: %s"
+                             % ', '.join(unsupported))
+        if so.from_water_level_file is True:
+            raise ValueError("The streaming pipeline needs a sea pressure file")
+
+        so.get_meta_data()
+        so.get_salinity()
+        so.get_combined_level_accuracy()
+        if so.level_troll is False:
+            so.get_air_meta_data()
+        try:
+            self.hydrostatic = nc.get_variable_attr(so.sea_fname, 'sea_pressure',
+                                                    'instrument_make') != "TD-Diver"
+        except:
+            self.hydrostatic = True
+
+        self.series_len = nc.get_length(so.sea_fname)
+        self.orifice = nc.get_sensor_orifice_elevation(so.sea_fname)
+        self.land_surface = nc.get_land_surface_elevation(so.sea_fname)
+        self.find_overlap()
+
+        first_times = nc.get_time(so.sea_fname, self.begin, self.begin + 2)
+        so.fs = 1 / ((first_times[1] - first_times[0]) / 1000)
+        so.sea_pressure_mean = self.pressure_mean()
+
+        self.stream()
+
+        if self.selected('csv', 'Atmospheric Pressure'):
+            so.get_air_meta_data()
+            so.get_air_time()
+            so.get_raw_air_pressure()
+            self.storm_csv.atmospheric_pressure(so)
+
+    def find_overlap(self):
+        """Set the (begin, end) range of the sea samples processed, for an air
+        file these are the samples StormOptions.slice_series keeps"""
+        so = self.so
+        if so.level_troll is True:
+            self.begin, self.end = 0, self.series_len
+            return
+
+        air_len = nc.get_length(so.air_fname)
+        first, last = nc.get_time_range(so.sea_fname,
+                                        nc.get_time(so.air_fname, 0, 1)[0],
+                                        nc.get_time(so.air_fname, air_len - 1, air_len)[0])
+        begin, end = None, None
+        for start, time, sea_pressure, air_pressure in Prefetcher(
+                self.read_blocks(first, last, pressure=False), self.prefetch):
+            valid = np.flatnonzero(~np.isnan(air_pressure))
+            if len(valid) > 0:
+                begin = start + valid[0] if begin is None else begin
+                end = start + valid[-1]
+
+        if begin is None:
+            raise ValueError("The air pressure file does not overlap the sea pressure file")
+        self.begin, self.end = begin, end
+        so.begin, so.end = begin, end
+
+    def read_blocks(self, begin, end, pressure=True):
+        """Yield (start, time, sea pressure, interpolated air pressure) blocks of
+        the sea samples [begin:end], run on the prefetch thread"""
+        so = self.so
+        for start in range(begin, end, self.block_size):
+            stop = min(start + self.block_size, end)
+            time = np.asarray(nc.get_time_axis(so.sea_fname, start, stop))
+            sea_pressure = nc.get_pressure(so.sea_fname, start, stop) if pressure is True else None
+            air_pressure = None
+            if so.level_troll is False:
+                air_pressure = self.interpolate_air_pressure(time)
+            yield start, time, sea_pressure, air_pressure
+
+    def interpolate_air_pressure(self, time):
+        """StormData.interpolate_air_pressure of the air samples around time only"""
+        so = self.so
+        air_len = nc.get_length(so.air_fname)
+        first = max(nc.get_time_index(so.air_fname, time[0], side='right') - 1, 0)
+        last = min(nc.get_time_index(so.air_fname, time[-1], side='left') + 1, air_len)
+        if last <= first:
+            return np.full(len(time), np.nan)
+        return so.interpolate_air_pressure(time,
+                                           nc.get_time(so.air_fname, first, last),
+                                           nc.get_air_pressure(so.air_fname, first, last))
+
+    @staticmethod
+    def corrected_pressure(sea_pressure, air_pressure):
+        if air_pressure is None:
+            return sea_pressure
+        return sea_pressure - air_pressure
+
+    def pressure_mean(self):
+        """Mean corrected sea pressure of the processed samples, masked samples
+        are left out like np.mean of the masked arrays does"""
+        total, count = 0.0, 0
+        for start, time, sea_pressure, air_pressure in Prefetcher(
+                self.read_blocks(self.begin, self.end), self.prefetch):
+            corrected = np.ma.asarray(self.corrected_pressure(sea_pressure, air_pressure))
+            total += corrected.sum()
+            count += corrected.count()
+        return total / count
+
+    def stream(self):
+        """Filter the record block by block, writing the storm tide outputs and
+        computing the wave statistics as the samples become available"""
+        so = self.so
+        self.open_writers()
+        self.window_tail = None
+        self.n_windows = max(0, (self.end - self.begin - WINDOW) // STEP + 1)
+        self.statistics_position = 0
+        streaming_filter = storm_tide_stream.make_stream_filter(so.fs, so.use_filter,
+                                                                self.end - self.begin)
+        waiting = BlockQueue()
+        position = 0
+
+        try:
+            for start, time, sea_pressure, air_pressure in Prefetcher(
+                    self.read_blocks(self.begin, self.end), self.prefetch):
+                corrected = self.corrected_pressure(sea_pressure, air_pressure)
+                orifice = linspace_block(self.orifice[0], self.orifice[1], self.series_len,
+                                         start, start + len(time))
+                if self.wave_statistics_selected():
+                    land_surface = linspace_block(self.land_surface[0], self.land_surface[1],
+                                                  self.series_len, start, start + len(time))
+                    self.add_windows(time, corrected, orifice, land_surface)
+
+                waiting.append(time=time, sea_pressure=sea_pressure, air_pressure=air_pressure,
+                               corrected=corrected, orifice=orifice)
+                surge = streaming_filter.process(np.ma.getdata(corrected) - so.sea_pressure_mean)
+                if len(surge) > 0:
+                    self.write_block(position, waiting.pop(len(surge)), surge)
+                    position += len(surge)
+
+            surge = streaming_filter.flush()
+            if len(surge) > 0:
+                self.write_block(position, waiting.pop(len(surge)), surge)
+        finally:
+            self.close_writers()
+
+    def open_writers(self):
+        """Write the storm tide netCDF files with their time series left empty
+        and open them for the block writes"""
+        so = self.so
+        self.writers = []
+        builders = [('Storm Tide with Unfiltered Water Level',
+                     self.storm_netCDF.build_storm_tide_and_unfiltered_water_level, True),
+                    ('Storm Tide Water Level', self.storm_netCDF.build_storm_tide_water_level, False)]
+        for name, build, unfiltered in builders:
+            if self.selected('netCDF', name):
+                fname = build(so, data=False).write()
+                self.writers.append((nc.BlockWriter(fname), unfiltered))
+
+    def close_writers(self):
+        for writer, unfiltered in self.writers:
+            writer.close()
+        self.writers = []
+        if self.statistics_writer is not None:
+            self.statistics_writer.close()
+            self.statistics_writer = None
+
+    def write_block(self, position, fields, surge):
+        """Write the released samples starting at sample position of the outputs"""
+        so = self.so
+        corrected = fields['corrected']
+        orifice = fields['orifice']
+        if self.hydrostatic:
+            raw_water_level = np.array(so.derive_raw_water_level(corrected, orifice, so.salinity))
+            surge_water_level = np.array(so.derive_filtered_water_level(surge, so.sea_pressure_mean,
+                                                                        orifice, so.salinity))
+        else:
+            raw_water_level = np.array(corrected + orifice)
+            surge_water_level = np.array(surge + so.sea_pressure_mean + orifice)
+
+        for writer, unfiltered in self.writers:
+            blocks = {'time': fields['time'],
+                      'sea_pressure': fields['sea_pressure'],
+                      'water_surface_height_above_reference_datum': surge_water_level}
+            if fields['air_pressure'] is not None:
+                blocks['air_pressure'] = fields['air_pressure']
+            if unfiltered is True:
+                blocks['unfiltered_water_surface_height_above_reference_datum'] = raw_water_level
+            writer.write(blocks)
+
+        csv_names = [x for x in ['Storm Tide with Unfiltered Water Level', 'Storm Tide Water Level']
+                     if self.selected('csv', x)]
+        if len(csv_names) == 0:
+            return
+
+        # the batch csv files are written after the wave statistics netCDF clips
+        # the water levels below the sensor orifice
+        if self.selected('netCDF', 'Wave Statistics') and nc.get_frequency(so.sea_fname) >= 4:
+            clip_scale = 0
+            if so.clip is True:
+                clip_scale = .1 / uc.METER_TO_FEET if so.international_units is True else .1
+            threshold = linspace_block(self.orifice[0], self.orifice[1], self.series_len,
+                                       self.begin, self.begin + 1)[0] + clip_scale
+            surge_water_level = surge_water_level.copy()
+            raw_water_level = raw_water_level.copy()
+            surge_water_level[surge_water_level < threshold] = np.nan
+            raw_water_level[raw_water_level < threshold] = np.nan
+
+        block_so = copy.copy(so)
+        block_so.sea_time = fields['time']
+        block_so.surge_water_level = surge_water_level
+        block_so.raw_water_level = raw_water_level
+        block_so.interpolated_air_pressure = fields['air_pressure']
+        if 'Storm Tide with Unfiltered Water Level' in csv_names:
+            self.storm_csv.storm_tide_and_unfiltered_water_level(block_so, start=position)
+        if 'Storm Tide Water Level' in csv_names:
+            self.storm_csv.storm_tide_water_level(block_so, start=position)
+
+    def add_windows(self, time, corrected, orifice, land_surface):
+        """Compute the wave statistics of the analysis windows completed by a block"""
+        so = self.so
+        fields = [np.ma.getdata(corrected), time / 1000, land_surface, orifice]
+        if self.window_tail is not None:
+            fields = [np.concatenate((x, y)) for x, y in zip(self.window_tail, fields)]
+
+        n_windows = max(0, (len(fields[0]) - WINDOW) // STEP + 1)
+        if n_windows > 0:
+            pressure_chunks, time_chunks, elevation_chunks, orifice_chunks = \
+                [so.stats.split_into_windows(x, WINDOW, STEP) for x in fields]
+            so.stats.low_cut = so.low_cut
+            so.stats.high_cut = so.high_cut
+            self.emit_statistics(so.derive_statistics(pressure_chunks,
+                                                      time_chunks,
+                                                      np.mean(elevation_chunks, axis=1),
+                                                      np.mean(orifice_chunks, axis=1),
+                                                      meters=so.international_units,
+                                                      instrument_error=so.combined_level_accuracy_in_meters,
+                                                      statistics=so.get_required_statistics()))
+
+        # keep the samples the next windows still need
+        self.window_tail = [x[n_windows * STEP:] for x in fields]
+
+    def emit_statistics(self, statistics):
+        """Write the [statistics, upper, lower] dictionaries of the windows
+        completed by a block to the wave statistics outputs. The netCDF file is
+        written with room for every window of the record when the first windows
+        (and so the frequencies) are known."""
+        so = self.so
+        block_so = copy.copy(so)
+        block_so.stat_dictionary, block_so.upper_stat_dictionary, block_so.lower_stat_dictionary = \
+            statistics
+
+        if self.selected('netCDF', 'Wave Statistics'):
+            if self.statistics_writer is None:
+                fname = self.storm_netCDF.build_wave_statistics(block_so, data=False,
+                                                                n_times=self.n_windows).write()
+                self.statistics_writer = nc.BlockWriter(fname)
+            self.statistics_writer.write(nc.wave_stats_blocks(block_so))
+        if self.selected('csv', 'Stats'):
+            self.storm_csv.stats(block_so, start=self.statistics_position)
+        if self.selected('csv', 'PSD'):
+            self.storm_csv.psd(block_so, start=self.statistics_position)
+        self.statistics_position += len(statistics[0]['time'])
+
+
+def process_file(args):
+    so = StormOptions()
+    so.sea_fname = args.sea_fname
+    so.air_fname = args.air_fname
+    so.level_troll = args.air_fname is None
+    so.output_fname = args.output_fname
+    so.use_filter = args.use_filter
+    so.timezone = args.timezone
+    so.daylight_savings = args.daylight_savings
+    so.international_units = not args.feet
+    so.output_profile = args.output_profile
+    so.storm_name = args.storm_name
+    so.low_cut = 0.045
+    so.high_cut = 1.0
+    for group, name in STREAMED_OUTPUTS:
+        getattr(so, group)[name] = Bool(name in (getattr(args, group) or []))
+
+    StormPipeline(so, block_size=args.block_size).run()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Stream storm tide and wave statistics outputs.')
+    parser.add_argument('sea_fname', help='sea pressure netCDF file')
+    parser.add_argument('output_fname', help='prefix of the output files')
+    parser.add_argument('--air_fname', help='air pressure netCDF file, omit for a level troll')
+    parser.add_argument('--use_filter', default='Butterworth',
+                        choices=['Butterworth', 'Multirate Butterworth', 'Moving Avg 3 Std Devs',
+                                 'NOAA 3 Std Devs'])
+    parser.add_argument('--netCDF', nargs='*', choices=[x[1] for x in STREAMED_OUTPUTS if x[0] == 'netCDF'])
+    parser.add_argument('--csv', nargs='*', choices=[x[1] for x in STREAMED_OUTPUTS if x[0] == 'csv'])
+    parser.add_argument('--timezone', default='GMT', help='timezone of the csv times')
+    parser.add_argument('--daylight_savings', action='store_true')
+    parser.add_argument('--feet', action='store_true', help='csv outputs in feet instead of meters')
+    parser.add_argument('--output_profile', choices=sorted(nc.OUTPUT_PROFILES))
+    parser.add_argument('--storm_name', default='')
+    parser.add_argument('--block_size', type=int, default=BLOCK_SIZE, help='samples per block')
+
+    process_file(parser.parse_args(sys.argv[1:]))
@@ -155,8 +155,7 @@ class StormStatistics(object):
         first_date = mdates.date2num(new_dates[0])
         last_date = mdates.date2num(new_dates[1])
 
-        time = so.sea_time
-        self.time_nums2 = np.linspace(first_date, last_date, len(time))
+        self.time_nums2 = np.linspace(first_date, last_date, len(so.sea_time))
 
         # Read images
         logo = image.imread(get_image('usgs.png'), None)
@@ -0,0 +1,306 @@
+"""
+Streaming versions of the storm tide filters in pressure_to_depth. Pressure
+is consumed in blocks and the filter state is carried from block to block so
+records larger than memory can be filtered with flat peak memory.
+"""
+import numpy as np
+from scipy import signal
+from wavelab.processing import pressure_to_depth as p2d
+
+
+class StreamingButterworthFilter(object):
+    """Zero phase 4th order butterworth filter (6 min cutoff) over a stream of blocks.
+
+    The forward pass carries its second order section state across blocks.
+    The backward pass is run over the forward output with margin_time seconds
+    of look-ahead, starting from the steady state of the last value, so a
+    sample is released once margin_time seconds of later data have arrived.
+    The ends are odd extended by pad_time seconds like sosfiltfilt."""
+
+    def __init__(self, fs, cutoff=p2d.STORM_TIDE_CUTOFF, order=4, margin_time=3600, pad_time=60):
+        self.sos = signal.butter(order, cutoff / (.5 * fs), btype='lowpass', output='sos')
+        self.zi = signal.sosfilt_zi(self.sos)
+        self.margin = max(int(margin_time * fs), 1)
+        self.padlen = max(int(pad_time * fs), 1)
+        self.state = None
+        self.raw = np.zeros(0)
+        self.forward = np.zeros(0)
+
+    def process(self, block):
+        """Filter the next block, return the samples that are ready (may be empty)"""
+        block = np.asarray(block, dtype=np.float64)
+        
+        if self.state is None:
+            # hold the start until there is enough data for the odd extension
+            self.raw = np.concatenate((self.raw, block))
+            if len(self.raw) <= self.padlen:
+                return np.zeros(0)
+            block, self.raw = self.raw, self.raw[-(self.padlen + 1):]
+            ext = 2 * block[0] - block[self.padlen:0:-1]
+            self.state = self.zi * ext[0]
+            pad_forward, self.state = signal.sosfilt(self.sos, ext, zi=self.state)
+        else:
+            self.raw = np.concatenate((self.raw, block))[-(self.padlen + 1):]
+        
+        filtered, self.state = signal.sosfilt(self.sos, block, zi=self.state)
+        self.forward = np.concatenate((self.forward, filtered))
+        
+        # release everything but the look-ahead margin once it is at least a margin long
+        ready = len(self.forward) - self.margin
+        if ready < self.margin:
+            return np.zeros(0)
+        backward = self._backward(self.forward, self.zi * self.forward[-1])
+        self.forward = self.forward[ready:]
+        return backward[:ready]
+
+    def flush(self):
+        """Filter the end of the stream with its odd extension, return the remaining samples"""
+        if self.state is None:
+            # the whole stream was shorter than the odd extension
+            raw, self.raw = self.raw, np.zeros(0)
+            if len(raw) < 2:
+                return raw
+            return signal.sosfiltfilt(self.sos, raw, padlen=len(raw) - 1)
+        
+        ext = 2 * self.raw[-1] - self.raw[-2:-self.padlen - 2:-1]
+        pad_forward, self.state = signal.sosfilt(self.sos, ext, zi=self.state)
+        forward = np.concatenate((self.forward, pad_forward))
+        backward = self._backward(forward, self.zi * forward[-1])
+        remaining = len(self.forward)
+        self.forward = np.zeros(0)
+        return backward[:remaining]
+
+    def _backward(self, forward, zi):
+        return signal.sosfilt(self.sos, forward[::-1], zi=zi)[0][::-1]
+
+
+class StreamingMultirateButterworthFilter(object):
+    """multirate_butterworth_filter over a stream of blocks.
+
+    The start of the stream is odd extended by pad_time seconds, decimated with
+    the anti-alias filter of resample_poly, filtered by a StreamingButterworthFilter
+    at the reduced rate and interpolated back to every sample, so only the
+    look-ahead is held at the reduced rate. Streams too slow to decimate use the
+    full rate streaming filter and streams shorter than the odd extension the
+    batch one."""
+
+    def __init__(self, fs, cutoff=p2d.STORM_TIDE_CUTOFF, rate_factor=20, pad_time=3600, margin_time=3600):
+        self.fs = fs
+        self.q = int(fs / (rate_factor * cutoff))
+        self.pad = max(int(pad_time * fs), 1)
+        self.half = 10 * self.q
+        if self.q < 2:
+            self.butterworth = StreamingButterworthFilter(fs, cutoff, margin_time=margin_time)
+        else:
+            self.butterworth = StreamingButterworthFilter(fs / self.q, cutoff, margin_time=margin_time)
+            self.taps = signal.firwin(2 * self.half + 1, 1. / self.q, window=('kaiser', 5.0))
+        self.head = np.zeros(0)
+        self.tail = np.zeros(0)
+        self.padded = None
+        self.n_samples = 0
+        self.n_filtered = 0
+        self.n_out = 0
+        self.last = None
+
+    def process(self, block):
+        """Filter the next block, return the samples that are ready (may be empty)"""
+        block = np.asarray(block, dtype=np.float64)
+        if self.q < 2:
+            return self.butterworth.process(block)
+        
+        self.n_samples += len(block)
+        self.tail = np.concatenate((self.tail, block))[-(self.pad + 1):]
+        if self.padded is None:
+            # hold the start until there is enough data for the odd extension,
+            # resample_poly pads the extended series with zeros
+            self.head = np.concatenate((self.head, block))
+            if len(self.head) <= self.pad:
+                return np.zeros(0)
+            block, self.head = self.head, np.zeros(0)
+            self.padded = np.zeros(self.half)
+            block = np.concatenate((2 * block[0] - block[self.pad:0:-1], block))
+        
+        return self._interpolate(self.butterworth.process(self._decimate(block)))
+
+    def flush(self):
+        """Filter the end of the stream with its odd extension, return the remaining samples"""
+        if self.q < 2:
+            return self.butterworth.flush()
+        if self.padded is None:
+            # the whole stream was shorter than the odd extension
+            head, self.head = self.head, np.zeros(0)
+            return p2d.multirate_butterworth_filter(head, self.fs) if len(head) > 0 else head
+        
+        ext = 2 * self.tail[-1] - self.tail[-2:-self.pad - 2:-1]
+        out = self._interpolate(self.butterworth.process(self._decimate(
+            np.concatenate((ext, np.zeros(self.half))))))
+        return np.concatenate((out, self._interpolate(self.butterworth.flush(), end=True)))
+
+    def _decimate(self, block):
+        """Every q-th sample of the extended stream that has all its filter taps,
+        the buffer starts half the taps before the next one"""
+        self.padded = np.concatenate((self.padded, block))
+        n_taps = len(self.taps)
+        if len(self.padded) < n_taps:
+            return np.zeros(0)
+        count = (len(self.padded) - n_taps) // self.q + 1
+        # the full convolution reaches the first complete window after n_taps - 1 = 20 * q samples
+        decimated = signal.upfirdn(self.taps, self.padded[:(count - 1) * self.q + n_taps], 1, self.q)
+        self.padded = self.padded[count * self.q:]
+        return decimated[2 * self.half // self.q:][:count]
+
+    def _interpolate(self, filtered, end=False):
+        """Samples up to the last filtered position, the last of the stream at its end"""
+        if len(filtered) == 0:
+            return np.zeros(0)
+        # filtered sample m lines up with sample m * q of the odd extended stream
+        positions = (self.n_filtered + np.arange(len(filtered))) * self.q - self.pad
+        self.n_filtered += len(filtered)
+        if self.last is not None:
+            positions = np.concatenate(([self.last[0]], positions))
+            filtered = np.concatenate(([self.last[1]], filtered))
+        
+        last = self.n_samples - 1 if end is True else min(positions[-1], self.n_samples - 1)
+        out = np.interp(np.arange(self.n_out, last + 1), positions, filtered)
+        self.n_out = max(self.n_out, last + 1)
+        self.last = (positions[-1], filtered[-1])
+        return out
+
+
+class StreamingRollingStdFilter(object):
+    """rolling_std_filter over a stream of blocks.
+
+    Given the n_samples of the whole stream, the series is split into the
+    same blocks as the batch filter (np.array_split into n_samples // window
+    blocks) and the output matches it. Without it the series is split into
+    consecutive 6 minute blocks and the edges drift from the batch blocks
+    unless the length is a multiple of 6 minutes. The masked samples of every
+    iteration are kept for the previous block only, which is all the trailing
+    window statistics of the next block need."""
+
+    def __init__(self, fs, rolling=False, iterations=3, n_std=1, n_samples=None):
+        self.window = int(360 * fs)
+        self.rolling = rolling
+        self.iterations = iterations
+        self.n_std = n_std
+        self.raw = np.zeros(0)
+        self.previous = None
+        self.interpolator = StreamingInterpolator()
+        self.sizes = None
+        if n_samples is not None:
+            self.sizes = p2d.block_sizes(n_samples, self.window)
+        self.n_blocks = 0
+
+    def block_size(self):
+        """Size of the next block, a window once the sizes run out"""
+        if self.sizes is not None and self.n_blocks < len(self.sizes):
+            return self.sizes[self.n_blocks]
+        return self.window
+
+    def process(self, block):
+        """Filter the next block, return the samples that are ready (may be empty)"""
+        self.raw = np.concatenate((self.raw, np.asarray(block, dtype=np.float64)))
+        out = []
+        while len(self.raw) >= self.block_size():
+            size = self.block_size()
+            out.append(self._filter_block(self.raw[:size]))
+            self.raw = self.raw[size:]
+            self.n_blocks += 1
+        return np.concatenate(out) if len(out) > 0 else np.zeros(0)
+
+    def flush(self):
+        """Filter the last partial block, return the remaining samples"""
+        out = self._filter_block(self.raw) if len(self.raw) > 0 else np.zeros(0)
+        self.raw = np.zeros(0)
+        return np.concatenate((out, self.interpolator.flush()))
+
+    def _filter_block(self, block):
+        levels = [block]
+        center = (len(block) - 1) // 2 + 1
+        for i in range(self.iterations):
+            current = levels[-1]
+            previous = self.previous[i] if self.previous is not None else np.zeros(0)
+            end = min(center, len(current) - 1) + 1
+            values = np.concatenate((previous[max(len(previous) + end - self.window, 0):],
+                                     current[:end]))
+            values = values[~np.isnan(values)]
+            
+            masked = current.copy()
+            if len(values) >= 2:
+                mean, std_dev = np.mean(values), np.std(values, ddof=1)
+                with np.errstate(invalid='ignore'):
+                    masked[np.abs(masked - mean) > self.n_std * std_dev] = np.nan
+            levels.append(masked)
+        
+        masked = levels[-1]
+        if self.rolling is True:
+            previous = self.previous[-1] if self.previous is not None else np.zeros(0)
+            means = p2d._trailing_mean(np.concatenate((previous, masked)), self.window)
+            values = means[len(previous):]
+        else:
+            values = np.full(len(masked), np.nan)
+            if np.any(~np.isnan(masked)):
+                values[(len(masked) - 1) // 2] = np.nanmean(masked)
+        
+        # keep the last window of every level for the statistics of the next block
+        self.previous = [x[-self.window:] for x in levels]
+        return self.interpolator.process(values)
+
+
+class StreamingInterpolator(object):
+    """Linear interpolation over NaN gaps of a stream of blocks, like np.interp
+    over the valid samples of the whole series. Samples after the last valid
+    value are held back until the next valid value arrives."""
+
+    def __init__(self):
+        self.last = None
+        self.pending = 0
+
+    def process(self, values):
+        valid = np.flatnonzero(~np.isnan(values))
+        if len(valid) == 0:
+            self.pending += len(values)
+            return np.zeros(0)
+        
+        out = np.concatenate((np.full(self.pending, np.nan), values[:valid[-1] + 1]))
+        positions = np.arange(len(out)) - self.pending
+        points = valid
+        point_values = values[valid]
+        if self.last is not None:
+            points = np.concatenate(([-self.pending - 1], points))
+            point_values = np.concatenate(([self.last], point_values))
+        out = np.interp(positions, points, point_values)
+        
+        self.last = values[valid[-1]]
+        self.pending = len(values) - valid[-1] - 1
+        return out
+
+    def flush(self):
+        out = np.full(self.pending, self.last if self.last is not None else np.nan)
+        self.pending = 0
+        return out
+
+
+def stream_filter(blocks, streaming_filter):
+    """Yield the filtered blocks of a stream of blocks, every input sample is
+    output once and in order"""
+    for block in blocks:
+        out = streaming_filter.process(block)
+        if len(out) > 0:
+            yield out
+    out = streaming_filter.flush()
+    if len(out) > 0:
+        yield out
+
+
+def make_stream_filter(fs, use_filter=None, n_samples=None):
+    """Streaming filter for the same use_filter names as StormData.derive_surge_sea_pressure,
+    n_samples is the length of the stream the rolling std filters split like the batch ones"""
+    if use_filter == 'Butterworth':
+        return StreamingButterworthFilter(fs)
+    elif use_filter == 'Multirate Butterworth':
+        return StreamingMultirateButterworthFilter(fs)
+    elif use_filter == 'Moving Avg 3 Std Devs':
+        return StreamingRollingStdFilter(fs, rolling=True, n_samples=n_samples)
+    else:
+        return StreamingRollingStdFilter(fs, rolling=False, n_samples=n_samples)
@@ -3,6 +3,7 @@
 Statistics calculations using power spectral density and trapezoidal
 rule on spectral moments.
 """
+from functools import lru_cache
 import numpy as np
 import scipy.stats as stats
 from wavelab.utilities import unit_conversion as uc
@@ -12,44 +13,152 @@ import scipy.signal as signal
 G = uc.GRAVITY
 std_dev = False
 
+# spectral moment orders needed by the wave statistics
+MOMENT_ORDERS = (0, 1, 2, 4)
+
+# wave heights as multiples of the square root of the zeroth spectral moment
+WAVE_HEIGHT_FACTORS = {
+    'H1/3': 4,
+    'H10%': 5.091,
+    'H1%': 6.672,
+    'RMS': 2.83,
+    'Median': 2.36,
+    'Maximum': 1.86 * 4,
+    'Average': 2.51
+}
+
+
+def _wave_height(factor):
+    return lambda table, freq: factor * np.sqrt(table['m0'])
+
+
+# every wave statistic, the moment table entries it depends on and how it is
+# calculated from a moment table and its frequencies
+STATISTICS = {
+    'T1/3': (('peak',), lambda table, freq: .9451 / freq[table['peak']]),
+    'H1/3': (('m0',), _wave_height(WAVE_HEIGHT_FACTORS['H1/3'])),
+    'H10%': (('m0',), _wave_height(WAVE_HEIGHT_FACTORS['H10%'])),
+    'H1%': (('m0',), _wave_height(WAVE_HEIGHT_FACTORS['H1%'])),
+    'RMS': (('m0',), _wave_height(WAVE_HEIGHT_FACTORS['RMS'])),
+    'Median': (('m0',), _wave_height(WAVE_HEIGHT_FACTORS['Median'])),
+    'Maximum': (('m0',), _wave_height(WAVE_HEIGHT_FACTORS['Maximum'])),
+    'Average': (('m0',), _wave_height(WAVE_HEIGHT_FACTORS['Average'])),
+    'Average Z Cross': (('m0', 'm2'), lambda table, freq: np.sqrt(table['m0'] / table['m2'])),
+    'Mean Wave Period': (('m0', 'm1'), lambda table, freq: table['m0'] / table['m1']),
+    'Crest': (('m2', 'm4'), lambda table, freq: np.sqrt(table['m2'] / table['m4'])),
+    'Peak Wave': (('peak',), lambda table, freq: np.where(table['valid'], 1 / freq[table['peak']], np.nan))
+}
+
+
+class BandAverager(object):
+    """Averages stacks of spectra over bands of df/2 neighbouring frequencies
+    and keeps only the bands whose center frequency is within the cutoffs.
+
+    The band centers and cutoff mask are computed once, applying the operator
+    to a (..., n_frequencies) array averages every spectrum in it at once."""
+
+    def __init__(self, freqs, df, low_cut, high_cut):
+        freqs = np.asarray(freqs, dtype=np.float64)
+        self.step = step = int(df/2)
+        self.n_freqs = len(freqs)
+        
+        starts = np.arange(0, self.n_freqs, step)
+        counts = np.diff(np.append(starts, self.n_freqs))
+        centers = np.add.reduceat(freqs, starts) / counts if self.n_freqs > 0 else np.zeros(0)
+        
+        # the cutoffs keep a contiguous run of bands [first, last)
+        kept = np.where((centers <= high_cut) & (centers >= low_cut))[0]
+        self.first = kept[0] if len(kept) > 0 else 0
+        self.last = kept[-1] + 1 if len(kept) > 0 else 0
+        self.freqs = centers[self.first:self.last]
+        self.starts = starts[self.first:self.last]
+        self.counts = counts[self.first:self.last]
+        
+        # bands that are all full width can be averaged with a reshape
+        self.full_bands = bool(np.all(self.counts == step))
+
+    def __call__(self, psd_amps):
+        psd_amps = np.asarray(psd_amps)
+        if len(self.freqs) == 0:
+            return np.zeros(psd_amps.shape[:-1] + (0,))
+        
+        if self.full_bands:
+            bands = psd_amps[..., self.first * self.step:self.last * self.step]
+            return bands.reshape(psd_amps.shape[:-1] + (-1, self.step)).mean(axis=-1)
+        
+        band_start = self.starts[0]
+        band_end = self.starts[-1] + self.counts[-1]
+        sums = np.add.reduceat(psd_amps[..., band_start:band_end], self.starts - band_start, axis=-1)
+        return sums / self.counts
+
+
+@lru_cache(maxsize=32)
+def band_average_operator(window_length, tstep, df, low_cut, high_cut):
+    """Return the BandAverager for the spectra of windows of window_length samples
+    taken every tstep seconds, built once per combination of arguments"""
+    freqs = np.fft.rfftfreq(window_length, d=tstep)[1:]
+    return BandAverager(freqs, df, low_cut, high_cut)
+
 
 class Stats(object):
 
     def __init__(self):
         self.low_cut = 0.033333333333
         self.high_cut = 1.0
+        self.dispersion_method = 'newton'
          
-    def power_spectrum(self, y, tstep, h, d):
+    def power_spectrum(self, y, tstep, h, d, method=None):
         """Calculate the power spectrum of the series y"""
-        # calculate the Power Spectral Density (PSD)
-        scale = (len(y)/2.0) * 4.0
-        spec = np.fft.rfft(y)
-        spec = spec * np.conjugate(spec) / scale
-        freqs = np.fft.rfftfreq(len(y), d=tstep)
-        spec = spec[1:]
-        self.frequencies = freqs = freqs[1:]
-      
-        # band average the spectra
-        freqs, spec = self.band_average_psd(freqs, spec, 32)
-        
+
+        freqs, wl_amps, wl_up, wl_down = self.batch_power_spectrum(np.asarray(y)[np.newaxis, :],
+                                                                   tstep, h, d, method)
+        return (freqs, wl_amps[0], wl_up[0], wl_down[0])
+
+    def batch_power_spectrum(self, y, tstep, h, d, method=None):
+        """Calculate the power spectra of every row (window) of the 2-D array y
+
+        h and d are the instrument height and water depth, either scalars or
+        one value per window. method names the dispersion solver (see
+        pressure_to_depth.DISPERSION_SOLVERS) and defaults to
+        self.dispersion_method.  Returns the band averaged frequencies and 2-D
+        (n_windows x n_frequencies) water level PSD with its upper and lower
+        confidence bounds."""
+        y = np.asarray(y, dtype=np.float64)
+        h = np.reshape(h, (-1, 1))
+        d = np.reshape(d, (-1, 1))
+
+        # calculate the Power Spectral Density (PSD) of all windows in one pass
+        scale = (y.shape[-1]/2.0) * 4.0
+        spec = np.fft.rfft(y, axis=-1)
+        spec = (spec.real**2 + spec.imag**2) / scale
+        freqs = np.fft.rfftfreq(y.shape[-1], d=tstep)
+        spec = spec[..., 1:]
+        self.frequencies = freqs[1:]
+
+        # band average the spectra with the cached operator for this window length
+        averager = band_average_operator(y.shape[-1], float(tstep), 32, self.low_cut, self.high_cut)
+        freqs, spec = averager.freqs, averager(spec)
+
         # radial frequency Units 1/T
-        omega = np.array(2* np.pi * freqs)
-          
-        #1st wave number estimate
-        k = p2d.omega_to_k(omega, d)
-       
+        omega = np.array(2 * np.pi * freqs)
+
+        #1st wave number estimate, one row per window depth
+        if method is None:
+            method = self.dispersion_method
+        k = p2d.solve_dispersion(omega[np.newaxis, :], d, method)
+
         # pressure response factor
         kz = np.array(np.cosh(h*k)/np.cosh(d*k))
         # get upper and lower band for PSD estimate
         # DEGREES OF FREEDOM ARE STATICALLY 32 FOR NOW AS WELL AS A 90% CONFIDENCE INTERVAL
         upper_spec, lower_spec = self.psd_confidence_intervals(spec,32,.9)
-           
+
         # convert to water level PSD
         wl_amps = spec/kz**2
         wl_up = upper_spec/kz**2
         wl_down = lower_spec/kz**2
 
-        return (freqs, wl_amps, wl_up, wl_down)     
+        return (freqs, wl_amps, wl_up, wl_down)
 
     @staticmethod
     def welch_power_spectrum(y,tstep):
@@ -69,6 +178,51 @@ class Stats(object):
         moment = self.moment(freq, spec, n)    
         return moment
 
+    @staticmethod
+    def moment_weights(freq, orders=MOMENT_ORDERS):
+        """Trapezoid rule weights times freq**n for each moment order n, so that
+        np.dot(spec, weights)[..., i] == np.trapz(spec * freq**orders[i], x=freq)"""
+        freq = np.asarray(freq, dtype=np.float64)
+        trapezoid = np.zeros(len(freq))
+        half_steps = np.diff(freq) / 2.0
+        trapezoid[:-1] += half_steps
+        trapezoid[1:] += half_steps
+        return trapezoid[:, np.newaxis] * freq[:, np.newaxis] ** np.array(orders)[np.newaxis, :]
+
+    @staticmethod
+    def moment_table(spec, weights, orders=MOMENT_ORDERS):
+        """Calculate the spectral moments and peak index of every spectrum (row)
+        of spec with one matrix product against the moment_weights"""
+        spec = np.asarray(spec, dtype=np.float64)
+        moments = np.dot(spec, weights)
+        table = {'m%d' % n: moments[..., i] for i, n in enumerate(orders)}
+        table['peak'] = np.argmax(spec, axis=-1)
+        table['valid'] = ~np.any(np.isnan(spec), axis=-1)
+        return table
+
+    @staticmethod
+    def moment_orders(statistics=None):
+        """Return the spectral moment orders needed to calculate the named statistics"""
+        if statistics is None:
+            return MOMENT_ORDERS
+        
+        orders = set()
+        for name in statistics:
+            for dependency in STATISTICS[name][0]:
+                if dependency.startswith('m'):
+                    orders.add(int(dependency[1:]))
+        return tuple(sorted(orders))
+
+    @staticmethod
+    def moment_statistics(table, freq, statistics=None):
+        """Calculate the named wave statistics (all of them by default) of every
+        spectrum in a moment table"""
+        freq = np.asarray(freq)
+        if statistics is None:
+            statistics = STATISTICS
+        
+        return {name: STATISTICS[name][1](table, freq) for name in statistics}
+
     def median_wave_height(self, spec, freq, t, depth):
         if not std_dev:
             return 2.36 * np.sqrt(self.spec_moment(0, spec, freq))
@@ -149,6 +303,21 @@ class Stats(object):
         n_chunks = len(depth) * tstep / chunk_length
         return np.array_split(depth, n_chunks)
 
+    @staticmethod
+    def split_into_windows(series, window=4096, step=2048):
+        """Return a read only (n_windows x window) view of series where each
+        row starts step samples after the previous one (50% overlap by default).
+
+        Samples after the last complete window are dropped."""
+        series = np.ascontiguousarray(series)
+        n_windows = max(0, (len(series) - window) // step + 1)
+        stride = series.strides[0]
+        windows = np.lib.stride_tricks.as_strided(series,
+                                                  shape=(n_windows, window),
+                                                  strides=(stride * step, stride))
+        windows.flags.writeable = False
+        return windows
+
     @staticmethod
     def psd_confidence_intervals(PSD, df, ci):
         """method from NDBC Technical document to return confidence intervals for
@@ -158,32 +327,19 @@ class Stats(object):
         lower = PSD*df/stats.chi2.ppf((1 + ci)/2.0, df)
         return (upper, lower)
     
-    def band_average_psd(self, freqs, psd_amps, df):
-        """method to average spectra bands at a center frequency"""
-
-        new_freqs = []     
-        new_amps = []
-        step, index = int(df/2), 0
-        
-        # WHILE THE INDEX IS LESS THAN FREQUENCY ARRAY LENGTH, AVERAGE EVERY 16 FREQUENCY BANDS
-        # AND ADD THE CENTER FREQUENCY TO THE NEW LIST OF FREQUENCIES
-        while index < len(freqs):
-            
-            new_freqs.append(np.average(freqs[np.arange(index,index+step)]))
-            new_amps.append(np.average(psd_amps[np.arange(index,index+step)]))
-            index += step
-        
-        psd_avg_amps = np.array(new_amps)      
-        freqs = np.array(new_freqs)
-        
-        # CUTOFF ALL FREQUENCIES THAT ARE GREATER THAN 1HZ
-        high_cut_off = np.where(freqs <= self.high_cut)
-        freqs = freqs[high_cut_off]
-        psd_avg_amps = psd_avg_amps[high_cut_off].real
-        
-        low_cut_off = np.where(freqs >= self.low_cut)
-        freqs = freqs[low_cut_off]
-        psd_avg_amps = psd_avg_amps[low_cut_off]
-        
-        return freqs, psd_avg_amps
+    def band_average_psd(self, freqs, psd_amps, df, window_length=None, tstep=None):
+        """method to average spectra bands at a center frequency
+
+        freqs are the rfft frequencies of windows of window_length samples taken
+        every tstep seconds without the zero frequency, the two are derived
+        from freqs when not given (windows of 2 * len(freqs) samples)"""
+
+        if window_length is None or tstep is None:
+            window_length = 2 * len(freqs)
+            tstep = 1.0 / (window_length * freqs[0])
+        averager = band_average_operator(int(window_length), float(tstep), df,
+                                         self.low_cut, self.high_cut)
+        
+        return averager.freqs, averager(np.real(psd_amps))
+
 
@@ -5,7 +5,7 @@ Module to query WaterServices for wind data from a selected Rapid Deployment Gag
 import requests
 import defusedxml.ElementTree as ET
 from datetime import datetime
-from wavelab.utilities import unit_conversion as uc
+from wavelab.utilities import unit_conversion as uc, nc
 from netCDF4 import Dataset
 import numpy as np
 from wavelab.utilities.var_datastore import DataStore
@@ -112,6 +112,7 @@ def get_wind_data(file_name,sites,start_date = None, end_date = None, tz=None, d
         time = format_time(time)
         time = time[2:]
         print(len(time), len(u), len(v))
+        nc.invalidate(file_name)
         with Dataset(file_name, 'w', format="NETCDF4_CLASSIC") as ds:
             time_dimen = ds.createDimension("time", len(time))
             station_dimen = ds.createDimension("station_id", len(sites))
@@ -2,7 +2,8 @@
 Contains classes that parse CSV files output by pressure sensors.
 """
 
-from datetime import datetime
+from collections import OrderedDict
+from datetime import datetime, timedelta
 from wavelab.utilities import edit_netcdf, unit_conversion as uc
 import numpy as np
 import pandas as pd
@@ -19,9 +20,151 @@ def find_first(fname, expr):
                 return i + 1
 
 
-def get_date_format(date):
-    "Return datatime format string given a string of datetime data."
-    date_formats = ['%m/%d/%Y %H:%M:%S', '%m/%d/%Y %H:%M:%S.%f', '%m/%d/%Y %I:%M:%S %p', '%m/%d/%Y %I:%M:%S.%f %p',
+# the size of each read of a file's leading block and the most HeaderSniffer
+# reads looking for the header
+HEADER_BLOCK_SIZE = 2 ** 16
+HEADER_MAX_BYTES = 2 ** 20
+
+# "key: value" and "key = value" header lines
+HEADER_FIELD = re.compile(r'^\s*"?([^:=",]+?)\s*[:=]\s*(.*?)"?\s*$')
+
+
+class Header(object):
+    """The header of a logger CSV file, see HeaderSniffer"""
+
+    def __init__(self, fname):
+        self.fname = fname
+        # the decoded lines read and the byte offset each starts at, the last
+        # offset is where the last line ends
+        self.lines = []
+        self.offsets = [0]
+        # the index of the first line matching the data start expression
+        self.data_line = None
+        self.serial = "not found"
+        self.timezone = None
+        # the lines matching each marker expression
+        self.markers = {}
+        # the "key: value" and "key = value" lines before the data
+        self.fields = OrderedDict()
+
+    def offset(self, skip=0):
+        """Byte offset of the line skip lines after the data start line"""
+
+        if self.data_line is None:
+            raise ValueError("data start not found: %s" % self.fname)
+        return self.offsets[min(self.data_line + skip, len(self.offsets) - 1)]
+
+    def field(self, expr):
+        """The value of the first header field whose key matches expr, None if
+        there is none"""
+
+        expr = re.compile(expr, re.IGNORECASE)
+        for key in self.fields:
+            if expr.search(key):
+                return self.fields[key]
+        return None
+
+    def read_csv(self, skip=0, **kwargs):
+        """pandas.read_csv of the file from the line skip lines after the data
+        start line, without reading the header again"""
+
+        with open(self.fname, 'rb') as f:
+            f.seek(self.offset(skip))
+            return pd.read_csv(f, header=None, **kwargs)
+
+    def read_csv_blocks(self, block_size, skip=0, **kwargs):
+        """read_csv the file block_size rows at a time, a DataFrame a block"""
+
+        with open(self.fname, 'rb') as f:
+            f.seek(self.offset(skip))
+            for df in pd.read_csv(f, header=None, chunksize=block_size, **kwargs):
+                yield df
+
+
+class HeaderSniffer(object):
+    """Finds the data start, serial number, time zone and header fields of a
+    logger CSV file in one read of its leading block.
+
+    The data starts at the first line matching data_start, an expression or
+    a list of them in order of preference: the first line matching the first
+    expression, or if no line does, the first line matching the next one.
+    serial is an expression whose first group (or whole match) is the serial
+    number, searched only on lines matching serial_line when given, and
+    markers a dict of expressions whose first matching line is kept. Lines
+    are read until the line after a first expression match and every serial
+    and marker line were found, or max_bytes were read."""
+
+    def __init__(self, data_start, serial=None, serial_line=None, markers=None,
+                 timezone_marker="time zone", max_bytes=HEADER_MAX_BYTES):
+        if isinstance(data_start, str):
+            data_start = [data_start]
+        self.data_start = [re.compile(x) for x in data_start]
+        self.serial = None if serial is None else re.compile(serial)
+        self.serial_line = None if serial_line is None else re.compile(serial_line)
+        self.markers = dict((k, re.compile(v)) for k, v in (markers or {}).items())
+        self.timezone_marker = timezone_marker.lower()
+        self.max_bytes = max_bytes
+
+    def lines(self, fname):
+        """(raw bytes, decoded text) of each line in the leading block of fname,
+        the text ends in '\\n' as read in text mode"""
+
+        with open(fname, 'rb') as f:
+            pending = b''
+            for start in range(0, self.max_bytes, HEADER_BLOCK_SIZE):
+                block = f.read(HEADER_BLOCK_SIZE)
+                if not block:
+                    # the last line of the file has no line end
+                    if pending:
+                        yield pending, pending.rstrip(b'\r').decode('utf-8', 'replace')
+                    break
+                lines = (pending + block).split(b'\n')
+                pending = lines.pop()
+                for raw in lines:
+                    yield raw + b'\n', raw.rstrip(b'\r').decode('utf-8', 'replace') + '\n'
+
+    def sniff(self, fname):
+        header = Header(fname)
+        serial_found = self.serial is None
+        # the first line matching each data start expression
+        starts = [None] * len(self.data_start)
+
+        for i, (raw, text) in enumerate(self.lines(fname)):
+            header.lines.append(text)
+            header.offsets.append(header.offsets[-1] + len(raw))
+
+            for k, expr in enumerate(self.data_start):
+                if starts[k] is None and expr.search(text):
+                    starts[k] = i
+
+            if not serial_found and \
+                    (self.serial_line is None or self.serial_line.search(text)):
+                match = self.serial.search(text)
+                if match is not None:
+                    header.serial = match.group(1) if match.groups() else match.group(0)
+                    serial_found = True
+
+            for name, expr in self.markers.items():
+                if name not in header.markers and expr.search(text):
+                    header.markers[name] = text
+
+            # the line after the data start is kept for readers that skip it
+            if starts[0] is not None and i > starts[0] and serial_found \
+                    and len(header.markers) == len(self.markers):
+                break
+
+        header.data_line = next((x for x in starts if x is not None), None)
+        for text in header.lines[:header.data_line]:
+            if header.timezone is None and self.timezone_marker in text.lower():
+                header.timezone = text.strip()
+            match = HEADER_FIELD.match(text)
+            if match is not None and match.group(1) not in header.fields:
+                header.fields[match.group(1)] = match.group(2)
+
+        return header
+
+
+DATE_FORMATS = ['%m/%d/%Y %H:%M:%S', '%m/%d/%Y %H:%M:%S.%f', '%m/%d/%Y %I:%M:%S %p', '%m/%d/%Y %I:%M:%S.%f %p',
                 '%m/%d/%Y %H:%M', '%m/%d/%Y %I:%M %p', '%m/%d/%y %I:%M:%S %p', '%m/%d/%y %I:%M:%S.%f %p',
                 '%m/%d/%y %H:%M:%S', '%m/%d/%y %H:%M:%S.%f', '%m/%d/%y %H:%M', '%m/%d/%y %I:%M %p',
                 '%Y/%m/%d %H:%M:%S', '%Y/%m/%d %H:%M:%S.%f', '%Y/%m/%d %I:%M:%S %p', '%Y/%m/%d %I:%M:%S.%f %p',
@@ -36,111 +179,169 @@ def get_date_format(date):
                 '%m.%d.%y %H:%M:%S', '%m.%d.%y %H:%M:%S.%f', '%m.%d.%y %I:%M:%S %p', '%m.%d.%y %I:%M:%S.%f %p',
                 '%m.%d.%y %H:%M', '%m.%d.%y %I:%M %p'
                ]
+
+
+def get_date_format(date):
+    "Return datatime format string given a string of datetime data."
     date_format_string = "None"
 
-    for d in date_formats:
+    for d in DATE_FORMATS:
         try:
             datetime.strptime(date, d)
             date_format_string = d
             break
-        except:
+        except ValueError:
             pass
 
     return date_format_string
 
 
+class DateFormatInference(object):
+    """Infers the format of a column of date strings from a sample of its rows.
+
+    The formats that parse the first date are ranked by how many of the
+    sampled dates they parse and then by how many of those increase, ties go
+    to the first format in preferred + formats. The winner is cached per key
+    (the instrument) and shape of the dates and tried first the next time."""
+
+    def __init__(self, formats=DATE_FORMATS, sample_size=200):
+        self.formats = list(formats)
+        self.sample_size = sample_size
+        self.cache = {}
+
+    @staticmethod
+    def signature(date):
+        """The date with every digit replaced by 0"""
+        return re.sub('[0-9]', '0', date.strip())
+
+    def sample(self, dates):
+        """Evenly spaced dates from the first to the last"""
+        index = np.unique(np.linspace(0, len(dates) - 1, self.sample_size).astype(np.int64))
+        return np.asarray(dates)[index]
+
+    @staticmethod
+    def parsed(sample, date_format):
+        """The sampled dates date_format parses as datetime64"""
+        return pd.to_datetime(pd.Series(sample), format=date_format, errors='coerce').values
+
+    def rank(self, sample, preferred=()):
+        """The candidate formats of the sample, best first"""
+
+        candidates = []
+        for date_format in list(preferred) + self.formats:
+            if date_format in candidates:
+                continue
+            try:
+                datetime.strptime(sample[0], date_format)
+                candidates.append(date_format)
+            except ValueError:
+                pass
+
+        scores = []
+        for order, date_format in enumerate(candidates):
+            values = self.parsed(sample, date_format)
+            values = values[~np.isnat(values)]
+            scores.append((-len(values), -np.count_nonzero(np.diff(values) > np.timedelta64(0)),
+                           order))
+        return [candidates[x[2]] for x in sorted(scores)]
+
+    def infer(self, dates, key=None, preferred=()):
+        """The format of the column of date strings dates, "None" if no format
+        parses its first date"""
+
+        if len(dates) == 0:
+            return "None"
+        sample = self.sample(dates)
+        signature = (key, self.signature(sample[0]))
+
+        cached = self.cache.get(signature)
+        if cached is not None and not np.isnat(self.parsed(sample, cached)).any():
+            return cached
+
+        ranked = self.rank(sample, preferred)
+        if len(ranked) == 0:
+            return "None"
+        self.cache[signature] = ranked[0]
+        return ranked[0]
+
+
+# the date formats inferred in this session
+date_formats = DateFormatInference()
+
+
 class Hobo(edit_netcdf.NetCDFWriter):
     """derived class for hobo csv files """
 
+    header_sniffer = HeaderSniffer(['"#"', '#'], serial='[0-9]{6}')
+
     def __init__(self):
         self.timezone_marker = "time zone"
         super().__init__()
 
 
     def read(self):
-        """load the data from in_filename
-        only parse the initial datetime = much faster"""
-
-        self.get_serial()
-
-        skip_index = find_first(self.in_filename, '"#"')
-        if skip_index is None:
-            skip_index = find_first(self.in_filename, '#')
-
-        df = pd.read_table(self.in_filename, skiprows=skip_index, header=None,
-                           engine='c', sep=',', usecols=(1,2,3))
-        df = df.dropna()
-
-        if isinstance(df[2][0], str):
+        """load the data from in_filename"""
+
+        header = self.header_sniffer.sniff(self.in_filename)
+        self.instrument_serial = header.serial
+
+        df = header.read_csv(1, engine='c', sep=',', usecols=(1,2,3))
+        block = self.parse(df.dropna())
+        if block is not None and self.set_time_axis(block[0]):
+            self.pressure_data = self.grid(block[1])
+
+    def read_blocks(self, block_size):
+        """(time in ms, pressure) of block_size rows of the file at a time"""
+
+        header = self.header_sniffer.sniff(self.in_filename)
+        self.instrument_serial = header.serial
+
+        infer = True
+        for df in header.read_csv_blocks(block_size, 1, engine='c', sep=',', usecols=(1,2,3)):
+            df = df.dropna()
+            if len(df) == 0:
+                continue
+            block = self.parse(df, infer)
+            if block is None:
+                return
+            infer = False
+            yield block
+
+    def parse(self, df, infer=True):
+        """(time in ms, pressure) of the rows df, None if the date format of
+        the first rows is not recognized"""
+
+        if isinstance(df[2].values[0], str):
             vals = df[3].values
-            date1, date2 = df[1][0] + ' ' + df[2][0], df[1][1] + ' ' + df[2][1]
+            dates = (df[1] + ' ' + df[2]).values
         else:
             vals = df[2].values
-            date1, date2 = df[1][0], df[1][1]
+            dates = df[1].values
 
         # Determine the format of the datetime
-        self.date_format_string = get_date_format(date1)
-        
+        if infer:
+            self.date_format_string = date_formats.infer(dates, 'Hobo')
+
         # If the datetime format is not recognized...
         if self.date_format_string == "None":
             self.bad_data = True
             self.error_message = 'Error! Date time format was not recognized. Try changing it to this format: mm/dd/YYYY HH:MM:SS.MS'
-        
-        else:
-            try:
-                first_stamp = uc.datestring_to_ms(date1, self.date_format_string,
-                                                self.tz_info, self.daylight_savings)
-                second_stamp = uc.datestring_to_ms(date2, self.date_format_string,
-                                                self.tz_info, self.daylight_savings)
-            except:
-                try:
-                    first_stamp = uc.datestring_to_ms(date1, self.date_format_string2,
-                                                    self.tz_info, self.daylight_savings)
-                    second_stamp = uc.datestring_to_ms(date2, self.date_format_string2,
-                                                    self.tz_info, self.daylight_savings)
-                except:
-                    first_stamp = uc.datestring_to_ms(date1, self.date_format_string3,
-                                                    self.tz_info, self.daylight_savings)
-                    second_stamp = uc.datestring_to_ms(date2, self.date_format_string3,
-                                                    self.tz_info, self.daylight_savings)
-
-            timestep = second_stamp - first_stamp
-            # check time step:
-            if timestep <= 0:
-                self.bad_data = True
-                self.error_message = 'Error! Time step is zero. Check the datetime column of the input data.'
-
-            else:
-                self.frequency = 1000 / (second_stamp - first_stamp)
-                
-                try:
-                    start_ms = uc.datestring_to_ms(date1, self.date_format_string,
-                                                self.tz_info, self.daylight_savings)
-                except:
-                    try:
-                        start_ms = uc.datestring_to_ms(date1, self.date_format_string2,
-                                                    self.tz_info, self.daylight_savings)
-                    except:
-                        start_ms = uc.datestring_to_ms(date1, self.date_format_string3,
-                                                    self.tz_info, self.daylight_savings)
-                    
-                self.utc_millisecond_data = uc.generate_ms(start_ms, df.shape[0], self.frequency)
-
-                self.pressure_data = vals * uc.PSI_TO_DBAR
-            
+            return None
+
+        ms = uc.datestrings_to_ms(dates, self.date_format_string,
+                                  self.tz_info, self.daylight_savings)
+        return ms, vals * uc.PSI_TO_DBAR
+
     def get_serial(self):
-        self.instrument_serial = "not found"
-        with open(self.in_filename, 'r') as text:
-            for i, line in enumerate(text):
-                if re.search('[0-9]{6}', line):
-                    match = re.search('[0-9]{6}', line)
-                    self.instrument_serial = match.group(0)
-                    break
+        self.instrument_serial = self.header_sniffer.sniff(self.in_filename).serial
 
 
 class House(edit_netcdf.NetCDFWriter):
     """Processes files coming out of the USGS-made sensors"""
 
+    header_sniffer = HeaderSniffer('^[0-9]{4},[0-9]{4}$',
+                                   markers={'date': '^[0-9]{4}.[0-9]{2}.[0-9]{2}'})
+
     def __init__(self):
         self.timezone_marker = "time zone"
         self.temperature_data = None
@@ -151,29 +352,28 @@ class House(edit_netcdf.NetCDFWriter):
     def read(self):
         """Load the data from in_filename"""
 
-        skip_index = find_first(self.in_filename, '^[0-9]{4},[0-9]{4}$') - 1
-        df = pd.read_table(self.in_filename, skiprows=skip_index, header=None,
-                           engine='c', sep=',', names=('a', 'b'))
+        header = self.header_sniffer.sniff(self.in_filename)
+        df = header.read_csv(0, engine='c', sep=',', names=('a', 'b'))
         self.pressure_data = np.array([
             uc.USGS_PROTOTYPE_V_TO_DBAR(np.float64(x))
             for x in df[df.b.isnull() == False].a])
         self.temperature_data = [
             uc.USGS_PROTOTYPE_V_TO_C(np.float64(x))
             for x in df[df.b.isnull() == False].b]
-        with open(self.in_filename, 'r') as wavelog:
-            for x in wavelog:
-                # second arg has extra space that is unnecessary
-                if re.match('^[0-9]{4}.[0-9]{2}.[0-9]{2}', x):
-                    start_ms = uc.datestring_to_ms(x, self.date_format_string)
-                    self.utc_millisecond_data = uc.generate_ms(start_ms,
-                                                               len(self.pressure_data),
-                                                               self.frequency)
-                    break
+        if 'date' in header.markers:
+            # second arg has extra space that is unnecessary
+            start_ms = uc.datestring_to_ms(header.markers['date'], self.date_format_string)
+            self.utc_millisecond_data = uc.generate_ms(start_ms,
+                                                       len(self.pressure_data),
+                                                       self.frequency)
 
 
 class Leveltroll(edit_netcdf.NetCDFWriter):
     """derived class for leveltroll ascii files"""
-    
+
+    header_sniffer = HeaderSniffer('Date and Time,Seconds', serial='[0-9]{6}',
+                                   serial_line='Serial Number')
+
     def __init__(self):
         self.numpy_dtype = np.dtype([("seconds", np.float32),
                                      ("pressure", np.float32)])
@@ -185,54 +385,56 @@ class Leveltroll(edit_netcdf.NetCDFWriter):
         self.temperature_data = None
 
     def read(self):
-        """load the data from in_filename
-        only parse the initial datetime = much faster"""
+        """load the data from in_filename"""
         
 
-        self.get_serial()
-        skip_index = find_first(self.in_filename, 'Date and Time,Seconds')
-#         data = pd.read_table(self.in_filename, skiprows=skip_index, header=None,
-#                            engine='c', sep=',', usecols=(0,1,2,3))
+        header = self.header_sniffer.sniff(self.in_filename)
+        self.instrument_serial = header.serial
 
-        data = pd.read_table(self.in_filename, skiprows=skip_index, header=None,
-                            engine='c', sep=',', usecols=(0,1,2))
+        data = header.read_csv(1, engine='c', sep=',', usecols=(0,1,2))
         
-        self.data_start = uc.datestring_to_ms(data[0][1], self.date_format_string,
-                                           self.tz_info, self.daylight_savings)
+        ms, pressure = self.parse(data)
         # self.data_start2 = uc.datestring_to_ms(data[1][1], self.date_format_string,
         #                                    self.tz_info, self.daylight_savings)
 
-        timestep = int(data[1][1] - data[1][0])
-        # check time step:
-        if timestep <= 0:
-            self.bad_data = True
-            self.error_message = 'Error! Time step is zero. Check the datetime column of the input data.'
-        
-        else:
-            self.frequency = 1 / timestep
-            
-            self.utc_millisecond_data = uc.generate_ms(self.data_start, len(data[0]), 
-                                                    self.frequency)
-            self.pressure_data = (data[2].values + self.offset ) * uc.PSI_TO_DBAR
-            self.pressure_data += self.offset
+        # the dates are in minutes, the seconds column is the real time axis
+        if self.set_time_axis(ms, self.data_start):
+            self.pressure_data = self.grid(pressure)
             
             if self.included_baro == True:
-                self.air_pressure_data = data[2].values * uc.PSI_TO_DBAR
-        
+                self.air_pressure_data = self.grid(data[2].values * uc.PSI_TO_DBAR)
+
+    def read_blocks(self, block_size):
+        """(time in ms, pressure) of block_size rows of the file at a time, the
+        air pressure of included_baro is only read by read"""
+
+        header = self.header_sniffer.sniff(self.in_filename)
+        self.instrument_serial = header.serial
+
+        for i, data in enumerate(header.read_csv_blocks(block_size, 1, engine='c', sep=',',
+                                                        usecols=(0,1,2))):
+            yield self.parse(data, start=i == 0)
+
+    def parse(self, data, start=True):
+        """(time in ms, pressure) of the rows data, the data start is the date
+        of the second of them when start is True"""
+
+        if start:
+            self.data_start = uc.datestring_to_ms(data[0].values[1], self.date_format_string,
+                                                  self.tz_info, self.daylight_savings)
+        return data[1].values * 1000.0, (data[2].values + self.offset ) * uc.PSI_TO_DBAR \
+            + self.offset
+
 
     def get_serial(self):
-        self.instrument_serial = "not found"
-        with open(self.in_filename, 'r') as text:
-            for i, line in enumerate(text):
-                if re.search('Serial Number', line):
-                    match = re.search('[0-9]{6}', line)
-                    self.instrument_serial = match.group(0)
-                    break
+        self.instrument_serial = self.header_sniffer.sniff(self.in_filename).serial
 
 
 class MeasureSysLogger(edit_netcdf.NetCDFWriter):
     """derived class for Measurement Systems cvs files"""
 
+    header_sniffer = HeaderSniffer('^ID', serial='[0-9]{7}', serial_line='Transducer Serial')
+
     def __init__(self):
         self.timezone_marker = "time zone"
         super(MeasureSysLogger, self).__init__()
@@ -241,65 +443,59 @@ class MeasureSysLogger(edit_netcdf.NetCDFWriter):
         self.date_format_string2 = '%m/%d/%Y %H:%M:%S.%f'
 
     def read(self):
-        """load the data from in_filename
-        only parse the initial datetime = much faster"""
+        """load the data from in_filename"""
 
-        self.get_serial()
-        skip_index = find_first(self.in_filename, '^ID') - 1
+        header = self.header_sniffer.sniff(self.in_filename)
+        self.instrument_serial = header.serial
         # for skipping lines in case there is calibration header data
-        df = pd.read_table(self.in_filename, skiprows=skip_index + 1, header=None,
-                           engine='c', sep=',', usecols=[3, 4, 5])
+        df = header.read_csv(1, engine='c', sep=',', usecols=[3, 4, 5])
         
-        try:
-            self.data_start = uc.datestring_to_ms(df[3][3][1:],
-                                                  self.date_format_string, self.tz_info, self.daylight_savings)
-            second_stamp = uc.datestring_to_ms(df[3][4][1:],
-                                               self.date_format_string, self.tz_info, self.daylight_savings)
-            
-            timestep = second_stamp - self.data_start
-            # check time step:
-            if timestep <= 0:
-                self.bad_data = True
-                self.error_message = 'Error! Time step is zero. Check the datetime column of the input data.'
-            
-            else:
-                self.frequency = 1000 / (second_stamp - self.data_start)
-                self.pressure_data = df[5].values * uc.PSI_TO_DBAR
-                start_ms = uc.datestring_to_ms('%s' % df[3][0][1:], self.date_format_string, self.tz_info, self.daylight_savings)
-        
-        except:
-            self.data_start = uc.datestring_to_ms(df[3][3][1:],
-                                                  self.date_format_string2, self.tz_info, self.daylight_savings)
-            second_stamp = uc.datestring_to_ms(df[3][4][1:],
-                                               self.date_format_string2, self.tz_info, self.daylight_savings)
-            
-            timestep = second_stamp - self.data_start
-            # check time step:
-            if timestep <= 0:
-                self.bad_data = True
-                self.error_message = 'Error! Time step is zero. Check the datetime column of the input data.'
-            
-            else:
-                self.frequency = 1000 / (second_stamp - self.data_start)
-                self.pressure_data = df[5].values * uc.PSI_TO_DBAR
-                start_ms = uc.datestring_to_ms('%s' % df[3][0][1:], self.date_format_string2, self.tz_info, self.daylight_savings)
-            
-        self.utc_millisecond_data = uc.generate_ms(start_ms, df.shape[0], self.frequency)
- 
-            
+        block = self.parse(df)
+        if block is not None and self.set_time_axis(block[0]):
+            self.pressure_data = self.grid(block[1])
+
+    def read_blocks(self, block_size):
+        """(time in ms, pressure) of block_size rows of the file at a time"""
+
+        header = self.header_sniffer.sniff(self.in_filename)
+        self.instrument_serial = header.serial
+
+        for i, df in enumerate(header.read_csv_blocks(block_size, 1, engine='c', sep=',',
+                                                      usecols=[3, 4, 5])):
+            block = self.parse(df, infer=i == 0)
+            if block is None:
+                return
+            yield block
+
+    def parse(self, df, infer=True):
+        """(time in ms, pressure) of the rows df, None if the date format of
+        the first rows is not recognized"""
+
+        dates = df[3].str[1:].values
+        if infer:
+            self.date_format_string = date_formats.infer(
+                dates, 'MeasureSysLogger', (self.date_format_string, self.date_format_string2))
+
+        if self.date_format_string == "None":
+            self.bad_data = True
+            self.error_message = 'Error! Date time format was not recognized. Try changing it to this format: mm/dd/YYYY HH:MM:SS.MS'
+            return None
+
+        ms = uc.datestrings_to_ms(dates, self.date_format_string,
+                                  self.tz_info, self.daylight_savings)
+        if infer:
+            self.data_start = ms[0]
+        return ms, df[5].values * uc.PSI_TO_DBAR
+
     def get_serial(self):
-        self.instrument_serial = "not found"
-        with open(self.in_filename, 'r') as text:
-            for i, line in enumerate(text):
-                if line.find('Transducer Serial') > -1:
-                    match = re.search("[0-9]{7}", line)
-                    self.instrument_serial = match.group(0)
-                    break
+        self.instrument_serial = self.header_sniffer.sniff(self.in_filename).serial
 
 
 class RBRSolo(edit_netcdf.NetCDFWriter):
     """derived class for RBR solo engineer text files, (exported via ruskin software)"""
 
+    header_sniffer = HeaderSniffer('^[0-9]{4}-[0-9]{2}-[0-9]{2}')
+
     def __init__(self):
         self.timezone_marker = "time zone"
         super().__init__()
@@ -308,31 +504,62 @@ class RBRSolo(edit_netcdf.NetCDFWriter):
         self.date_format_string = '%Y-%m-%d %H:%M:%S.%f'
 
     def read(self):
-        """load the data from in_filename
-        only parse the initial datetime = much faster
-        """
+        """load the data from in_filename"""
 #         skip_index = find_first(self.in_filename, '^[0-9]{2}-[A-Z]{1}[a-z]{2,8}-[0-9]{4}')
-        skip_index = find_first(self.in_filename, '^[0-9]{4}-[0-9]{2}-[0-9]{2}')
-        df = pd.read_csv(self.in_filename, skiprows=skip_index,
-                         header=None, engine='c', usecols=[0, 1, 2], sep=',')
+        header = self.header_sniffer.sniff(self.in_filename)
+        df = header.read_csv(1, engine='c', usecols=[0, 1, 2], sep=',')
         
 #         self.datestart = uc.datestring_to_ms('%s %s' % (df[0][0], df[1][0]), self.date_format_string)
-        self.datestart = uc.datestring_to_ms('%s' % (df[0][0]),
-                                             self.date_format_string,
-                                             self.tz_info,
-                                             self.daylight_savings)
-        self.utc_millisecond_data = uc.generate_ms(self.datestart, df.shape[0] - 1,
-                                                    self.frequency)
-        self.pressure_data = np.array([x for x in df[1][:-1]])
+        # the last row is left out
+        ms, pressure = self.parse(df.iloc[:-1])
+        if self.set_time_axis(ms):
+            self.pressure_data = self.grid(pressure)
+
+    def read_blocks(self, block_size):
+        """(time in ms, pressure) of block_size rows of the file at a time"""
+
+        header = self.header_sniffer.sniff(self.in_filename)
+
+        # the last row of the file is left out, the last row of every block
+        # waits for the next block
+        last, infer = None, True
+        for df in header.read_csv_blocks(block_size, 1, engine='c', usecols=[0, 1, 2], sep=','):
+            if last is not None:
+                df = pd.concat([last, df])
+            last = df.iloc[-1:]
+            if len(df) > 1:
+                yield self.parse(df.iloc[:-1], infer)
+                infer = False
+
+    def parse(self, df, infer=True):
+        """(time in ms, pressure) of the rows df"""
+
+        dates = df[0].values
+        if infer:
+            self.date_format_string = date_formats.infer(dates, 'RBRSolo', (self.date_format_string,))
+        ms = uc.datestrings_to_ms(dates, self.date_format_string,
+                                  self.tz_info, self.daylight_savings)
+        if infer:
+            self.datestart = ms[0]
+        return ms, df[1].values
+
+
+# the bytes the Waveguage tokens are stripped of
+WHITESPACE = np.array([ord(x) for x in ' \t\r\n'], dtype=np.uint8)
 
 
 class Waveguage(edit_netcdf.NetCDFWriter):
     """Reads in an ASCII file output by a Waveguage pressure sensor
     from Ocean Sensor Systems Inc.
 
-    This class reads in data from a plaintext output file into a
-    pandas Dataframe. This is then translated into numpy ndarrays
-    and written to a netCDF binary file."""
+    The file is a comma separated stream of tokens, 14 header tokens, then a
+    six token timestamp (Y20,M08,D01,H00,M00,S00) before every burst of
+    signed pressure readings in atmospheres and one end token. It is
+    tokenized as a byte array with NumPy and the bursts are written
+    on a regular time axis."""
+
+    header_tokens = 14
+    reading_length = 7
 
     def __init__(self):
         super(Waveguage, self).__init__()
@@ -342,123 +569,113 @@ class Waveguage(edit_netcdf.NetCDFWriter):
         to a numpy array of dtype=int64 and pressure_data to a numpy
         array of dtype float64."""
 
-        data = self.get_data()
-        chunks = self.get_pressure_chunks(data)
-        timestamps = self.get_times(data)
-        self.data_start_date = datetime.strftime(timestamps[0], "%Y-%m-%dT%H:%M:%SZ")
-        self.data_duration_time = timestamps[-1] - timestamps[0]
+        buf, starts, stops = self.get_data()
+        pressure, lengths = self.get_pressure_chunks(buf, starts, stops)
+        stamps = self.get_times(buf, starts, stops)
+        self.data_start_date = uc.convert_ms_to_datestring(stamps[0], pytz.utc)
+        self.data_duration_time = timedelta(milliseconds=stamps[-1] - stamps[0])
 
         # check time step:
-        if self.data_duration_time <= 0:
+        if self.data_duration_time.total_seconds() <= 0:
             self.bad_data = True
             self.error_message = 'Error! Time step is zero. Check the datetime column of the input data.'
         
         else:
-            with open(self.in_filename) as f:
-                self.frequency = f.readline()[25:27]
-            self.utc_millisecond_data = self.get_ms_data(timestamps, chunks)
-            raw_pressure = self.make_pressure_array(timestamps, chunks)
-            self.pressure_data = raw_pressure * 10.0 + uc.ATM_TO_DBAR
-            return self.pressure_data, self.utc_millisecond_data
-
-    def make_pressure_array(self, t, chunks):
-        def press_entries(t2, t1):
-            seconds = (t2 - t1).total_seconds()
-            return seconds * self.frequency
-        final = np.zeros(0, dtype=np.float64)
-        prev_stamp = None
-        prev_press = None
-        for stamp, press in zip(t, chunks):
-            if prev_stamp:
-                n = press_entries(stamp, prev_stamp) - len(prev_press)
-                narr = np.zeros(n, dtype=np.float64) + self.fill_value
-                final = np.hstack((final, prev_press, narr))
-            prev_stamp = stamp
-            prev_press = press
-        final = np.hstack((final, chunks[-1]))
-        return final
-
-    def get_pressure_chunks(self, data):
-        master = [[]]
-        i = 0
-        for e in data:
-            if e.startswith('+') or e.startswith('-'):
-                if len(e) == 7:
-                    master[i].append(np.float64(e))
-            else:
-                if master[i] != []:
-                    master.append([])
-                    i += 1
-        master.pop()
-        return master
-
-    def get_ms_data(self, timestamps, chunks):
-        """Generates the time data using the initial timestamp in the
-        file and the length of the pressure data array."""
-
-        first_stamp = timestamps[0]
-        last_stamp = timestamps[-1]
-        def del_t_ms(t2, t1):
-            return (t2 - t1).total_seconds() * 1000
-        total_stamp_ms = del_t_ms(last_stamp, first_stamp)
-        last_chunk = chunks[-1]
-        last_chunk_ms = 1000 * len(last_chunk) / self.frequency
-        total_ms = total_stamp_ms + last_chunk_ms
-        first_date = timestamps[0]
-        epoch_start = datetime(year=1970, month=1, day=1, tzinfo=pytz.utc)
-        offset = (first_date - epoch_start).total_seconds() * 1e3
-        utc_ms_data = np.arange(total_ms, step=(1000 / self.frequency),
-                                dtype='int64')
-        utc_ms_data += offset
-        return utc_ms_data
-
-    def _get_frequency(self):
-        with open(self.in_filename) as f:
-            line = f.readline()
-        freq = int(line[25:27])
-        return freq
-
-    def get_times(self, p):
-        """Returns the time that the device started reading as a
-        datetime object."""
-
-        def make_stamps(p):
-            added = ''
-            result = []
-            for i, s in enumerate(p):
-                added += s
-                if i % 6 == 5:
-                    result.append(added)
-                    added = ''
-            return result
-
-        def test2(x):
-            return not (x.startswith('+') or x.startswith('-'))
-
-        c = p.map(test2)
-        p = p[c]
-        p = p[14:-1]
-        stamps = make_stamps(p)
-        date_format = 'Y%yM%mD%dH%HM%MS%S'
-        stamps = [datetime.strptime(stamp, date_format).replace(tzinfo=self.tzinfo)
-                  for stamp in stamps]
-        return stamps
+            self.frequency = self._get_frequency(buf)
+            # the bursts are laid on the time axis with the time between them filled
+            ms = self.get_ms_data(stamps, lengths)
+            if self.set_time_axis(ms, step=1000 / self.frequency):
+                self.pressure_data = self.grid(pressure * 10.0 + uc.ATM_TO_DBAR)
+                return self.pressure_data, self.utc_millisecond_data
 
     def get_data(self):
-        """Reads the pressure data from the current file and returns
-        it in a numpy array of dtype float64."""
+        """The bytes of the current file and the [start, stop) byte range of
+        every token stripped of whitespace, empty tokens are left out"""
+
+        with open(self.in_filename, 'rb') as f:
+            buf = np.frombuffer(f.read(), dtype=np.uint8)
+
+        separators = np.flatnonzero(buf == ord(','))
+        starts = np.concatenate(([0], separators + 1))
+        stops = np.concatenate((separators, [len(buf)]))
+
+        # strip a byte of whitespace from either end of every token a pass,
+        # as many passes as the longest run of whitespace
+        whitespace = np.zeros(256, dtype=bool)
+        whitespace[WHITESPACE] = True
+        for end, step in [(starts, 1), (stops, -1)]:
+            while True:
+                strip = stops > starts
+                strip[strip] = whitespace[buf[end[strip] - (step < 0)]]
+                if not strip.any():
+                    break
+                end[strip] += step
+
+        keep = stops > starts
+        return buf, starts[keep], stops[keep]
+
+    def token_kinds(self, buf, starts, stops):
+        """Whether every token is a pressure reading (starts with a sign) and
+        whether it is one that is read (reading_length long)"""
+        sign = buf[np.minimum(starts, len(buf) - 1)]
+        readings = (sign == ord('+')) | (sign == ord('-'))
+        return readings, readings & (stops - starts == self.reading_length)
+
+    def get_pressure_chunks(self, buf, starts, stops):
+        """The readings of every burst one after the other and the number of
+        readings in each burst. A burst ends at the next token that is not a
+        reading, a burst at the end of the file is left out."""
+
+        readings, valid = self.token_kinds(buf, starts, stops)
+        burst = np.cumsum(~readings)
+        if len(readings) and readings[-1]:
+            valid &= burst != burst[-1]
+
+        columns = starts[valid, np.newaxis] + np.arange(self.reading_length)
+        pressure = buf[columns].copy().view('S%d' % self.reading_length).ravel().astype(np.float64)
+        lengths = np.unique(burst[valid], return_counts=True)[1]
+        return pressure, lengths
+
+    def get_ms_data(self, stamps, lengths):
+        """The time in ms of every pressure reading, the readings of a burst
+        follow its timestamp at the sampling frequency."""
+
+        lengths = np.asarray(lengths, dtype=np.int64)
+        stamps = np.asarray(stamps)[:len(lengths)]
+        first = np.repeat(np.cumsum(lengths) - lengths, lengths)
+        return np.repeat(stamps, lengths) + (np.arange(lengths.sum()) - first) * (1000 / self.frequency)
+
+    def _get_frequency(self, buf=None):
+        """The sampling frequency in hz, characters 25 and 26 of the first line"""
+        if buf is None:
+            with open(self.in_filename, 'rb') as f:
+                line = f.readline()
+        else:
+            line = buf[:256].tobytes().split(b'\n')[0]
+        return int(line[25:27])
+
+    def get_times(self, buf, starts, stops):
+        """Returns the time in UTC ms that the device started every burst."""
 
-        data = pd.read_csv(self.in_filename, skiprows=0, header=None,
-                           lineterminator=',', sep=',', engine='c',
-                           names='p')
-        data.p = data.p.apply(lambda x: x.strip())
-        return data.p
+        readings = self.token_kinds(buf, starts, stops)[0]
+        starts = starts[~readings][self.header_tokens:-1]
+        stops = stops[~readings][self.header_tokens:-1]
+        n_stamps = len(starts) // 6
+
+        raw = buf.tobytes()
+        tokens = [raw[x:y].decode('ascii', 'replace') for x, y in
+                  zip(starts[:n_stamps * 6], stops[:n_stamps * 6])]
+        stamps = [''.join(tokens[x:x + 6]) for x in range(0, len(tokens), 6)]
+        return uc.datestrings_to_ms(stamps, 'Y%yM%mD%dH%HM%MS%S',
+                                    self.tz_info, self.daylight_savings)
 
 
 class NOAA_Station(edit_netcdf.NetCDFWriter):
     """As of now for barometric pressure only
     """
 
+    header_sniffer = HeaderSniffer('Date')
+
     def __init__(self):
         self.timezone_marker = "time zone"
         super().__init__()
@@ -466,30 +683,31 @@ class NOAA_Station(edit_netcdf.NetCDFWriter):
         self.date_format_string = '%Y/%m/%d %H:%M'
 
     def read(self):
-        """load the data from in_filename
-        only parse the initial datetime = much faster
-        """
+        """load the data from in_filename"""
 
-        skip_index = find_first(self.in_filename, 'Date')
-        df = pd.read_csv(self.in_filename, skiprows=skip_index,
-                         header=None, engine='c', sep=',')
+        header = self.header_sniffer.sniff(self.in_filename)
+        df = header.read_csv(1, engine='c', sep=',')
 
-        self.datestart = uc.datestring_to_ms(df[0][0] + ' ' + df[1][0],
-                                             self.date_format_string,
-                                             self.tz_info,
-                                             self.daylight_savings)
-        self.utc_millisecond_data = uc.generate_ms(self.datestart, df.shape[0],
-                                                   self.frequency)
+        dates = (df[0] + ' ' + df[1]).values
+        self.date_format_string = date_formats.infer(dates, 'NOAA_Station', (self.date_format_string,))
+        ms = uc.datestrings_to_ms(dates, self.date_format_string,
+                                  self.tz_info, self.daylight_savings)
+        self.datestart = ms[0]
+        if not self.set_time_axis(ms):
+            return
 
         df[6][:].values[df[6][:].values == '-'] = '0'
         vals = np.array(df[6][:].values).astype(np.float64) / 100
-        self.pressure_data = np.interp(np.arange(len(vals)), np.arange(len(vals))[vals != 0], vals[vals != 0])
+        self.pressure_data = self.grid(np.interp(np.arange(len(vals)), np.arange(len(vals))[vals != 0],
+                                                 vals[vals != 0]))
 
 
 class West_Coast_Station(edit_netcdf.NetCDFWriter):
     """As of now for barometric pressure only
     """
 
+    header_sniffer = HeaderSniffer('.*[0-9]{2}/[0-9]{2}/[0-9]{4}.*')
+
     def __init__(self):
         self.timezone_marker = "time zone"
         super().__init__()
@@ -497,69 +715,80 @@ class West_Coast_Station(edit_netcdf.NetCDFWriter):
         self.date_format_string = '%m/%d/%Y %H:%M UTC'
 
     def read(self):
-        """load the data from in_filename
-        only parse the initial datetime = much faster
-        """
+        """load the data from in_filename"""
 
-        skip_index = find_first(self.in_filename, '.*[0-9]{2}/[0-9]{2}/[0-9]{4}.*') - 1
-        df = pd.read_csv(self.in_filename, skiprows=skip_index,
-                         header=None, engine='c', sep=',')
+        header = self.header_sniffer.sniff(self.in_filename)
+        df = header.read_csv(0, engine='c', sep=',')
 
-        self.datestart = uc.datestring_to_ms('%s' % (df[1][0]),
-                                             self.date_format_string,
-                                             self.tz_info,
-                                             self.daylight_savings)
-        self.utc_millisecond_data = uc.generate_ms(self.datestart, df.shape[0],
-                                                   self.frequency)
-        self.pressure_data = np.array([x for x in df[2][:]]) / uc.DBAR_TO_INCHES_OF_MERCURY
+        ms, pressure = self.parse(df)
+        if self.set_time_axis(ms):
+            self.pressure_data = self.grid(pressure)
+
+    def read_blocks(self, block_size):
+        """(time in ms, pressure) of block_size rows of the file at a time"""
+
+        header = self.header_sniffer.sniff(self.in_filename)
+        for i, df in enumerate(header.read_csv_blocks(block_size, 0, engine='c', sep=',')):
+            yield self.parse(df, infer=i == 0)
+
+    def parse(self, df, infer=True):
+        """(time in ms, pressure) of the rows df"""
+
+        dates = df[1].values
+        if infer:
+            self.date_format_string = date_formats.infer(dates, 'West_Coast_Station',
+                                                         (self.date_format_string,))
+        ms = uc.datestrings_to_ms(dates, self.date_format_string,
+                                  self.tz_info, self.daylight_savings)
+        if infer:
+            self.datestart = ms[0]
+        return ms, df[2].values / uc.DBAR_TO_INCHES_OF_MERCURY
 
 
 class VanEssen(edit_netcdf.NetCDFWriter):
     """derived class for VanEssen csv files """
 
+    header_sniffer = HeaderSniffer('Date/time', serial='Serial number: ([^ \r\n]*)')
+
     def __init__(self):
         self.timezone_marker = "time zone"
         super().__init__()
         self.date_format_string = '%Y/%m/%d %H:%M:%S'
 
     def read(self):
-        """load the data from in_filename
-        only parse the initial datetime = much faster"""
+        """load the data from in_filename"""
 
-        self.get_serial()
+        header = self.header_sniffer.sniff(self.in_filename)
+        self.instrument_serial = header.serial
 
-        skip_index = find_first(self.in_filename, 'Date/time')
+        df = header.read_csv(1, engine='c', sep=',', usecols=(0, 1))
+        ms, pressure = self.parse(df.dropna())
+        if self.set_time_axis(ms):
+            self.pressure_data = self.grid(pressure)
 
-        df = pd.read_table(self.in_filename, skiprows=skip_index, header=None,
-                           engine='c', sep=',', usecols=(0, 1))
-        df = df.dropna()
+    def read_blocks(self, block_size):
+        """(time in ms, pressure) of block_size rows of the file at a time"""
 
-        vals = df[1].values
-        date1, date2 = df[0][0],  df[0][1]
+        header = self.header_sniffer.sniff(self.in_filename)
+        self.instrument_serial = header.serial
 
-        first_stamp = uc.datestring_to_ms(date1, self.date_format_string,
-                                          self.tz_info, self.daylight_savings)
-        second_stamp = uc.datestring_to_ms(date2, self.date_format_string,
-                                           self.tz_info, self.daylight_savings)
-        
-        timestep = second_stamp - first_stamp
-        # check time step:
-        if timestep <= 0:
-            self.bad_data = True
-            self.error_message = 'Error! Time step is zero. Check the datetime column of the input data.'
+        infer = True
+        for df in header.read_csv_blocks(block_size, 1, engine='c', sep=',', usecols=(0, 1)):
+            df = df.dropna()
+            if len(df) > 0:
+                yield self.parse(df, infer)
+                infer = False
 
-        else:
-            self.frequency = 1000 / (second_stamp - first_stamp)
-
-            self.utc_millisecond_data = uc.generate_ms(first_stamp, df.shape[0], self.frequency)
+    def parse(self, df, infer=True):
+        """(time in ms, pressure) of the rows df"""
 
-            self.pressure_data = vals / uc.METER_TO_FEET
+        vals = df[1].values
+        dates = df[0].values
+        if infer:
+            self.date_format_string = date_formats.infer(dates, 'VanEssen', (self.date_format_string,))
+        ms = uc.datestrings_to_ms(dates, self.date_format_string,
+                                  self.tz_info, self.daylight_savings)
+        return ms, vals / uc.METER_TO_FEET
 
     def get_serial(self):
-        self.instrument_serial = "not found"
-        with open(self.in_filename, 'r') as text:
-            for i, line in enumerate(text):
-                if line.find("Serial number: ") != -1:
-                    match = line.split('Serial number: ')[1]
-                    self.instrument_serial = match.split(' ')[0]
-                    break
\ No newline at end of file
+        self.instrument_serial = self.header_sniffer.sniff(self.in_filename).serial
\ No newline at end of file
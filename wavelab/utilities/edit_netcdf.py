@@ -1,18 +1,13 @@
 """
 Writes processed sea and air pressure files in to metadata rich netCDF pressure files
 """
+import itertools
 from netCDF4 import Dataset
 import numpy as np
 import pytz
 from datetime import datetime
 from wavelab.utilities.var_datastore import DataStore
-from wavelab.utilities import unit_conversion as uc
-
-try:
-    import wavelab.addons.DataTests as DataTests
-    data_test_import = True
-except ImportError:
-    data_test_import = False
+from wavelab.utilities import unit_conversion as uc, nc, qc, time_axis
 
 
 class NetCDFWriter(object):
@@ -38,6 +33,10 @@ class NetCDFWriter(object):
         self.timezone_string = None
         self.date_format_string = None
         self.frequency = None
+        # the time steps of the file that are off its regular time axis and
+        # where its readings fall on that axis (time_axis.TimeGrid)
+        self.irregular_time_steps = 0
+        self.time_grid = None
         self.valid_pressure_units = ["psi","pascals","atm"]
         self.valid_z_units = ["meters","feet"]
         self.valid_latitude = (np.float64(-90),np.float64(90))
@@ -60,6 +59,12 @@ class NetCDFWriter(object):
         self.deployment_time = None
         self.retrieval_time = None
         self.bad_data = False
+        self.error_message = None
+        # the optional qc.QCSuite tests, qc.TESTS names + '_test'
+        self.flat_line_test = False
+        self.spike_test = False
+        self.attenuated_signal_test = False
+        self.time_gap_test = False
         self.initial_land_surface_elevation = np.float64(0)
         self.final_land_surface_elevation = np.float64(0)
         self.initial_sensor_orifice_elevation = None
@@ -73,10 +78,74 @@ class NetCDFWriter(object):
         self.instrument_serial = None
         self.offset = 0
         self.included_baro = False
+        self.output_profile = None
+        # the rows stream reads a block at a time, readers that can stream the
+        # file have read_blocks
+        self.block_size = None
+
+    def set_time_axis(self, ms, start_ms=None, step=None):
+        """Set the frequency, time_grid and utc_millisecond_data from the time in
+        ms of every reading. The regular time axis has step ms (time_axis.time_step
+        of ms by default) and its utc time starts at start_ms (the first time by
+        default), grid lays the readings of a series on it. Returns False and
+        flags bad data if time does not increase."""
+
+        if step is None:
+            step = time_axis.time_step(ms)[0]
+        if not self.check_time_step(step):
+            return False
+
+        self.frequency = 1000 / step
+        self.time_grid = time_axis.TimeGrid(ms, step)
+        self.irregular_time_steps = self.time_grid.irregular_steps
+        if start_ms is None:
+            start_ms = ms[0]
+        self.utc_millisecond_data = uc.generate_ms(start_ms, len(self.time_grid), self.frequency)
+        return True
+
+    def check_time_step(self, step):
+        """Flag bad data and return False if the time step is not positive"""
+
+        if not step > 0:
+            self.bad_data = True
+            self.error_message = 'Error! Time step is zero. Check the datetime column of the input data.'
+            return False
+        return True
+
+    def grid(self, values):
+        """The readings values on the regular time axis with the fill value in
+        its gaps, see set_time_axis"""
+
+        if self.time_grid is None:
+            return values
+        return self.time_grid.scatter(values, self.fill_value)
 
     def write(self, pressure_type="Sea Pressure"):
         """Writing a netCDF from the fields entered in either sea or air gui"""
         
+        self.prepare(pressure_type)
+        self.vstore.pressure_data = self.pressure_data
+        self.vstore.utc_millisecond_data = self.utc_millisecond_data
+        
+        # perform data test and assign qc data flags, the gaps of the time axis
+        # are not tested and fail the time gap test
+        suite = self.qc_suite()
+        gaps = self.time_grid.report() if self.time_grid is not None else None
+        data = self.pressure_data
+        if gaps is not None:
+            data = np.where(self.time_grid.filled, np.nan, data)
+        self.vstore.pressure_qc_data, bad_data = suite.run(data, self.utc_millisecond_data)
+        if gaps is not None:
+            qc.clear(self.vstore.pressure_qc_data, self.time_grid.filled, qc.TIME_GAP)
+        self.data_issues(bad_data, gaps)
+        
+        # write the netCDF file using the vstore dictionary
+        self.write_netCDF(self.vstore, len(self.pressure_data))
+
+    def prepare(self, pressure_type):
+        """Set the pressure variable, summary and instrument of the vstore for
+        either sea or air pressure"""
+
         self.pressure_type = pressure_type
         # Assign variables according to the GUI used (air or sea)
         if pressure_type == "Air Pressure":
@@ -96,26 +165,86 @@ class NetCDFWriter(object):
         # Get Instrument Data
         self.instrument_info(self.instrument_name,self.vstore.pressure_var) 
         
-        # Assign pressure, time, lat. lon, and time resolution
-        self.vstore.pressure_data = self.pressure_data
-        self.vstore.utc_millisecond_data = self.utc_millisecond_data
+        # Assign lat. lon, and time resolution
         self.vstore.latitude = self.latitude
         self.vstore.longitude = self.longitude
         self.vstore.time_coverage_resolution = ''.join(["P", str(1 / self.frequency), "S"])
-        
-        # perform data test and assign qc data flags
-        
-        pressure_test = 0
-        if pressure_type == 'Air Pressure':
-            pressure_test = 1
-
-        if data_test_import is True:
-            self.vstore.pressure_qc_data, self.bad_data, self.error_message = DataTests.run_tests(self.pressure_data.astype(np.double),
-                                                                              0,
-                                                                              pressure_test)
-        
-        # write the netCDF file using the vstore dictionary
-        self.write_netCDF(self.vstore, len(self.pressure_data))
+        self.vstore.output_profile = self.output_profile
+
+    def qc_suite(self):
+        """The qc.QCSuite of the selected tests"""
+        return qc.QCSuite([x for x in qc.TESTS if getattr(self, x + '_test') is True],
+                          air=self.pressure_type == 'Air Pressure', frequency=self.frequency)
+
+    def data_issues(self, bad_data, gaps):
+        """Flag bad data with the qc message and the gap report of the time axis"""
+
+        if bad_data:
+            self.bad_data = True
+            self.error_message = qc.BAD_DATA_MESSAGE
+        if gaps is not None:
+            self.bad_data = True
+            self.error_message = gaps if not bad_data else '\n'.join([self.error_message, gaps])
+
+    def stream(self, pressure_type="Sea Pressure"):
+        """Write the netCDF file from the blocks of at most block_size readings
+        of read_blocks, in memory bounded by the block size whatever the size of
+        the file.
+
+        The time step is the one of the first block and the readings of every
+        block are laid on the regular time axis (time_axis.StreamingTimeGrid),
+        tested (qc.QCStream) and appended to an unlimited time dimension. The
+        variables and attributes are those write gives the file."""
+
+        blocks = self.read_blocks(self.block_size)
+        first = next(blocks, None)
+        if first is None:
+            if not self.bad_data:
+                self.bad_data = True
+                self.error_message = 'Error! No data found. Check the data columns of the input data.'
+            return
+
+        ms, pressure = first
+        step = time_axis.time_step(ms)[0]
+        if not self.check_time_step(step):
+            return
+        self.frequency = 1000 / step
+        start_ms = ms[0] if self.data_start is None else self.data_start
+        time_grid = time_axis.StreamingTimeGrid(step)
+
+        self.prepare(pressure_type)
+        self.vstore.pressure_data = np.zeros(0)
+        self.vstore.utc_millisecond_data = np.zeros(0)
+        self.vstore.pressure_qc_data = np.zeros(0, dtype=np.uint8)
+        stream_qc = qc.QCStream(self.qc_suite())
+
+        nc.invalidate(self.out_filename)
+        with Dataset(self.out_filename, 'w', format="NETCDF4_CLASSIC") as ds:
+            ds.createDimension("time", None)
+            ds.createDimension("station_id", len(self.stn_station_number))
+            self.vstore.set_attributes(self.var_dict())
+            self.vstore.z_var['datum'] = self.datum
+            self.vstore.send_series(ds)
+
+            time_var = ds.variables['time']
+            pressure_var = ds.variables[self.vstore.pressure_name]
+            qc_var = ds.variables['pressure_qc']
+            for ms, pressure in itertools.chain([first], blocks):
+                begin = len(time_grid)
+                filled, values = time_grid.push(ms, pressure, self.fill_value)
+                time = uc.generate_ms_range(start_ms, begin, len(time_grid), self.frequency)
+                time_var[begin:len(time_grid)] = time
+                pressure_var[begin:len(time_grid)] = values
+
+                index, flags = stream_qc.push(values, time, filled)
+                qc_var[index:index + len(flags)] = flags
+            index, flags = stream_qc.flush()
+            qc_var[index:index + len(flags)] = flags
+
+            self.vstore.send_metadata(ds)
+
+        self.irregular_time_steps = time_grid.irregular_steps
+        self.data_issues(stream_qc.bad_data, time_grid.report())
         
     def instrument_info(self,inst, vstore):
         """Instrument info data based on selected instrument"""
@@ -152,6 +281,7 @@ class NetCDFWriter(object):
             vstore["instrument_level_accuracy_in_meters"] = 0.0106679996
 
     def write_netCDF(self,var_datastore,series_length):
+        nc.invalidate(self.out_filename)
         with Dataset(self.out_filename, 'w', format="NETCDF4_CLASSIC") as ds:
             ds.createDimension("time", series_length)
             ds.createDimension("station_id", len(self.stn_station_number))
@@ -3,41 +3,331 @@ A few convenience methods for quickly extracting/changing data in
 netCDFs
 """
 import os
+import threading
+from collections import OrderedDict
 from datetime import datetime
 import numpy as np
 from netCDF4 import Dataset
 from netCDF4 import num2date
 import uuid
 import pytz
-from wavelab.utilities import unit_conversion as uc
+from wavelab.utilities import unit_conversion as uc, qc
+from wavelab.utilities.time_axis import RegularTimeAxis
 
 FILL_VALUE = -1e10
 
+# number of read only datasets kept open by open_dataset
+DATASET_CACHE_SIZE = 8
+
+# number of time values read at once when checking that a time variable is regular
+TIME_AXIS_BLOCK = 2 ** 20
+
+_dataset_cache = OrderedDict()
+_dataset_cache_lock = threading.RLock()
+
+
+class CachedDataset(object):
+    """A read only netCDF handle with its global and variable attributes
+    read once when the file is opened"""
+
+    def __init__(self, fname, stamp):
+        self.fname = fname
+        self.stamp = stamp
+        self.dataset = Dataset(fname)
+        self.global_attributes = {x: self.dataset.getncattr(x) for x in self.dataset.ncattrs()}
+        self.variable_attributes = {name: {x: var.getncattr(x) for x in var.ncattrs()}
+                                    for name, var in self.dataset.variables.items()}
+        # RegularTimeAxis of the time variable, False when it is irregular
+        self.time_axis = None
+
+    def global_attribute(self, name):
+        try:
+            return self.global_attributes[name]
+        except KeyError:
+            raise AttributeError("NetCDF: Attribute not found: %s" % name)
+
+    def variable_attribute(self, variable_name, attr):
+        attributes = self.variable_attributes[variable_name]
+        try:
+            return attributes[attr]
+        except KeyError:
+            raise AttributeError("NetCDF: Attribute not found: %s" % attr)
+
+    def close(self):
+        if self.dataset.isopen():
+            self.dataset.close()
+
+
+def _file_stamp(fname):
+    stat = os.stat(fname)
+    return (stat.st_mtime_ns, stat.st_size)
+
+
+def open_dataset(fname):
+    """Return the cached read only dataset for fname, the file is reopened if it
+    changed on disk since it was cached and the least recently used dataset is
+    closed once more than DATASET_CACHE_SIZE are open"""
+
+    key = os.path.abspath(fname)
+    stamp = _file_stamp(key)
+    with _dataset_cache_lock:
+        cached = _dataset_cache.pop(key, None)
+        if cached is not None and cached.stamp != stamp:
+            cached.close()
+            cached = None
+        if cached is None:
+            cached = CachedDataset(key, stamp)
+        _dataset_cache[key] = cached
+        while len(_dataset_cache) > DATASET_CACHE_SIZE:
+            _dataset_cache.popitem(last=False)[1].close()
+        return cached
+
+
+def invalidate(fname):
+    """Close and forget the cached dataset for fname, called before the file
+    is written so that no read handle is left open on it"""
+
+    with _dataset_cache_lock:
+        cached = _dataset_cache.pop(os.path.abspath(fname), None)
+        if cached is not None:
+            cached.close()
+
+
+def clear_cache():
+    """Close every cached dataset"""
+
+    with _dataset_cache_lock:
+        while _dataset_cache:
+            _dataset_cache.popitem()[1].close()
+
+
+# variables that may be stored in single precision or quantized by an OutputProfile
+WATER_LEVEL_VARIABLES = ('water_surface_height_above_reference_datum',
+                         'unfiltered_water_surface_height_above_reference_datum',
+                         'wave_water_level')
+
+
+class OutputProfile(object):
+    """How the variables of output netCDF files are stored. The default
+    profile writes uncompressed, contiguous variables; with compress=True the
+    variables along time of at least one window are zlib compressed with the
+    shuffle filter and chunked in analysis windows (window samples, or
+    spectra_windows rows of the time x frequency spectra). Water levels can be stored as
+    water_level_dtype and quantized to water_level_digits decimal places."""
+
+    def __init__(self, compress=False, complevel=4, shuffle=True, window=4096,
+                 spectra_windows=64, water_level_dtype=None, water_level_digits=None):
+        self.compress = compress
+        self.complevel = complevel
+        self.shuffle = shuffle
+        self.window = window
+        self.spectra_windows = spectra_windows
+        self.water_level_dtype = water_level_dtype
+        self.water_level_digits = water_level_digits
+
+    def chunksizes(self, dimensions, lengths):
+        """Chunk shape of a variable along time, other dimensions are not split"""
+
+        time_chunk = self.window if len(dimensions) == 1 else self.spectra_windows
+        chunks = []
+        for dim, length in zip(dimensions, lengths):
+            if dim == 'time':
+                chunks.append(time_chunk if not length else min(time_chunk, length))
+            else:
+                chunks.append(max(length, 1))
+        return tuple(chunks)
+
+    def storage(self, name, datatype, dimensions, lengths):
+        """Return the datatype and the extra createVariable keywords of a variable"""
+
+        options = {}
+        if name in WATER_LEVEL_VARIABLES:
+            if self.water_level_dtype is not None:
+                datatype = self.water_level_dtype
+            if self.water_level_digits is not None:
+                options['least_significant_digit'] = self.water_level_digits
+
+        # variables smaller than one window gain nothing from chunking, variables
+        # along a dimension that is still empty (unlimited) can not be contiguous
+        # and are always chunked in windows
+        size = int(np.prod(lengths)) if len(lengths) > 0 else 1
+        if 'time' in dimensions and size == 0:
+            options['chunksizes'] = self.chunksizes(dimensions, lengths)
+        if self.compress and 'time' in dimensions and np.dtype(datatype).kind in 'fiu' and \
+                (size == 0 or size >= self.window):
+            options['zlib'] = True
+            options['complevel'] = self.complevel
+            options['shuffle'] = self.shuffle
+            options['chunksizes'] = self.chunksizes(dimensions, lengths)
+
+        return datatype, options
+
+
+OUTPUT_PROFILES = {
+    'default': OutputProfile(),
+    'compressed': OutputProfile(compress=True),
+    'compressed_f4': OutputProfile(compress=True, water_level_dtype='f4'),
+    'compressed_quantized': OutputProfile(compress=True, water_level_digits=4),
+}
+
+
+def get_output_profile(profile=None):
+    """Return the OutputProfile for a name of OUTPUT_PROFILES, an OutputProfile
+    or None for the default profile"""
+
+    if profile is None:
+        return OUTPUT_PROFILES['default']
+    if isinstance(profile, OutputProfile):
+        return profile
+    try:
+        return OUTPUT_PROFILES[profile]
+    except KeyError:
+        raise ValueError('Unknown output profile %s, expected one of %s'
+                         % (profile, ', '.join(sorted(OUTPUT_PROFILES))))
+
+
+def create_variable(ds, name, datatype, dimensions=(), profile=None, fill_value=None):
+    """Create a variable in the open dataset ds stored as the output profile
+    says"""
+
+    if isinstance(dimensions, str):
+        dimensions = (dimensions,)
+    lengths = [len(ds.dimensions[x]) for x in dimensions]
+    datatype, options = get_output_profile(profile).storage(name, datatype, dimensions, lengths)
+    if fill_value is not None:
+        options['fill_value'] = fill_value
+    return ds.createVariable(name, datatype, dimensions, **options)
+
+
+class BuilderVariable(object):
+    """A variable of a NetCDFBuilder"""
+
+    def __init__(self, name, datatype, dimensions, fill_value=None):
+        self.name = name
+        self.datatype = datatype
+        self.dimensions = dimensions
+        self.fill_value = fill_value
+        self.attributes = OrderedDict()
+        self.data = None
+
+
+class NetCDFBuilder(object):
+    """Collects the dimensions, variables, attributes and data of a netCDF file
+    in memory and writes them all with one open of the file"""
+
+    def __init__(self, fname, format='NETCDF4_CLASSIC', profile=None):
+        self.fname = fname
+        self.format = format
+        self.profile = get_output_profile(profile)
+        self.dimensions = OrderedDict()
+        self.global_attributes = OrderedDict()
+        self.variables = OrderedDict()
+
+    def create_dimension(self, dim_name, dim_length):
+        self.dimensions[dim_name] = dim_length
+
+    def create_variable(self, name, datatype, dimensions, fill_value=None):
+        self.variables[name] = BuilderVariable(name, datatype, dimensions, fill_value)
+        return self.variables[name]
+
+    def get_global_attribute(self, name):
+        try:
+            return self.global_attributes[name]
+        except KeyError:
+            raise AttributeError("NetCDF: Attribute not found: %s" % name)
+
+    def set_global_attribute(self, name, value):
+        self.global_attributes[name] = value
+
+    def get_variable_attr(self, variable_name, attr):
+        try:
+            return self.variables[variable_name].attributes[attr]
+        except KeyError:
+            if variable_name not in self.variables:
+                raise
+            raise AttributeError("NetCDF: Attribute not found: %s" % attr)
+
+    def set_var_attribute(self, var_name, name, value):
+        self.variables[var_name].attributes[name] = value
+
+    def get_variable_data(self, variable_name):
+        return self.variables[variable_name].data
+
+    def set_variable_data(self, variable_name, value):
+        self.variables[variable_name].data = value
+
+    def set_instrument_data(self, variable_name, instr_dict):
+        self.variables[variable_name].attributes.update(instr_dict)
+
+    def append_variable(self, standard_name, data, comment='', long_name='',
+                        flag_masks = None, flag_meanings = None, og_fname = None):
+        """Add a variable along time the way nc.append_variable does"""
+
+        var = self.create_variable(standard_name, 'f8', ('time',))
+        var.attributes.update(appended_variable_attributes(standard_name, comment, long_name,
+                                                           flag_masks, flag_meanings, og_fname))
+        var.data = data
+
+    def append_air_pressure(self, pressure, air_fname = None):
+        self.append_variable('air_pressure', pressure, comment='',
+                             long_name='air pressure', og_fname=air_fname)
+
+    def append_depth(self, depth, calc_type='storm_surge'):
+        """Add the water level variable the way nc.append_depth does"""
+
+        name = 'water_surface_height_above_reference_datum'
+        self.append_variable(name, depth, comment=depth_comment(calc_type), long_name=name)
+        self.set_var_attribute(name, 'sea_uuid', self.get_global_attribute('uuid'))
+        self.set_global_attribute('uuid', str(uuid.uuid4()))
+
+    def write(self):
+        """Write the file, replacing any file at fname, and return once it is
+        closed"""
+
+        invalidate(self.fname)
+        if os.path.exists(self.fname):
+            os.remove(self.fname)
+
+        with Dataset(self.fname, 'w', format=self.format) as output:
+            for name in self.dimensions:
+                output.createDimension(name, self.dimensions[name])
+            output.setncatts(self.global_attributes)
+
+            for var in self.variables.values():
+                out_var = create_variable(output, var.name, var.datatype, var.dimensions,
+                                          profile=self.profile, fill_value=var.fill_value)
+                out_var.setncatts(var.attributes)
+                if var.data is not None:
+                    out_var[:] = var.data
+
+        return self.fname
 
-def chop_netcdf(fname, out_fname, begin, end, air_pressure = False):
+
+def chop_netcdf(fname, out_fname, begin, end, air_pressure = False, profile=None):
     """Truncate the data in a netCDF file between two indices"""
 
+    invalidate(out_fname)
     if os.path.exists(out_fname):
         os.remove(out_fname)
     length = end - begin
     
     if air_pressure is False:
-        p = get_pressure(fname)[begin:end]
+        p = get_pressure(fname, begin, end)
     else:
-        p = get_air_pressure(fname)[begin:end]
+        p = get_air_pressure(fname, begin, end)
         
     # get station id for the station_id dimension
     stn_site_id = get_global_attribute(fname, 'stn_station_number')
     
-    t = get_time(fname)[begin:end]
+    t = get_time(fname, begin, end)
     try:
-        flags = get_flags(fname)[begin:end]
+        flags = get_flags(fname, begin, end)
     except:
         flags = None
     alt = get_variable_data(fname, 'altitude')
     lat = get_variable_data(fname, 'latitude')
     long = get_variable_data(fname, 'longitude')
-    d = Dataset(fname)
+    d = open_dataset(fname).dataset
     output = Dataset(out_fname, 'w', format='NETCDF4_CLASSIC')
     output.createDimension('time', length)
     
@@ -59,10 +349,11 @@ def chop_netcdf(fname, out_fname, begin, end, air_pressure = False):
         
         dim = d.variables[key].dimensions
         
-        if datatype == "int32":
-            var = output.createVariable(name, datatype, dim)
+        if np.issubdtype(datatype, np.integer):
+            var = create_variable(output, name, datatype, dim, profile=profile)
         else:
-            var = output.createVariable(name, datatype, dim, fill_value=FILL_VALUE)
+            var = create_variable(output, name, datatype, dim, profile=profile,
+                                  fill_value=FILL_VALUE)
         
         for att in d.variables[key].ncattrs():
             if att != '_FillValue':
@@ -97,42 +388,57 @@ def chop_netcdf(fname, out_fname, begin, end, air_pressure = False):
     setattr(output,"time_coverage_duration",
             uc.get_time_duration(t[-1] - t[0]))
     
-    d.close()
     output.close()
 
 
-def custom_copy(fname, out_fname, begin,end, mode="storm_surge", step = 1):
-    if os.path.exists(out_fname):
-        os.remove(out_fname)
+def custom_copy(fname, out_fname, begin,end, mode="storm_surge", step = 1, profile=None):
+    """Copy the netCDF at fname between two indices to out_fname"""
+
+    build_custom_copy(fname, out_fname, begin, end, mode=mode, step=step, profile=profile).write()
+
+
+def build_custom_copy(fname, out_fname, begin,end, mode="storm_surge", step = 1, profile=None,
+                      copy_data=True):
+    """Collect the custom_copy of fname in a NetCDFBuilder for out_fname so more
+    variables and attributes can be added before it is written. With copy_data
+    False the time, sea_pressure and pressure_qc values are not read and are
+    left to be written in blocks (see BlockWriter)."""
     
     # get station id for the station_id dimension
     stn_site_id = get_global_attribute(fname, 'stn_station_number')
     
-    t = get_time(fname)[begin:end:step]
+    flags = None
+    if copy_data is True:
+        t = get_time(fname, begin, end, step)
+        length, first, last = len(t), t[0], t[-1]
 
-    try:
-        flags = get_flags(fname)[begin:end:step]
-    except:
-        flags = None
-        print('no pressure qc')
+        if mode != 'storm_surge':
+            try:
+                flags = get_flags(fname, begin, end, step)
+            except:
+                print('no pressure qc')
+    else:
+        indexes = range(*slice(begin, end, step).indices(get_length(fname)))
+        length = len(indexes)
+        first, last = [get_time(fname, x, x + 1)[0] for x in (indexes[0], indexes[-1])]
 
     alt = get_variable_data(fname, 'altitude')
     lat = get_variable_data(fname, 'latitude')
     long = get_variable_data(fname, 'longitude')
-    d = Dataset(fname)
-    output = Dataset(out_fname, 'w', format='NETCDF4_CLASSIC')
-    output.createDimension('time', len(t))
-    output.createDimension("station_id", len(stn_site_id))
+    d = open_dataset(fname)
+    output = NetCDFBuilder(out_fname, profile=profile)
+    output.create_dimension('time', length)
+    output.create_dimension("station_id", len(stn_site_id))
     
     # copy globals
-    for att in d.ncattrs():
-        setattr(output, att, d.__dict__[att])
+    for att in d.global_attributes:
+        output.set_global_attribute(att, d.global_attributes[att])
     
-    setattr(output, 'uuid', str(uuid.uuid4()))   
+    output.set_global_attribute('uuid', str(uuid.uuid4()))
     
     has_station_id = False
     # copy variables
-    for key in d.variables:
+    for key in d.dataset.variables:
         
         # skip adding pressure qc if the mode is storm surge
         if mode == 'storm_surge' and (key == 'pressure_qc'):
@@ -142,88 +448,97 @@ def custom_copy(fname, out_fname, begin,end, mode="storm_surge", step = 1):
             has_station_id =True
             
         name = key
-        datatype = d.variables[key].datatype 
+        datatype = d.dataset.variables[key].datatype 
           
-        dim = d.variables[key].dimensions
+        dim = d.dataset.variables[key].dimensions
         
-        if datatype == "int32":
-            var = output.createVariable(name, datatype, dim)
+        if np.issubdtype(datatype, np.integer):
+            output.create_variable(name, datatype, dim)
         else:
-            var = output.createVariable(name, datatype, dim, fill_value=FILL_VALUE)
+            output.create_variable(name, datatype, dim, fill_value=FILL_VALUE)
         
-        for att in d.variables[key].ncattrs():
+        for att in d.variable_attributes[key]:
             if att != '_FillValue':
-                setattr(var, att, d.variables[key].__dict__[att])
+                output.set_var_attribute(name, att, d.variable_attributes[key][att])
             
-    output.variables['time'][:] = t
-    
-    if mode == 'storm_surge':
+    if copy_data is True:
+        output.set_variable_data('time', t)
+
         if flags is not None:
-            output.variables['pressure_qc'][:] = flags
-        p = get_pressure(fname)[begin:end]
-        output.variables['sea_pressure'][:] = p
+            output.set_variable_data('pressure_qc', flags)
+
+    if mode == 'storm_surge' and copy_data is True:
+        p = get_pressure(fname, begin, end)
+        output.set_variable_data('sea_pressure', p)
         
-    output.variables['altitude'][:] = alt
-    output.variables['longitude'][:] = long
-    output.variables['latitude'][:] = lat
+    output.set_variable_data('altitude', alt)
+    output.set_variable_data('longitude', long)
+    output.set_variable_data('latitude', lat)
 
     if has_station_id is False:
     # the following changes are essential in case the air and sea gui files are processed
     # with older versions of the script
-        st_id = output.createVariable('station_id','S1',('station_id'))
-        st_id.setncattr('cf_role', 'time_series_id')
-        st_id.setncattr('long_name', 'station identifier')
-        st_id[:] = list(stn_site_id)
+        output.create_variable('station_id', 'S1', ('station_id'))
+        output.set_var_attribute('station_id', 'cf_role', 'time_series_id')
+        output.set_var_attribute('station_id', 'long_name', 'station identifier')
+        output.set_variable_data('station_id', list(stn_site_id))
     
-    deployment_time = uc.convert_ms_to_datestring(t[0], pytz.utc)
-    retrieval_time = uc.convert_ms_to_datestring(t[-1], pytz.utc)
-    set_global_attribute(out_fname, 'deployment_time', deployment_time)
-    set_global_attribute(out_fname, 'retrieval_time', retrieval_time)
-    set_global_attribute(out_fname, 'salinity_ppm', 'unused')
-    set_global_attribute(out_fname, 'device_depth', 'unused')
-    set_global_attribute(out_fname, 'geospatial_lon_min', np.float64(-180))
-    set_global_attribute(out_fname, 'geospatial_lon_max', np.float64(180))
-    set_global_attribute(out_fname, 'geospatial_lat_min', np.float64(-90))
-    set_global_attribute(out_fname, 'geospatial_lat_max', np.float64(90))
-    set_global_attribute(out_fname, 'geospatial_vertical_min', np.float64(0))
-    set_global_attribute(out_fname, 'geospatial_vertical_max', np.float64(0))
+    deployment_time = uc.convert_ms_to_datestring(first, pytz.utc)
+    retrieval_time = uc.convert_ms_to_datestring(last, pytz.utc)
+    output.set_global_attribute('deployment_time', deployment_time)
+    output.set_global_attribute('retrieval_time', retrieval_time)
+    set_output_attributes(output)
+
+    return output
+
+
+def set_output_attributes(output):
+    """Set the location, elevation and time attributes shared by the storm
+    tide and wave statistics files on a NetCDFBuilder"""
+
+    output.set_global_attribute('salinity_ppm', 'unused')
+    output.set_global_attribute('device_depth', 'unused')
+    output.set_global_attribute('geospatial_lon_min', np.float64(-180))
+    output.set_global_attribute('geospatial_lon_max', np.float64(180))
+    output.set_global_attribute('geospatial_lat_min', np.float64(-90))
+    output.set_global_attribute('geospatial_lat_max', np.float64(90))
+    output.set_global_attribute('geospatial_vertical_min', np.float64(0))
+    output.set_global_attribute('geospatial_vertical_max', np.float64(0))
     
-    first, last = get_sensor_orifice_elevation(out_fname)
-    set_global_attribute(out_fname, 'sensor_orifice_elevation_at_deployment_time', \
-                         np.float64("{0:.4f}".format(first)))
-    set_global_attribute(out_fname, 'sensor_orifice_elevation_at_retrieval_time', \
-                         np.float64("{0:.4f}".format(last)))
-    set_global_attribute(out_fname, 'sensor_orifice_elevation_units', 'meters')
+    first = output.get_global_attribute('sensor_orifice_elevation_at_deployment_time')
+    last = output.get_global_attribute('sensor_orifice_elevation_at_retrieval_time')
+    output.set_global_attribute('sensor_orifice_elevation_at_deployment_time',
+                                np.float64("{0:.4f}".format(first)))
+    output.set_global_attribute('sensor_orifice_elevation_at_retrieval_time',
+                                np.float64("{0:.4f}".format(last)))
+    output.set_global_attribute('sensor_orifice_elevation_units', 'meters')
     
-    first_land, last_land = get_land_surface_elevation(out_fname)
-    set_global_attribute(out_fname, 'initial_land_surface_elevation', \
-                         np.float64("{0:.4f}".format(first_land)))
-    set_global_attribute(out_fname, 'final_land_surface_elevation', \
-                         np.float64("{0:.4f}".format(last_land)))
-    set_global_attribute(out_fname, 'land_surface_elevation_units', 'meters')
-
-    set_global_attribute(out_fname, 'featureType', 'timeSeries')
+    first_land = output.get_global_attribute('initial_land_surface_elevation')
+    last_land = output.get_global_attribute('final_land_surface_elevation')
+    output.set_global_attribute('initial_land_surface_elevation',
+                                np.float64("{0:.4f}".format(first_land)))
+    output.set_global_attribute('final_land_surface_elevation',
+                                np.float64("{0:.4f}".format(last_land)))
+    output.set_global_attribute('land_surface_elevation_units', 'meters')
+
+    output.set_global_attribute('featureType', 'timeSeries')
     
-    set_var_attribute(out_fname, 'latitude', 'valid_max', np.float64(90))
-    set_var_attribute(out_fname, 'latitude', 'valid_min', np.float64(-90))
-    set_var_attribute(out_fname, 'latitude', 'ioos_category', 'location')
-    set_var_attribute(out_fname, 'latitude', 'units', 'degrees_north')
-    set_var_attribute(out_fname, 'longitude', 'valid_max', np.float64(180))
-    set_var_attribute(out_fname, 'longitude', 'valid_min', np.float64(-180))
-    set_var_attribute(out_fname, 'longitude', 'ioos_category', 'location')
-    set_var_attribute(out_fname, 'longitude', 'units', 'degrees_east')
-    set_var_attribute(out_fname, 'altitude', 'valid_max', np.float64(1000))
-    set_var_attribute(out_fname, 'altitude', 'valid_min', np.float64(-1000))
-    set_var_attribute(out_fname, 'altitude', 'ioos_category', 'location')
-    set_var_attribute(out_fname, 'altitude', 'positive', 'up')
-    
-    set_var_attribute(out_fname, 'time', 'ioos_category', 'time')
-    set_var_attribute(out_fname, 'time', 'long_name', 'time')
-    set_var_attribute(out_fname, 'altitude', 'comment', 'unused')
-    # end attribute modifications
+    output.set_var_attribute('latitude', 'valid_max', np.float64(90))
+    output.set_var_attribute('latitude', 'valid_min', np.float64(-90))
+    output.set_var_attribute('latitude', 'ioos_category', 'location')
+    output.set_var_attribute('latitude', 'units', 'degrees_north')
+    output.set_var_attribute('longitude', 'valid_max', np.float64(180))
+    output.set_var_attribute('longitude', 'valid_min', np.float64(-180))
+    output.set_var_attribute('longitude', 'ioos_category', 'location')
+    output.set_var_attribute('longitude', 'units', 'degrees_east')
+    output.set_var_attribute('altitude', 'valid_max', np.float64(1000))
+    output.set_var_attribute('altitude', 'valid_min', np.float64(-1000))
+    output.set_var_attribute('altitude', 'ioos_category', 'location')
+    output.set_var_attribute('altitude', 'positive', 'up')
     
-    d.close()
-    output.close()
+    output.set_var_attribute('time', 'ioos_category', 'time')
+    output.set_var_attribute('time', 'long_name', 'time')
+    output.set_var_attribute('altitude', 'comment', 'unused')
 
 
 wave_dict = {
@@ -315,10 +630,55 @@ wave_dict = {
     }
 
 
-def wave_stats_copy(fname, out_fname, so):
+def wave_stats_copy(fname, out_fname, so, profile=None):
+    """Write the wave statistics of so with the metadata of fname to out_fname"""
 
-    if os.path.exists(out_fname):
-        os.remove(out_fname)
+    build_wave_stats_copy(fname, out_fname, so, profile=profile).write()
+
+
+def wave_stats_names(so):
+    """(variable name, statistic, bound) of every wave statistics variable of so,
+    bound is 'upper' or 'lower' for the confidence interval variables"""
+
+    names = []
+    for x in wave_dict:
+        # only the statistics that were computed for this run are written
+        if x not in so.stat_dictionary:
+            continue
+
+        names.append((wave_dict[x]['name'], x, None))
+        if 'upper_name' in wave_dict[x]:
+            names.append((wave_dict[x]['upper_name'], x, 'upper'))
+            names.append((wave_dict[x]['lower_name'], x, 'lower'))
+    return names
+
+
+def wave_stats_values(so, statistic, bound=None):
+    """The values of a statistic of so, or of its upper or lower bound (the
+    statistic itself when it has none)"""
+
+    bounds = {'upper': so.upper_stat_dictionary, 'lower': so.lower_stat_dictionary}
+    if bound is not None and statistic in bounds[bound]:
+        return bounds[bound][statistic]
+    if statistic == 'Frequency':
+        return so.stat_dictionary[statistic][0]
+    return so.stat_dictionary[statistic]
+
+
+def wave_stats_blocks(so):
+    """{variable name: values} of the wave statistics variables along time of
+    so, a block of windows for a BlockWriter"""
+
+    return OrderedDict((name, wave_stats_values(so, statistic, bound))
+                       for name, statistic, bound in wave_stats_names(so)
+                       if statistic != 'Frequency')
+
+
+def build_wave_stats_copy(fname, out_fname, so, profile=None, n_times=None, copy_data=True):
+    """Collect the wave_stats_copy of fname in a NetCDFBuilder for out_fname so
+    more attributes can be added before it is written. With copy_data False
+    the variables along time are left empty for a BlockWriter and the time
+    dimension is n_times long."""
     
     # get station id for the station_id dimension
     stn_site_id = get_global_attribute(fname, 'stn_station_number')
@@ -326,145 +686,79 @@ def wave_stats_copy(fname, out_fname, so):
     alt = get_variable_data(fname, 'altitude')
     lat = get_variable_data(fname, 'latitude')
     long = get_variable_data(fname, 'longitude')
-    d = Dataset(fname)
-    output = Dataset(out_fname, 'w', format='NETCDF4_CLASSIC')
-    # print('time len %d' % len(so.stat_dictionary['time']))
-    output.createDimension('time', len(so.stat_dictionary['time']))
-    # print('freq len %d' % len(so.stat_dictionary['Frequency'][0]))
-    output.createDimension('frequency', len(so.stat_dictionary['Frequency'][0]))
-    output.createDimension("station_id", len(stn_site_id))
+    d = open_dataset(fname)
+    output = NetCDFBuilder(out_fname, profile=profile)
+    output.create_dimension('time', len(so.stat_dictionary['time']) if n_times is None else n_times)
+    output.create_dimension('frequency', len(so.stat_dictionary['Frequency'][0]))
+    output.create_dimension("station_id", len(stn_site_id))
 
     # copy globals
-    for att in d.ncattrs():
-        setattr(output, att, d.__dict__[att])
+    for att in d.global_attributes:
+        output.set_global_attribute(att, d.global_attributes[att])
     
-    setattr(output, 'uuid', str(uuid.uuid4()))   
+    output.set_global_attribute('uuid', str(uuid.uuid4()))
 
     # copy variables
-    for key in d.variables:
+    for key in d.dataset.variables:
         
         if key not in ['altitude', 'latitude', 'longitude', 'station_id']:
             continue
         
         name = key
-        datatype = d.variables[key].datatype 
+        datatype = d.dataset.variables[key].datatype 
           
-        dim = d.variables[key].dimensions
+        dim = d.dataset.variables[key].dimensions
         
-        if datatype == "int32":
-            var = output.createVariable(name, datatype, dim)
+        if np.issubdtype(datatype, np.integer):
+            output.create_variable(name, datatype, dim)
         else:
-            var = output.createVariable(name, datatype, dim, fill_value=FILL_VALUE)
+            output.create_variable(name, datatype, dim, fill_value=FILL_VALUE)
         
-        for att in d.variables[key].ncattrs():
+        for att in d.variable_attributes[key]:
             if att != '_FillValue':
-                setattr(var, att, d.variables[key].__dict__[att])
+                output.set_var_attribute(name, att, d.variable_attributes[key][att])
 
-    d.close()
 
-    output.variables['altitude'][:] = alt
-    output.variables['longitude'][:] = long
-    output.variables['latitude'][:] = lat
+    output.set_variable_data('altitude', alt)
+    output.set_variable_data('longitude', long)
+    output.set_variable_data('latitude', lat)
 
-    def pop_vars(og_name, dict_entry, so, upper=False, lower=False):
+    for name, og_name, bound in wave_stats_names(so):
+        dict_entry = wave_dict[og_name]
         dim = dict_entry['dims'] if 'dims' in dict_entry else ('time')
-        name = dict_entry['name']
-
-        if upper is True: name = dict_entry['upper_name']
-        if lower is True: name = dict_entry['lower_name']
-        var = output.createVariable(name, 'f8', dim)
+        output.create_variable(name, 'f8', dim)
         if 'standard_name' in dict_entry:
-            var.standard_name = dict_entry['standard_name']
+            output.set_var_attribute(name, 'standard_name', dict_entry['standard_name'])
         if 'alias' in dict_entry:
-            var.alias = dict_entry['alias']
+            output.set_var_attribute(name, 'alias', dict_entry['alias'])
         if 'comment' in dict_entry:
-            var.comment = dict_entry['comment']
+            output.set_var_attribute(name, 'comment', dict_entry['comment'])
 
-        if upper is True:
-            try:
-                var[:] = so.upper_stat_dictionary[og_name]
-            except KeyError:
-                var[:] = so.stat_dictionary[og_name]
-        elif lower is True:
-            try:
-                var[:] = so.lower_stat_dictionary[og_name]
-            except KeyError:
-                var[:] = so.stat_dictionary[og_name]
-        else:
-            if og_name == 'Frequency':
-                var[:] = so.stat_dictionary[og_name][0]
-            else:
-                var[:] = so.stat_dictionary[og_name]
-
-    for x in wave_dict:
-        pop_vars(x, wave_dict[x], so)
-
-        if 'upper_name' in wave_dict[x]:
-            pop_vars(x, wave_dict[x], so, upper=True)
-            pop_vars(x, wave_dict[x], so, lower=True)
+        if copy_data is True or og_name == 'Frequency':
+            output.set_variable_data(name, wave_stats_values(so, og_name, bound))
 
 
-    if 'station_id' not in d.variables:
+    if 'station_id' not in d.dataset.variables:
     # the following changes are essential in case the air and sea gui files are processed
     # with older versions of the script
-        st_id = output.createVariable('station_id','S1', ('station_id'))
-        st_id.setncattr('cf_role', 'time_series_id')
-        st_id.setncattr('long_name', 'station identifier')
-        st_id[:] = list(stn_site_id)
+        output.create_variable('station_id', 'S1', ('station_id'))
+        output.set_var_attribute('station_id', 'cf_role', 'time_series_id')
+        output.set_var_attribute('station_id', 'long_name', 'station identifier')
+        output.set_variable_data('station_id', list(stn_site_id))
     
     # I have to keep this hunk of garbage until enought time has passed for all
     # data files to be properly formatted,
     deployment_time = get_global_attribute(fname, 'deployment_time')
     retrieval_time = get_global_attribute(fname, 'retrieval_time')
-    set_global_attribute(out_fname, 'deployment_time', deployment_time)
-    set_global_attribute(out_fname, 'retrieval_time', retrieval_time)
-    set_global_attribute(out_fname, 'salinity_ppm', 'unused')
-    set_global_attribute(out_fname, 'device_depth', 'unused')
-    set_global_attribute(out_fname, 'geospatial_lon_min', np.float64(-180))
-    set_global_attribute(out_fname, 'geospatial_lon_max', np.float64(180))
-    set_global_attribute(out_fname, 'geospatial_lat_min', np.float64(-90))
-    set_global_attribute(out_fname, 'geospatial_lat_max', np.float64(90))
-    set_global_attribute(out_fname, 'geospatial_vertical_min', np.float64(0))
-    set_global_attribute(out_fname, 'geospatial_vertical_max', np.float64(0))
-    
-    first, last = get_sensor_orifice_elevation(out_fname)
-    set_global_attribute(out_fname, 'sensor_orifice_elevation_at_deployment_time', \
-                         np.float64("{0:.4f}".format(first)))
-    set_global_attribute(out_fname, 'sensor_orifice_elevation_at_retrieval_time', \
-                         np.float64("{0:.4f}".format(last)))
-    set_global_attribute(out_fname, 'sensor_orifice_elevation_units', 'meters')
-    
-    first_land, last_land = get_land_surface_elevation(out_fname)
-    set_global_attribute(out_fname, 'initial_land_surface_elevation', \
-                         np.float64("{0:.4f}".format(first_land)))
-    set_global_attribute(out_fname, 'final_land_surface_elevation', \
-                         np.float64("{0:.4f}".format(last_land)))
-    set_global_attribute(out_fname, 'land_surface_elevation_units', 'meters')
-
-    set_global_attribute(out_fname, 'featureType', 'timeSeries')
-    
-    set_var_attribute(out_fname, 'latitude', 'valid_max', np.float64(90))
-    set_var_attribute(out_fname, 'latitude', 'valid_min', np.float64(-90))
-    set_var_attribute(out_fname, 'latitude', 'ioos_category', 'location')
-    set_var_attribute(out_fname, 'latitude', 'units', 'degrees_north')
-    set_var_attribute(out_fname, 'longitude', 'valid_max', np.float64(180))
-    set_var_attribute(out_fname, 'longitude', 'valid_min', np.float64(-180))
-    set_var_attribute(out_fname, 'longitude', 'ioos_category', 'location')
-    set_var_attribute(out_fname, 'longitude', 'units', 'degrees_east')
-    set_var_attribute(out_fname, 'altitude', 'valid_max', np.float64(1000))
-    set_var_attribute(out_fname, 'altitude', 'valid_min', np.float64(-1000))
-    set_var_attribute(out_fname, 'altitude', 'ioos_category', 'location')
-    set_var_attribute(out_fname, 'altitude', 'positive', 'up')
-    
-    set_var_attribute(out_fname, 'time', 'ioos_category', 'time')
-    set_var_attribute(out_fname, 'time', 'long_name', 'time')
-    set_var_attribute(out_fname, 'altitude', 'comment', 'unused')
-    set_var_attribute(out_fname, 'time', 'standard_name', 'time')
+    output.set_global_attribute('deployment_time', deployment_time)
+    output.set_global_attribute('retrieval_time', retrieval_time)
+    set_output_attributes(output)
+    output.set_var_attribute('time', 'standard_name', 'time')
     epoch_start = datetime(year=1970, month=1, day=1, tzinfo=pytz.utc)
-    set_var_attribute(out_fname, 'time', 'units', "milliseconds since " + epoch_start.strftime("%Y-%m-%d %H:%M:%S"))
+    output.set_var_attribute('time', 'units', "milliseconds since " + epoch_start.strftime("%Y-%m-%d %H:%M:%S"))
     # end attribute modifications
 
-    output.close()
+    return output
 
 
 def parse_time(fname, time_name):
@@ -498,25 +792,9 @@ def append_air_pressure(fname, pressure, air_fname = None):
 def append_depth(fname, depth, calc_type='storm_surge'):
     """Insert depth array into the netCDF file at fname"""
     
-    if calc_type == 'storm_surge':
-        comment = ('Low-passed water surface elevation computed by: '
-                   '1. Subtracting air pressure from the sea pressure '
-                   '2. Removing the mean '
-                   '3. Low-pass filtering forward using a 4th-order Butterworth filter'
-                   ' with a cutoff at 1 minute '
-                   '4. Filtering backward with the same filter to reduce phase errors '
-                   '5. Adding the mean back in to the time series '
-                   '6. Using the hydrostatic assumption to convert the pressure to water'
-                   ' surface height above the sensor orifice '
-                   '7. Adding surveyed-to-datum sensor orifice height'
-                   ' The files for the sea pressure and air pressure used to calculate water level'
-                   ' are identified by the properties sea_uuid and air_uuid respectively.')
-    else:
-        comment = ('The depth, computed using the variable "corrected '
-                   'water pressure".')
     name = 'water_surface_height_above_reference_datum'
      
-    append_variable(fname, name, depth, comment=comment,
+    append_variable(fname, name, depth, comment=depth_comment(calc_type),
                      long_name=name)
     
     # Get uuid (previously that of sea file), and add as property to water_level variable
@@ -524,6 +802,28 @@ def append_depth(fname, depth, calc_type='storm_surge'):
     set_var_attribute(fname, name, 'sea_uuid', sea_uuid)
     set_global_attribute(fname, 'uuid', str(uuid.uuid4()))
 
+
+def depth_comment(calc_type='storm_surge'):
+    """Comment of the water level variable added by append_depth"""
+
+    if calc_type == 'storm_surge':
+        return ('Low-passed water surface elevation computed by: '
+                '1. Subtracting air pressure from the sea pressure '
+                '2. Removing the mean '
+                '3. Low-pass filtering forward using a 4th-order Butterworth filter'
+                ' with a cutoff at 1 minute '
+                '4. Filtering backward with the same filter to reduce phase errors '
+                '5. Adding the mean back in to the time series '
+                '6. Using the hydrostatic assumption to convert the pressure to water'
+                ' surface height above the sensor orifice '
+                '7. Adding surveyed-to-datum sensor orifice height'
+                ' The files for the sea pressure and air pressure used to calculate water level'
+                ' are identified by the properties sea_uuid and air_uuid respectively.')
+    else:
+        return ('The depth, computed using the variable "corrected '
+                'water pressure".')
+
+
 def append_depth_qc(fname, sea_qc, air_qc):
     """Insert depth qc array"""
 
@@ -531,24 +831,15 @@ def append_depth_qc(fname, sea_qc, air_qc):
     air_name = "air_qc"
     air_comment = 'The depth_qc is a binary and of the (sea)pressure_qc and air_pressure_qc if an air file is used to calculate depth'
     depth_comment = 'The depth_qc is a binary and of the (sea)pressure_qc and air_pressure_qc'
-    flag_masks = '11111111 11111110 11111101 11111011 11110111'
-    flag_meanings =  "no_bad_data last_five_vals_identical, outside_valid_range, invalid_rate_of_change, interpolated_data"
 
-    if air_qc != None:
-        air_qc = [int(str(x),2) for x in air_qc]
-        sea_qc = [int(str(x),2) for x in sea_qc]
-
-        depth_qc = [bin(air_qc[x] & sea_qc[x])[2:] for x in range(0,len(sea_qc))]
-        
-        
-        append_variable(fname, air_name, [bin(x)[2:] for x in air_qc], comment=air_comment, long_name=air_name,
-                            flag_masks = flag_masks, flag_meanings= flag_meanings)
-            
-        append_variable(fname, depth_name, depth_qc, comment=depth_comment, long_name=depth_name,
-                         flag_masks = flag_masks, flag_meanings= flag_meanings)
+    if air_qc is not None:
+        air_qc = qc.as_flags(air_qc)
+        append_flags(fname, air_name, air_qc, comment=air_comment, long_name=air_name)
+        append_flags(fname, depth_name, qc.combine(sea_qc, air_qc), comment=depth_comment,
+                     long_name=depth_name)
     else:
-        append_variable(fname, depth_name, sea_qc, comment=depth_comment, long_name=depth_name,
-                         flag_masks = flag_masks, flag_meanings= flag_meanings)
+        append_flags(fname, depth_name, qc.as_flags(sea_qc), comment=depth_comment,
+                     long_name=depth_name)
 
 
 def get_water_depth(in_fname):
@@ -570,43 +861,75 @@ def get_depth(fname):
     return get_variable_data(fname, 'water_surface_height_above_reference_datum')
 
 
-def get_flags(fname):
+def get_flags(fname, begin=None, end=None, step=None):
     """Get the time array from the netCDF at fname"""
 
-    return get_variable_data(fname, 'pressure_qc')
+    return get_variable_data(fname, 'pressure_qc', begin, end, step)
 
 
-def get_time(fname):
+def get_time(fname, begin=None, end=None, step=None):
     """Get the time array from the netCDF at fname"""
 
-    return get_variable_data(fname, 'time')
+    return get_variable_data(fname, 'time', begin, end, step)
+
+
+def get_time_axis(fname, begin=None, end=None):
+    """Get the times [begin:end] from the netCDF at fname as a RegularTimeAxis when
+    every time is exactly the first time plus a multiple of the
+    time_coverage_resolution, otherwise as the array get_time reads. Whether the
+    file is regular is checked once per file, a block of times at a time."""
+
+    with _dataset_cache_lock:
+        cached = open_dataset(fname)
+        if cached.time_axis is None:
+            cached.time_axis = _regular_time_axis(cached)
+        if cached.time_axis is False:
+            return get_time(fname, begin, end)
+        return cached.time_axis[begin:end]
+
+
+def _regular_time_axis(cached):
+    time = cached.dataset.variables['time']
+    try:
+        step = 1000.0 / (1 / float(cached.global_attribute('time_coverage_resolution')[1:-1]))
+    except (AttributeError, ValueError, ZeroDivisionError, TypeError):
+        return False
+    if len(time) == 0 or not step > 0:
+        return False
+
+    axis = RegularTimeAxis(float(time[0]), step, len(time))
+    for start in range(0, len(time), TIME_AXIS_BLOCK):
+        block = time[start:start + TIME_AXIS_BLOCK]
+        if np.ma.is_masked(block) or \
+                not np.array_equal(np.ma.getdata(block), axis[start:start + TIME_AXIS_BLOCK].values):
+            return False
+    return axis
 
 
 def get_datetimes(fname):
     """Gets the time array and then converts them to date times"""
-    time = []
-    with Dataset(fname) as nc_file:
-        
-        time = num2date(nc_file.variables['time'][:],
-                        nc_file.variables['time'].units,
+    with _dataset_cache_lock:
+        cached = open_dataset(fname)
+        time = num2date(cached.dataset.variables['time'][:],
+                        cached.variable_attribute('time', 'units'),
                         only_use_cftime_datetimes=False,
                         only_use_python_datetimes=True)
     
     return time
 
 
-def get_air_pressure(fname):
+def get_air_pressure(fname, begin=None, end=None, step=None):
     """Get the air pressure array from the netCDF at fname"""
 
-    return get_variable_data(fname, 'air_pressure')
+    return get_variable_data(fname, 'air_pressure', begin, end, step)
 
-def get_pressure(fname):
+def get_pressure(fname, begin=None, end=None, step=None):
     """Get the water pressure array from the netCDF at fname"""
     
     try:
-        return get_variable_data(fname, 'sea_pressure')
+        return get_variable_data(fname, 'sea_pressure', begin, end, step)
     except:
-        return get_variable_data(fname, 'sea_water_pressure')
+        return get_variable_data(fname, 'sea_water_pressure', begin, end, step)
 
 
 def get_pressure_qc(fname):
@@ -683,57 +1006,185 @@ def get_device_depth(fname):
     return get_global_attribute(fname, 'device_depth')
 
 
-def get_variable_data(fname, variable_name):
-    """Get the values of a variable from a netCDF file."""
+def get_variable_data(fname, variable_name, begin=None, end=None, step=None):
+    """Get the values of a variable from a netCDF file, only the values
+    [begin:end:step] along its first dimension are read when any is given."""
+
+    with _dataset_cache_lock:
+        var = open_dataset(fname).dataset.variables[variable_name]
+        if begin is None and end is None and step is None:
+            return var[:]
+        return var[begin:end:step]
+
+
+def get_length(fname, variable_name='time'):
+    """Get the length of the first dimension of a variable without reading it"""
+
+    with _dataset_cache_lock:
+        return len(open_dataset(fname).dataset.variables[variable_name])
+
+
+def get_time_index(fname, time_ms, side='left'):
+    """Index of time_ms in the time variable of fname as np.searchsorted would
+    return it. The index is computed from the first time and the
+    time_coverage_resolution of the file and checked against the samples on
+    either side of it, only irregular records fall back to a bisection that
+    reads one time value per step."""
+
+    with _dataset_cache_lock:
+        time = open_dataset(fname).dataset.variables['time']
+        length = len(time)
+
+        def before(index):
+            if side == 'left':
+                return float(time[index]) < time_ms
+            return float(time[index]) <= time_ms
+
+        def is_index(index):
+            return (index == 0 or before(index - 1)) and (index == length or not before(index))
 
-    with Dataset(fname) as nc_file:
+        if length == 0:
+            return 0
+
+        try:
+            step = 1000.0 / get_frequency(fname)
+            offset = (time_ms - float(time[0])) / step
+            guess = np.floor(offset) + 1 if side == 'right' else np.ceil(offset)
+            guess = int(min(max(guess, 0), length))
+            if is_index(guess):
+                return guess
+        except (AttributeError, ValueError, ZeroDivisionError, TypeError):
+            pass
+
+        low, high = 0, length
+        while low < high:
+            middle = (low + high) // 2
+            if before(middle):
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+
+def get_time_range(fname, start_ms=None, end_ms=None):
+    """Return the (begin, end) index range of the samples of fname whose time
+    is within [start_ms, end_ms], either bound may be None"""
+
+    begin = 0 if start_ms is None else get_time_index(fname, start_ms, side='left')
+    end = get_length(fname) if end_ms is None else get_time_index(fname, end_ms, side='right')
+    return begin, max(begin, end)
+
+
+def get_variable_time_range(fname, variable_name, start_ms=None, end_ms=None):
+    """Get the values of a variable along time from start_ms to end_ms (in ms since
+    the epoch) reading only that hyperslab"""
+
+    begin, end = get_time_range(fname, start_ms, end_ms)
+    return get_variable_data(fname, variable_name, begin, end)
+
+
+def get_variable_blocks(fname, variable_name, block_size, begin=0, end=None):
+    """Yield the values of a variable from a netCDF file block_size values at a
+    time, the file is opened once and only one block is held in memory."""
+
+    cached = open_dataset(fname)
+    var = cached.dataset.variables[variable_name]
+    end = len(var) if end is None else min(end, len(var))
+    for start in range(begin, end, block_size):
+        with _dataset_cache_lock:
+            if not cached.dataset.isopen():
+                cached = open_dataset(fname)
+                var = cached.dataset.variables[variable_name]
+            block = var[start:min(start + block_size, end)]
+        yield block
+
+
+def set_variable_blocks(fname, variable_name, blocks, start=0):
+    """Write each block of an iterable to consecutive positions of an existing
+    variable of a netCDF file, return the number of values written."""
+
+    invalidate(fname)
+    with Dataset(fname, 'a') as nc_file:
         var = nc_file.variables[variable_name]
-        var_data = var[:]
-        return var_data
+        for block in blocks:
+            var[start:start + len(block)] = block
+            start += len(block)
+        return start
+
+
+class BlockWriter(object):
+    """Writes consecutive blocks of several variables along time into an
+    existing netCDF file that is kept open until close, e.g. one written by
+    a NetCDFBuilder with the time series data left empty"""
+
+    def __init__(self, fname):
+        self.fname = fname
+        self.position = 0
+        with _dataset_cache_lock:
+            invalidate(fname)
+            self.dataset = Dataset(fname, 'a')
+
+    def write(self, blocks):
+        """Write each {variable name: block} at the current position and
+        advance it by the length of the blocks"""
+        length = None
+        with _dataset_cache_lock:
+            for name in blocks:
+                block = blocks[name]
+                self.dataset.variables[name][self.position:self.position + len(block)] = block
+                length = len(block) if length is None else length
+        self.position += length or 0
+
+    def close(self):
+        with _dataset_cache_lock:
+            if self.dataset.isopen():
+                self.dataset.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
 
 
 def get_variable_attr(fname, variable_name, attr):
     """Get the values of a variable from a netCDF file."""
 
-    with Dataset(fname) as nc_file:
-        var = nc_file.variables[variable_name]
-        var_data = var.getncattr(attr)
-        return var_data
+    with _dataset_cache_lock:
+        return open_dataset(fname).variable_attribute(variable_name, attr)
 
 
 def get_global_attribute(fname, name):
     """Get the value of a global attibute from a netCDF file."""
 
-    with Dataset(fname) as nc_file:
-        attr = getattr(nc_file, name)
-        return attr
+    with _dataset_cache_lock:
+        return open_dataset(fname).global_attribute(name)
     
 def set_global_attribute(fname, name, value):
     """Get the value of a global attibute from a netCDF file."""
 
+    invalidate(fname)
     with Dataset(fname, 'a') as nc_file:
         setattr(nc_file, name, value)
 
 
 def print_attributes(fname):
-    with Dataset(fname, 'a') as nc_file:
-       
-        list = nc_file.ncattrs()
-        for x in list:
-            print(x, ':', get_global_attribute(fname, x))
-            
-        vars = nc_file.variables.keys()
-        for x in vars:
-            var = nc_file.variables[x]
-            var_attrs = var.ncattrs()
-            for y in var_attrs:
-                print(x,':', y, ':', get_variable_attr(fname, x, y))
+    cached = open_dataset(fname)
+
+    for x in cached.global_attributes:
+        print(x, ':', cached.global_attributes[x])
+
+    for x in cached.variable_attributes:
+        var_attrs = cached.variable_attributes[x]
+        for y in var_attrs:
+            print(x,':', y, ':', var_attrs[y])
 
 
 def set_variable_data(fname, variable_name, value):
     """Get the values of a variable from a netCDF file."""
 
-    with Dataset(fname) as nc_file:
+    invalidate(fname)
+    with Dataset(fname, 'a') as nc_file:
         var = nc_file.variables[variable_name]
         var[:] = value
 
@@ -741,72 +1192,94 @@ def set_variable_data(fname, variable_name, value):
 def set_var_attribute(fname, var_name, name, value):
     """Get the value of a global attibute from a netCDF file."""
 
+    invalidate(fname)
     with Dataset(fname, 'a') as nc_file:
         var = nc_file.variables[var_name]
         setattr(var, name, value)
 
 
 def create_dimension(fname, dim_name, dim_length):
+    invalidate(fname)
     with Dataset(fname, 'a') as nc_file:
         nc_file.create_dimension(fname, dim_name, dim_length)
 
 
 def append_variable(fname, standard_name, data, comment='',
-                     long_name='', flag_masks = None, flag_meanings = None, og_fname = None):
+                     long_name='', flag_masks = None, flag_meanings = None, og_fname = None,
+                     profile=None):
     """Append a new variable to an existing netCDF."""
 
+    invalidate(fname)
     with Dataset(fname, 'a', format='NETCDF4_CLASSIC') as nc_file:
-        pvar = nc_file.createVariable(standard_name, 'f8', ('time',))
-        
-        pvar.comment = comment
-        pvar.standard_name = standard_name
-        pvar.max = np.float64(1000)
-        pvar.min = np.float64(-1000)
-        pvar.short_name = standard_name
-        pvar.ancillary_variables = ''
-        pvar.add_offset = 0.0
-        pvar.coordinates = 'time latitude longitude altitude'
-        pvar.long_name = long_name
-        pvar.scale_factor = 1.0
-        if flag_masks != None:
-            pvar.flags_masks = flag_masks
-            pvar.flag_meanings = flag_meanings
-        if standard_name == 'water_surface_height_above_reference_datum':
-            pvar.units = 'meters'
-            pvar.nodc_name = 'WATER LEVEL'
-            pvar.ioos_category = 'sea_level'
-        else:
-            pvar.units = 'decibars'
-            pvar.nodc_name = 'PRESSURE'
-            pvar.ioos_category = 'pressure'
-        pvar.compression = 'not used at this time'
-        
-        #get instrument data if appending air pressure
-        if standard_name == 'air_pressure':
-            instr_dict = get_instrument_data(og_fname, 'air_pressure')
-            pvar.instrument_manufacturer = instr_dict['instrument_manufacturer']
-            pvar.instrument_make = instr_dict['instrument_make']
-            pvar.instrument_model = instr_dict['instrument_model']
-            pvar.instrument_serial_number = instr_dict['instrument_serial_number']
-
+        pvar = create_variable(nc_file, standard_name, 'f8', ('time',), profile=profile)
+        pvar.setncatts(appended_variable_attributes(standard_name, comment, long_name,
+                                                    flag_masks, flag_meanings, og_fname))
         pvar[:] = data
 
 
+def append_flags(fname, name, flags, comment='', long_name='', profile=None):
+    """Append a qc flag variable (see qc) to an existing netCDF."""
+
+    invalidate(fname)
+    with Dataset(fname, 'a', format='NETCDF4_CLASSIC') as nc_file:
+        var = create_variable(nc_file, name, qc.DATATYPE, ('time',), profile=profile)
+        attrs = qc.attributes(comment=comment)
+        attrs['long_name'] = long_name
+        attrs['coordinates'] = 'time latitude longitude altitude'
+        var.setncatts(attrs)
+        var[:] = qc.as_flags(flags)
+
+
+def appended_variable_attributes(standard_name, comment='', long_name='',
+                                 flag_masks = None, flag_meanings = None, og_fname = None):
+    """Attributes of a variable added with append_variable"""
+
+    attrs = OrderedDict()
+    attrs['comment'] = comment
+    attrs['standard_name'] = standard_name
+    attrs['max'] = np.float64(1000)
+    attrs['min'] = np.float64(-1000)
+    attrs['short_name'] = standard_name
+    attrs['ancillary_variables'] = ''
+    attrs['add_offset'] = 0.0
+    attrs['coordinates'] = 'time latitude longitude altitude'
+    attrs['long_name'] = long_name
+    attrs['scale_factor'] = 1.0
+    if flag_masks != None:
+        attrs['flags_masks'] = flag_masks
+        attrs['flag_meanings'] = flag_meanings
+    if standard_name == 'water_surface_height_above_reference_datum':
+        attrs['units'] = 'meters'
+        attrs['nodc_name'] = 'WATER LEVEL'
+        attrs['ioos_category'] = 'sea_level'
+    else:
+        attrs['units'] = 'decibars'
+        attrs['nodc_name'] = 'PRESSURE'
+        attrs['ioos_category'] = 'pressure'
+    attrs['compression'] = 'not used at this time'
+    
+    #get instrument data if appending air pressure
+    if standard_name == 'air_pressure':
+        attrs.update(get_instrument_data(og_fname, 'air_pressure'))
+
+    return attrs
+
+
 def get_instrument_data(fname, variable_name):
     """Get the values of a variable from a netCDF file."""
 
-    with Dataset(fname) as nc_file:
-        var = nc_file.variables[variable_name]
-        attr_dict = {
-            'instrument_manufacturer': getattr(var,'instrument_manufacturer'),
-            'instrument_make': getattr(var,'instrument_make'),
-            'instrument_model': getattr(var,'instrument_model'),
-            'instrument_serial_number': getattr(var, 'instrument_serial_number')
-        }
-        return attr_dict
+    cached = open_dataset(fname)
+    attr_dict = {
+        'instrument_manufacturer': cached.variable_attribute(variable_name, 'instrument_manufacturer'),
+        'instrument_make': cached.variable_attribute(variable_name, 'instrument_make'),
+        'instrument_model': cached.variable_attribute(variable_name, 'instrument_model'),
+        'instrument_serial_number': cached.variable_attribute(variable_name, 'instrument_serial_number')
+    }
+    return attr_dict
 
 
 def set_instrument_data(fname, variable_name, instr_dict):
+    invalidate(fname)
     with Dataset(fname,'a', format='NETCDF4_CLASSIC') as nc_file:
         var = nc_file.variables[variable_name]
         for x in instr_dict:
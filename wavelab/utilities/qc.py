@@ -0,0 +1,325 @@
+"""
+Quality control flags of pressure time series as uint8 bit masks.
+
+Every test owns one bit that is set when a sample passes it, so the flags of
+two series are combined with a bitwise and and 255 marks a sample that passed
+every test (the unused high bits are always set). The flags are stored as a
+byte variable (DATATYPE) with _Unsigned = "true" since NETCDF4_CLASSIC files
+have no unsigned types.
+"""
+from collections import OrderedDict
+import numpy as np
+import pandas as pd
+
+PASSED = 255
+STUCK_SENSOR = 1
+VALID_RANGE = 2
+RATE_OF_CHANGE = 4
+INTERPOLATED = 8
+BELOW_ORIFICE = 16
+SPIKE = 32
+ATTENUATED_SIGNAL = 64
+TIME_GAP = 128
+
+DATATYPE = 'i1'
+
+FLAGS = [(STUCK_SENSOR, 'stuck_sensor_test_passed'),
+         (VALID_RANGE, 'valid_range_test_passed'),
+         (RATE_OF_CHANGE, 'rate_of_change_test_passed'),
+         (INTERPOLATED, 'not_interpolated'),
+         (SPIKE, 'spike_test_passed'),
+         (ATTENUATED_SIGNAL, 'attenuated_signal_test_passed'),
+         (TIME_GAP, 'time_gap_test_passed')]
+SEA_FLAGS = sorted(FLAGS + [(BELOW_ORIFICE, 'water_level_above_sensor_orifice')])
+
+# the masks are stored as the (signed) bytes of the variable
+FLAG_MASKS = np.array([x[0] for x in FLAGS], dtype=np.uint8).view(np.int8)
+FLAG_MEANINGS = ' '.join(x[1] for x in FLAGS)
+
+SEA_FLAG_MASKS = np.array([x[0] for x in SEA_FLAGS], dtype=np.uint8).view(np.int8)
+SEA_FLAG_MEANINGS = ' '.join(x[1] for x in SEA_FLAGS)
+
+# the valid sea and air pressure ranges and the largest change between two
+# readings in dbar
+MEASURE_MIN = 0
+MEASURE_MAX = 50
+AIR_MEASURE_MAX = 20
+MAX_RATE_OF_CHANGE = 10
+
+BAD_DATA_MESSAGE = "There were some bad data points in the file, please cut them using chopper\n and/or" \
+                   " use the \"Hydrostatic\" method in the Water Level GUI"
+
+COMMENT = 'A set bit signifies the value passed the test and a cleared bit a failed test,' \
+          ' the bits of tests that were not run are set, 255 passed every test'
+
+
+def as_flags(qc):
+    """The qc as a uint8 bit mask array, qc may be flags, the binary strings of
+    older versions or the integers those were stored as (11111011 for 251)"""
+
+    qc = np.asarray(qc)
+    if qc.dtype.kind in 'SU':
+        qc = qc.astype(np.int64)
+    qc = np.asarray(qc, dtype=np.int64)
+
+    legacy = qc > PASSED
+    if np.any(legacy):
+        # the binary digits stored as a decimal integer, read back digit by digit
+        bits = np.zeros(qc.shape, dtype=np.int64)
+        for x in range(8):
+            bits |= ((qc // 10 ** x) % 10) << x
+        qc = np.where(legacy, bits, qc)
+    return qc.astype(np.uint8)
+
+
+def combine(*qc):
+    """The flags of samples that pass a test only if they pass it in every qc"""
+    return np.bitwise_and.reduce([as_flags(x) for x in qc])
+
+
+def attributes(flag_masks=FLAG_MASKS, flag_meanings=FLAG_MEANINGS, comment=COMMENT):
+    """The attributes of a flag variable"""
+    return {'_Unsigned': 'true',
+            'flag_masks': flag_masks,
+            'flag_meanings': flag_meanings,
+            'comment': comment}
+
+
+
+def clear(flags, failed, bit):
+    """Clear bit in the flags of the readings that failed, in place"""
+    flags &= ~(np.asarray(failed, dtype=bool).view(np.uint8) * np.uint8(bit))
+    return flags
+
+
+def run_tests(data, interpolate=False, air=False):
+    """Get the quality control flags of a pressure time series and whether any
+    reading failed a test. Readings outside the valid range and changes of more
+    than MAX_RATE_OF_CHANGE from the previous reading fail, every reading is
+    flagged as interpolated when interpolate is True. See QCSuite for the other
+    tests."""
+
+    data = np.asarray(data, dtype=np.float64)
+    upper = AIR_MEASURE_MAX if air else MEASURE_MAX
+
+    with np.errstate(invalid='ignore'):
+        out_of_range = (data > upper) | (data < MEASURE_MIN)
+        rate_of_change = np.zeros(data.shape, dtype=bool)
+        rate_of_change[1:] = np.abs(np.diff(data)) > MAX_RATE_OF_CHANGE
+
+    flags = np.full(data.shape, PASSED ^ INTERPOLATED if interpolate else PASSED, dtype=np.uint8)
+    clear(flags, out_of_range, VALID_RANGE)
+    clear(flags, rate_of_change, RATE_OF_CHANGE)
+
+    return flags, bool(out_of_range.any() or rate_of_change.any())
+
+
+def sliding_windows(data, window):
+    """Read only (len(data) - window + 1 x window) view of data, the row i holds
+    the readings i to i + window - 1"""
+    data = np.ascontiguousarray(data)
+    n_windows = max(len(data) - window + 1, 0)
+    stride = data.strides[0]
+    return np.lib.stride_tricks.as_strided(data, shape=(n_windows, window),
+                                           strides=(stride, stride), writeable=False)
+
+
+def flat_line_test(data, count=5, tolerance=0.0):
+    """Readings within tolerance of each of the count - 1 readings before them"""
+
+    data = np.asarray(data, dtype=np.float64)
+    failed = np.zeros(data.shape, dtype=bool)
+    if count < 2 or len(data) < count:
+        return failed
+
+    # every column of the windows is a view of data shifted by one more reading
+    windows = sliding_windows(data, count)
+    current = windows[:, -1]
+    flat = np.ones(len(windows), dtype=bool)
+    with np.errstate(invalid='ignore'):
+        for x in range(count - 1):
+            flat &= np.abs(windows[:, x] - current) <= tolerance
+    failed[count - 1:] = flat
+    return failed
+
+
+def spike_test(data, window=7, threshold=3.0, block_size=2**16):
+    """Readings more than threshold from the median of the window centered on
+    them, the window // 2 readings at either end are not tested"""
+
+    data = np.asarray(data, dtype=np.float64)
+    failed = np.zeros(data.shape, dtype=bool)
+    if len(data) < window:
+        return failed
+
+    # the medians of a block of windows at a time keep the copies np.median
+    # partitions small
+    windows = sliding_windows(data, window)
+    median = np.empty(len(windows))
+    for start in range(0, len(windows), block_size):
+        median[start:start + block_size] = np.median(windows[start:start + block_size], axis=1)
+
+    half = window // 2
+    with np.errstate(invalid='ignore'):
+        failed[half:half + len(median)] = np.abs(data[half:half + len(median)] - median) > threshold
+    return failed
+
+
+def attenuated_signal_test(data, window, min_std=0.0005):
+    """Readings whose trailing window of readings varies by less than min_std,
+    windows with fewer than half their readings valid are not tested"""
+
+    data = np.asarray(data, dtype=np.float64)
+    std = pd.Series(data).rolling(window, min_periods=max(window // 2, 2)).std().values
+    with np.errstate(invalid='ignore'):
+        return std < min_std
+
+
+def time_gap_test(time, step, factor=1.5):
+    """Readings more than factor time steps after the reading before them, or not
+    after it at all"""
+
+    time = np.asarray(time, dtype=np.float64)
+    failed = np.zeros(time.shape, dtype=bool)
+    gaps = np.diff(time)
+    failed[1:] = (gaps > factor * step) | (gaps <= 0)
+    return failed
+
+
+# the optional tests of QCSuite and the bit each clears
+TESTS = OrderedDict([('flat_line', STUCK_SENSOR),
+                     ('spike', SPIKE),
+                     ('attenuated_signal', ATTENUATED_SIGNAL),
+                     ('time_gap', TIME_GAP)])
+
+
+class QCSuite(object):
+    """The range and rate of change tests of run_tests and the QARTOD style flat
+    line, spike, attenuated signal and time gap tests in tests, every test runs
+    in linear time over the whole record.
+
+    flat_line_count and spike_window are in readings, attenuated_window in
+    seconds, the tolerances and thresholds in dbar and gap_factor in time steps."""
+
+    def __init__(self, tests=(), air=False, frequency=4, flat_line_count=5,
+                 flat_line_tolerance=0.0, spike_window=7, spike_threshold=3.0,
+                 attenuated_window=1800, attenuated_min_std=0.0005, gap_factor=1.5):
+        for name in tests:
+            if name not in TESTS:
+                raise ValueError("unknown qc test: %s" % name)
+
+        self.tests = list(tests)
+        self.air = air
+        self.frequency = frequency
+        self.flat_line_count = flat_line_count
+        self.flat_line_tolerance = flat_line_tolerance
+        self.spike_window = spike_window
+        self.spike_threshold = spike_threshold
+        self.attenuated_window = attenuated_window
+        self.attenuated_min_std = attenuated_min_std
+        self.gap_factor = gap_factor
+
+    def failed(self, name, data, time=None):
+        """The readings that failed the test name"""
+
+        if name == 'flat_line':
+            return flat_line_test(data, self.flat_line_count, self.flat_line_tolerance)
+        if name == 'spike':
+            return spike_test(data, self.spike_window, self.spike_threshold)
+        if name == 'attenuated_signal':
+            window = max(int(self.attenuated_window * self.frequency), 2)
+            return attenuated_signal_test(data, window, self.attenuated_min_std)
+        if name == 'time_gap':
+            if time is None:
+                return np.zeros(len(data), dtype=bool)
+            return time_gap_test(time, 1000.0 / self.frequency, self.gap_factor)
+        raise ValueError("unknown qc test: %s" % name)
+
+    def window(self):
+        """The (before, after) numbers of readings around a reading that its
+        tests look at"""
+
+        before, after = 1, 0
+        if 'flat_line' in self.tests:
+            before = max(before, self.flat_line_count - 1)
+        if 'spike' in self.tests:
+            before = max(before, self.spike_window // 2)
+            after = max(after, self.spike_window // 2)
+        if 'attenuated_signal' in self.tests:
+            before = max(before, max(int(self.attenuated_window * self.frequency), 2) - 1)
+        return before, after
+
+    def run(self, data, time=None, interpolate=False):
+        """Get the flags of a pressure time series with time in ms and whether
+        any reading failed a test"""
+
+        flags, bad_data = run_tests(data, interpolate, self.air)
+        for name in self.tests:
+            failed = self.failed(name, data, time)
+            clear(flags, failed, TESTS[name])
+            bad_data = bad_data or bool(failed.any())
+        return flags, bad_data
+
+
+class QCStream(object):
+    """Runs a QCSuite over a series that arrives a block at a time.
+
+    The readings a block's tests look at before it (the rate of change of its
+    first reading, the trailing windows) are carried over from the blocks
+    before, and the flags of its last readings wait for the readings after
+    them (the spike window), so the flags are those of QCSuite.run on the
+    whole series (up to the rounding of the rolling std). push returns the index of the first flag it returns and
+    flush the flags still waiting at the end of the series."""
+
+    def __init__(self, suite, interpolate=False):
+        self.suite = suite
+        self.interpolate = interpolate
+        self.before, self.after = suite.window()
+        self.data = np.zeros(0)
+        self.time = np.zeros(0)
+        self.gaps = np.zeros(0, dtype=bool)
+        # the index of data[0] in the series and the number of readings flagged
+        self.start = 0
+        self.done = 0
+        self.bad_data = False
+
+    def push(self, data, time=None, gaps=None):
+        """The index and flags of the readings whose flags are known once the
+        readings data (at time in ms) arrived. Readings marked in gaps are
+        tested as missing and fail the time gap test."""
+
+        data = np.asarray(data, dtype=np.float64)
+        if gaps is None:
+            gaps = np.zeros(len(data), dtype=bool)
+        self.data = np.concatenate((self.data, data))
+        self.gaps = np.concatenate((self.gaps, gaps))
+        if time is not None:
+            self.time = np.concatenate((self.time, time))
+        return self.flags(self.start + len(self.data) - self.after)
+
+    def flush(self):
+        """The index and flags of the readings still waiting for theirs"""
+        return self.flags(self.start + len(self.data))
+
+    def flags(self, end):
+        """Flag the readings up to end and drop the ones no later reading needs"""
+
+        begin = self.done
+        if end <= begin:
+            return begin, np.zeros(0, dtype=np.uint8)
+
+        with np.errstate(invalid='ignore'):
+            data = np.where(self.gaps, np.nan, self.data)
+        time = self.time if len(self.time) == len(self.data) else None
+        flags = self.suite.run(data, time, self.interpolate)[0][begin - self.start:end - self.start]
+        passed = PASSED ^ INTERPOLATED if self.interpolate else PASSED
+        self.bad_data = self.bad_data or bool(np.any(flags != passed))
+        clear(flags, self.gaps[begin - self.start:end - self.start], TIME_GAP)
+
+        keep = max(end - self.before - self.start, 0)
+        self.data, self.gaps = self.data[keep:], self.gaps[keep:]
+        if time is not None:
+            self.time = self.time[keep:]
+        self.start += keep
+        self.done = end
+        return begin, flags
@@ -0,0 +1,323 @@
+"""
+A regularly sampled time axis kept as its first time, time step and length
+instead of an array of milliseconds.
+"""
+import numbers
+import numpy as np
+from wavelab.utilities import unit_conversion as uc
+
+
+class RegularTimeAxis(object):
+    """The times t0 + i * dt in ms since the epoch (UTC) of a series of n samples.
+
+    Indexing a sample, finding the index of a time and slicing with a positive
+    step are O(1), a slice is another RegularTimeAxis. The ms array is only
+    built when the axis is used as an array (np.asarray, values, fancy
+    indexing). timezone and daylight_savings are the zone the date strings
+    are formatted in, as in uc.adjust_from_gmt."""
+
+    def __init__(self, t0, dt, n, timezone='GMT', daylight_savings=False):
+        if not dt > 0:
+            raise ValueError("time step must be positive: %s" % dt)
+        if n < 0:
+            raise ValueError("length must not be negative: %s" % n)
+
+        self.timezone = timezone
+        self.daylight_savings = daylight_savings
+        self.n = int(n)
+
+        # times are origin + (start + i * stride) * step so that slices give
+        # exactly the values of the axis they were taken from
+        self._origin = float(t0)
+        self._step = float(dt)
+        self._start = 0
+        self._stride = 1
+
+    @classmethod
+    def from_frequency(cls, start_ms, series_length, freq, timezone='GMT', daylight_savings=False):
+        """The axis of uc.generate_ms(start_ms, series_length, freq)"""
+        return cls(start_ms, 1000 / freq, series_length, timezone, daylight_savings)
+
+    @property
+    def t0(self):
+        return self._origin + self._start * self._step
+
+    @property
+    def dt(self):
+        return self._stride * self._step
+
+    @property
+    def frequency(self):
+        return 1000.0 / self.dt
+
+    @property
+    def shape(self):
+        return (self.n,)
+
+    @property
+    def values(self):
+        """The times as a float64 array of ms"""
+        return self._origin + (self._start + np.arange(self.n) * self._stride) * self._step
+
+    def __len__(self):
+        return self.n
+
+    def __array__(self, dtype=None, copy=None):
+        if dtype is None:
+            return self.values
+        return self.values.astype(dtype)
+
+    def __iter__(self):
+        return iter(self.values)
+
+    def __repr__(self):
+        return 'RegularTimeAxis(t0=%r, dt=%r, n=%r, timezone=%r)' % (self.t0, self.dt, self.n,
+                                                                    self.timezone)
+
+    def time(self, index):
+        """Time in ms of sample index, negative indexes count from the end"""
+        index = int(index)
+        if index < 0:
+            index += self.n
+        if index < 0 or index >= self.n:
+            raise IndexError("index %d is out of bounds for a time axis of length %d"
+                             % (index, self.n))
+        return np.float64(self._origin + (self._start + index * self._stride) * self._step)
+
+    def __getitem__(self, key):
+        if isinstance(key, (numbers.Integral, np.integer)):
+            return self.time(key)
+
+        if isinstance(key, slice):
+            start, stop, step = key.indices(self.n)
+            if step > 0:
+                axis = RegularTimeAxis(self._origin, self._step, len(range(start, stop, step)),
+                                       self.timezone, self.daylight_savings)
+                axis._start = self._start + start * self._stride
+                axis._stride = self._stride * step
+                return axis
+
+        return self.values[key]
+
+    def index(self, time_ms, side='left'):
+        """Index of time_ms as np.searchsorted(values, time_ms, side) would return it"""
+
+        def before(index):
+            if side == 'left':
+                return self.time(index) < time_ms
+            return self.time(index) <= time_ms
+
+        offset = (time_ms - self.t0) / self.dt
+        index = np.floor(offset) + 1 if side == 'right' else np.ceil(offset)
+        index = int(min(max(index, 0), self.n))
+
+        # the guess is off by at most one sample from rounding
+        while index > 0 and not before(index - 1):
+            index -= 1
+        while index < self.n and before(index):
+            index += 1
+        return index
+
+    def range(self, start_ms=None, end_ms=None):
+        """The (begin, end) index range of the samples within [start_ms, end_ms]"""
+        begin = 0 if start_ms is None else self.index(start_ms, side='left')
+        end = self.n if end_ms is None else self.index(end_ms, side='right')
+        return begin, max(begin, end)
+
+    def datestrings(self, fmt='%m/%d/%y %H:%M:%S', timezone=None, daylight_savings=None):
+        """The times formatted with fmt in the axis timezone, see uc.format_ms"""
+        if timezone is None:
+            timezone = self.timezone
+        if daylight_savings is None:
+            daylight_savings = self.daylight_savings
+        return uc.format_ms(self.values, timezone, daylight_savings, fmt)
+
+
+def time_step(ms, tolerance=1.0):
+    """The time step in ms of a series with the times ms and the number of steps
+    that differ from it by more than tolerance ms. The step is the one between
+    the first two times unless the median step disagrees with it."""
+
+    steps = np.diff(np.asarray(ms, dtype=np.float64))
+    if len(steps) == 0:
+        return np.nan, 0
+
+    step = np.median(steps)
+    if abs(steps[0] - step) <= tolerance:
+        step = steps[0]
+    return step, int(np.count_nonzero(np.abs(steps - step) > tolerance))
+
+
+class TimeGrid(object):
+    """Where the readings with the times ms fall on the regular time axis that
+    starts at the first of them and has step ms.
+
+    Every reading goes to the nearest sample of the axis, the first reading of
+    a sample is kept and later ones are duplicates, readings before the start
+    are dropped and samples no reading falls on are gaps. scatter lays a series
+    of readings on the axis with the gaps filled in one assignment."""
+
+    def __init__(self, ms, step, tolerance=1.0):
+        ms = np.asarray(ms, dtype=np.float64)
+        self.step = float(step)
+        self.t0 = ms[0] if len(ms) else 0.0
+        self.n_readings = len(ms)
+
+        position = (ms - self.t0) / self.step
+        index = np.round(position).astype(np.int64)
+        kept = np.flatnonzero(index >= 0)
+        self.dropped = len(ms) - len(kept)
+
+        # the reading kept at every sample of the axis it falls on
+        self.index, first = np.unique(index[kept], return_index=True)
+        self.readings = kept[first]
+        self.n = int(self.index[-1]) + 1 if len(self.index) else 0
+        self.duplicates = len(kept) - len(self.index)
+
+        self.filled = np.ones(self.n, dtype=bool)
+        self.filled[self.index] = False
+        self.max_jitter = float(np.max(np.abs(ms[self.readings] - (self.t0 + self.index * self.step)))) \
+            if len(self.readings) else 0.0
+        steps = np.diff(ms)
+        self.out_of_order = int(np.count_nonzero(steps < 0))
+        self.irregular_steps = int(np.count_nonzero(np.abs(steps - self.step) > tolerance))
+
+        # the readings are the axis when there is one per sample, in order
+        self.identity = self.n == len(self.index) == len(ms) and self.out_of_order == 0
+
+    def __len__(self):
+        return self.n
+
+    @property
+    def missing(self):
+        """The number of gap samples"""
+        return self.n - len(self.index)
+
+    def gaps(self):
+        """(first sample, number of samples) of every gap"""
+        edges = np.diff(np.concatenate(([0], self.filled.view(np.int8), [0])))
+        starts = np.flatnonzero(edges == 1)
+        return list(zip(starts.tolist(), (np.flatnonzero(edges == -1) - starts).tolist()))
+
+    def scatter(self, values, fill_value):
+        """The values of the readings on the axis with fill_value in the gaps"""
+
+        values = np.asarray(values)
+        if self.identity:
+            return values
+        grid = np.full(self.n, fill_value, dtype=np.result_type(values, np.float64))
+        grid[self.index] = values[self.readings]
+        return grid
+
+    def report(self):
+        """The gap statistics as a message, None if the readings are the axis"""
+
+        if self.identity:
+            return None
+        gaps = self.gaps()
+        return gap_report(self, len(gaps), max([x[1] for x in gaps]) if gaps else 0)
+
+
+def gap_report(grid, n_gaps, largest):
+    """The message of TimeGrid.report for a grid with n_gaps gaps, the largest
+    of them largest samples long"""
+
+    return "%d readings on a %g ms time step: %d gap(s) of %d samples in all (largest %g s)" \
+           " filled with the fill value, %d duplicate, %d out of order and %d dropped" \
+           " readings, largest jitter %g ms" \
+           % (grid.n_readings, grid.step, n_gaps, grid.missing, largest * grid.step / 1000,
+              grid.duplicates, grid.out_of_order, grid.dropped, grid.max_jitter)
+
+
+class StreamingTimeGrid(object):
+    """A TimeGrid of readings that arrive a block at a time, the regular time
+    axis starts at the first time of the first block and has step ms.
+
+    push lays the readings of a block on the axis from the sample after the
+    last one laid so far up to the last reading of the block. A reading that
+    falls on a sample an earlier block already laid is a duplicate, so out of
+    order readings only fill the gaps of their own block. The gap statistics
+    are kept as the blocks arrive and report gives the TimeGrid message."""
+
+    def __init__(self, step, tolerance=1.0):
+        self.step = float(step)
+        self.tolerance = tolerance
+        self.t0 = None
+        self.n = 0
+        self.n_readings = 0
+        self.n_kept = 0
+        self.dropped = 0
+        self.duplicates = 0
+        self.out_of_order = 0
+        self.irregular_steps = 0
+        self.max_jitter = 0.0
+        self.n_gaps = 0
+        self.largest_gap = 0
+        self.last_ms = None
+
+    def __len__(self):
+        return self.n
+
+    @property
+    def missing(self):
+        """The number of gap samples"""
+        return self.n - self.n_kept
+
+    @property
+    def identity(self):
+        """Whether the readings so far are the axis"""
+        return self.n == self.n_kept == self.n_readings and self.out_of_order == 0
+
+    def push(self, ms, values, fill_value):
+        """The samples of the axis the readings with the times ms of a block
+        add, whether each is a gap and the values on them with fill_value in
+        the gaps"""
+
+        ms = np.asarray(ms, dtype=np.float64)
+        values = np.asarray(values)
+        if self.t0 is None and len(ms):
+            self.t0 = ms[0]
+
+        steps = np.diff(ms if self.last_ms is None else np.concatenate(([self.last_ms], ms)))
+        self.out_of_order += int(np.count_nonzero(steps < 0))
+        self.irregular_steps += int(np.count_nonzero(np.abs(steps - self.step) > self.tolerance))
+        self.n_readings += len(ms)
+        if len(ms):
+            self.last_ms = ms[-1]
+
+        index = np.round((ms - self.t0) / self.step).astype(np.int64) if len(ms) else \
+            np.zeros(0, dtype=np.int64)
+        kept = np.flatnonzero(index >= self.n)
+        self.dropped += int(np.count_nonzero(index < 0))
+        self.duplicates += int(np.count_nonzero((index >= 0) & (index < self.n)))
+
+        # the reading kept at every new sample of the axis it falls on
+        unique, first = np.unique(index[kept], return_index=True)
+        readings = kept[first]
+        self.duplicates += len(kept) - len(unique)
+        self.n_kept += len(unique)
+        if len(readings):
+            self.max_jitter = max(self.max_jitter, float(np.max(
+                np.abs(ms[readings] - (self.t0 + unique * self.step)))))
+
+        begin = self.n
+        self.n = int(unique[-1]) + 1 if len(unique) else self.n
+        filled = np.ones(self.n - begin, dtype=bool)
+        filled[unique - begin] = False
+
+        # the gaps of a block end at a reading, they never run on into the next block
+        edges = np.diff(np.concatenate(([0], filled.view(np.int8), [0])))
+        lengths = np.flatnonzero(edges == -1) - np.flatnonzero(edges == 1)
+        self.n_gaps += len(lengths)
+        self.largest_gap = max([self.largest_gap] + lengths.tolist())
+
+        grid = np.full(self.n - begin, fill_value, dtype=np.result_type(values, np.float64))
+        grid[unique - begin] = values[readings]
+        return filled, grid
+
+    def report(self):
+        """The gap statistics as a message, None if the readings are the axis"""
+
+        if self.identity:
+            return None
+        return gap_report(self, self.n_gaps, self.largest_gap)
@@ -7,6 +7,7 @@ Also contains functions to convert dates to UTC seconds and milliseconds.
 """
 
 import numpy as np
+import pandas as pd
 import pytz
 from datetime import datetime
 from datetime import timedelta
@@ -65,6 +66,128 @@ def datestring_to_ms(datestring, datestring_fmt, tz = None, dst = None):
     return date_to_ms(date)
 
 
+def datestrings_to_ms(datestrings, datestring_fmt, tz=None, dst=None):
+    """Vectorized datestring_to_ms, returns a float64 array with the UTC
+    milliseconds of every date string"""
+
+    micro = parse_fixed_width(datestrings, datestring_fmt)
+    if micro is None:
+        dates = pd.to_datetime(pd.Series(np.asarray(datestrings)), format=datestring_fmt)
+        # whole microseconds like the datetimes of datestring_to_ms
+        micro = dates.values.astype('datetime64[us]').astype(np.int64)
+    micro = micro - gmt_offset_seconds(tz, dst) * 1000000
+    return micro / 1e6 * 1000
+
+
+# the most digits of the strftime fields parse_fixed_width reads
+FIXED_WIDTH_FIELDS = {'Y': 4, 'y': 2, 'm': 2, 'd': 2, 'H': 2, 'I': 2, 'M': 2, 'S': 2, 'f': 6}
+
+
+def fixed_width_columns(datestring, fmt):
+    """The (field, start, stop) character positions of the fields of fmt in
+    datestring and the positions of its literal characters, None if fmt has a
+    field parse_fixed_width can not read or does not match datestring"""
+
+    fields, literals, index, position = [], [], 0, 0
+    while index < len(fmt):
+        if fmt[index] == '%':
+            field = fmt[index + 1:index + 2]
+            if field == 'p':
+                width = 2
+            elif field in FIXED_WIDTH_FIELDS:
+                width = 0
+                while width < FIXED_WIDTH_FIELDS[field] and \
+                        datestring[position + width:position + width + 1].isdigit():
+                    width += 1
+            else:
+                return None
+            if width == 0:
+                return None
+            fields.append((field, position, position + width))
+            position += width
+            index += 2
+        else:
+            if datestring[position:position + 1] != fmt[index]:
+                return None
+            literals.append(position)
+            position += 1
+            index += 1
+
+    if position != len(datestring):
+        return None
+    return fields, literals
+
+
+def parse_fixed_width(datestrings, fmt):
+    """The microseconds since the epoch of date strings that all have the
+    characters of their fields in the same positions, read from the columns of
+    a character array. Returns None when they do not or a date is not valid,
+    the caller falls back to strptime."""
+
+    datestrings = np.asarray(datestrings)
+    if len(datestrings) == 0 or datestrings.dtype.kind not in 'OSU':
+        return None
+    try:
+        chars = datestrings.astype('S')
+    except (UnicodeEncodeError, TypeError, ValueError):
+        return None
+
+    first = chars[0].decode()
+    columns = fixed_width_columns(first, fmt)
+    if columns is None or chars.dtype.itemsize != len(first):
+        return None
+    fields, literals = columns
+
+    chars = chars.view(np.uint8).reshape(len(chars), len(first))
+    # every date as long as the first one and with the same literals
+    if not np.all(chars[:, -1]) or not np.all(chars[:, literals] == chars[0, literals]):
+        return None
+
+    values = {}
+    for field, start, stop in fields:
+        if field == 'p':
+            letters = chars[:, start:stop] | 32
+            pm = letters[:, 0] == ord('p')
+            if not np.all((pm | (letters[:, 0] == ord('a'))) & (letters[:, 1] == ord('m'))):
+                return None
+            values[field] = pm
+            continue
+
+        digits = chars[:, start:stop].astype(np.int64) - ord('0')
+        if np.any((digits < 0) | (digits > 9)):
+            return None
+        values[field] = digits.dot(10 ** np.arange(stop - start - 1, -1, -1))
+        if field == 'f':
+            values[field] *= 10 ** (6 - (stop - start))
+
+    if 'Y' in values:
+        year = values['Y']
+    elif 'y' in values:
+        year = np.where(values['y'] < 69, 2000, 1900) + values['y']
+    else:
+        year = np.full(len(chars), 1900)
+    month = values.get('m', 1)
+    day = values.get('d', 1)
+    hour = values.get('H', 0)
+    if 'I' in values:
+        if np.any((values['I'] < 1) | (values['I'] > 12)):
+            return None
+        hour = values['I'] % 12 + 12 * values.get('p', False)
+    minute = values.get('M', 0)
+    second = values.get('S', 0)
+
+    if np.any((month < 1) | (month > 12) | (day < 1) | (hour > 23) | (minute > 59) | (second > 59)):
+        return None
+    months = ((year - 1970) * 12 + month - 1).astype('datetime64[M]')
+    days = months.astype('datetime64[D]') + (day - 1)
+    # days past the end of their month
+    if np.any(days.astype('datetime64[M]') != months):
+        return None
+
+    seconds = days.astype(np.int64) * 86400 + hour * 3600 + minute * 60 + second
+    return seconds * 1000000 + values.get('f', 0)
+
+
 def date_to_ms(date):
     """Convert a datetime to UTC milliseconds."""
 
@@ -84,6 +207,15 @@ def generate_ms(start_ms, series_length, freq):
     return np.arange(start_ms, stop_ms, timestep, dtype='int64')
 
 
+def generate_ms_range(start_ms, begin, end, freq):
+    """The samples begin to end of generate_ms(start_ms, series_length, freq),
+    np.arange steps int64 times by the difference of its first two times"""
+
+    first = np.int64(start_ms)
+    step = np.int64(start_ms + 1000 / freq) - first
+    return first + np.arange(begin, end, dtype='int64') * step
+
+
 def convert_ms_to_datestring(ms, tzinfo, script = None):
     """Used when you want a date time string"""
 
@@ -128,28 +260,85 @@ def adjust_to_gmt(datetime, tzinfo, dst):
     return datetime
 
 
-def adjust_from_gmt(datetimes, tzinfo, dst):
-    if tzinfo == 'US/Eastern':
-        delta = timedelta(seconds = 18000)
-        datetimes = [x - delta for x in datetimes]
-    elif tzinfo == "US/Central":
-        delta = timedelta(seconds = 21600)
-        datetimes = [x - delta for x in datetimes]
-    elif tzinfo == "US/Mountain":
-        delta = timedelta(seconds = 25200)
-        datetimes = [x - delta for x in datetimes]
-    elif tzinfo == "US/Pacific":
-        delta = timedelta(seconds = 28800)
-        datetimes = [x - delta for x in datetimes]
-    elif tzinfo == "US/Aleutian" or tzinfo == "US/Hawaii":
-        delta = timedelta(seconds = 36000)
-        datetimes = [x - delta for x in datetimes]
-        
+# seconds behind GMT of the standard time of each timezone adjust_from_gmt supports
+GMT_OFFSETS = {
+    'US/Eastern': 18000,
+    'US/Central': 21600,
+    'US/Mountain': 25200,
+    'US/Pacific': 28800,
+    'US/Aleutian': 36000,
+    'US/Hawaii': 36000
+}
+
+
+def gmt_offset_seconds(tzinfo, dst):
+    """Seconds adjust_from_gmt adds to a GMT time for tzinfo"""
+
+    offset = -GMT_OFFSETS.get(tzinfo, 0)
     if dst is True:
-        delta = timedelta(seconds=3600)
-        datetimes = [x + delta for x in datetimes]
-        
-    return datetimes
+        offset += 3600
+    return offset
+
+
+def adjust_from_gmt(datetimes, tzinfo, dst):
+    offset = gmt_offset_seconds(tzinfo, dst)
+    if offset == 0:
+        return datetimes
+
+    delta = timedelta(seconds=offset)
+    return [x + delta for x in datetimes]
+
+
+# character positions in an iso 8601 date string of the strftime fields
+# format_ms can copy from it
+ISO_FIELDS = {'Y': (0, 4), 'y': (2, 4), 'm': (5, 7), 'd': (8, 10),
+              'H': (11, 13), 'M': (14, 16), 'S': (17, 19)}
+
+
+def iso_columns(fmt):
+    """The iso 8601 character position (or literal character) of every character
+    fmt formats to, None if fmt has a field that is not in ISO_FIELDS"""
+
+    columns, index = [], 0
+    while index < len(fmt):
+        if fmt[index] == '%':
+            field = fmt[index + 1:index + 2]
+            if field not in ISO_FIELDS:
+                return None
+            columns.extend(range(*ISO_FIELDS[field]))
+            index += 2
+        elif ord(fmt[index]) < 128:
+            columns.append(fmt[index])
+            index += 1
+        else:
+            return None
+    return columns or None
+
+
+def format_ms(ms, tzinfo=None, dst=None, fmt='%m/%d/%y %H:%M:%S'):
+    """Vectorized convert_ms_to_date, adjust_from_gmt and strftime, returns an
+    array with the date string of every time in ms"""
+
+    # datetimes are rounded to the microsecond like datetime.fromtimestamp
+    seconds = np.asarray(ms, dtype=np.float64).ravel() / 1000
+    whole = np.floor(seconds)
+    micro = np.round((seconds - whole) * 1e6).astype(np.int64)
+    micro += (whole.astype(np.int64) + gmt_offset_seconds(tzinfo, dst)) * 1000000
+
+    columns = iso_columns(fmt)
+    if columns is None:
+        return np.array([(EPOCH_START + timedelta(microseconds=int(x))).strftime(fmt)
+                         for x in micro])
+
+    iso = np.datetime_as_string(micro.view('datetime64[us]'), unit='s').astype('S19')
+    iso = iso.view(np.uint8).reshape(-1, 19)
+    chars = np.empty((len(micro), len(columns)), dtype=np.uint8)
+    for index, column in enumerate(columns):
+        if isinstance(column, str):
+            chars[:, index] = ord(column)
+        else:
+            chars[:, index] = iso[:, column]
+    return chars.view('S%d' % len(columns)).ravel().astype(str)
 
 
 def adjust_by_hours(datetimes, hours):
@@ -6,7 +6,7 @@ from datetime import datetime
 import pytz
 import numpy as np
 import uuid
-from wavelab.utilities import unit_conversion as uc
+from wavelab.utilities import unit_conversion as uc, nc, qc
 from numpy import float64
 
 VERSION = '1.3.0'
@@ -16,6 +16,7 @@ class DataStore(object):
     """Use this as an abstract data store, then pass a netCDF write stream to send data method"""
     def __init__(self, grouping):
         self.version = VERSION
+        self.output_profile = None
         self.utc_millisecond_data = None
         self.data_start_date = None
         self.data_end_date = None
@@ -122,11 +123,7 @@ class DataStore(object):
                         'scale_factor': 1.0,
                         'compression': "not used at this time",
                       }
-        self.z_var_qc = {
-                                'flag_masks': '11111111 11111110 11111101 11111011 11110111',
-                                'flag_meanings': "no_bad_data last_five_vals_identical, outside_valid_range, invalid_rate_of_change, interpolated_data",
-                                'comment': '1 signifies the value passed the test while a 0 flags a failed test, leading 1 is a placeholder'
-                                }
+        self.z_var_qc = qc.attributes()
         self.station_id = {
                                       'cf_role': 'time_series_id',
                                       'long_name': 'station identifier'
@@ -178,11 +175,11 @@ class DataStore(object):
                              'instrument_serial_number': "",
                              'instrument_level_accuracy_in_meters': "",
                              }
-        self.pressure_var_qc = {
-                                 'flag_masks': '11111111 11111110 11111101 11111011 11110111 11101111',
-                                'flag_meanings': "no_bad_data last_five_vals_identical, outside_valid_range, invalid_rate_of_change, interpolated_data, derived hydrostatic water level below sensor orifice elevation (for sea pressure files only)",
-                                 'comment': '1 signifies the value passed the test while a 0 flags a failed test, leading 1 is a placeholder,\n stuck sensor test (last_five_vals_identical) is temporarily turned off and thus its corresponding bit is always one'
-                                }
+        self.pressure_var_qc = qc.attributes(qc.SEA_FLAG_MASKS, qc.SEA_FLAG_MEANINGS,
+                                             qc.COMMENT + ',\n the stuck sensor, spike, attenuated'
+                                             ' signal and time gap tests only run when selected,\n the'
+                                             ' water_level_above_sensor_orifice bit is only'
+                                             ' used in sea pressure files')
         self.temp_var= {
                              'long_name': "sensor temperature record",
                              'standard_name': "temperature",
@@ -199,11 +196,7 @@ class DataStore(object):
                              'ioos_category': "Temperature",
                              'comment': "",
                              }
-        self.temp_var_qc = {
-                              'flag_masks': '11111111 11111110 11111101 11111011 11110111',
-                                'flag_meanings': "no_bad_data last_five_vals_identical, outside_valid_range, invalid_rate_of_change, interpolated_data",
-                             'comment': '1 signifies the value passed the test while a 0 flags a failed test, leading 1 is a placeholder'
-                            }
+        self.temp_var_qc = qc.attributes()
 
         self.global_vars_dict = {"cdm_data_type": "station",
                                  "comment": "not used at this time",
@@ -242,6 +235,13 @@ class DataStore(object):
 
     def send_data(self, ds):
 
+        self.send_series(ds)
+        self.send_metadata(ds)
+
+    def send_series(self, ds):
+        """Create the time, pressure and qc variables and write their data,
+        empty series along an unlimited time dimension are appended to later"""
+
         self.get_time_var(ds)
         self.get_pressure_var(ds)
 
@@ -251,6 +251,10 @@ class DataStore(object):
         if self.temperature_data is not None:
             self.get_temp_var(ds)
 
+    def send_metadata(self, ds):
+        """Create the location and station variables and write the global
+        attributes, the time coverage is read from the time variable of ds"""
+
         if type(self.z_data) != list:
             self.get_z_var(ds, False)
         else:
@@ -259,7 +263,7 @@ class DataStore(object):
             
         self.get_lat_var(ds)
         self.get_lon_var(ds)
-        self.get_time_duration()
+        self.get_time_duration(ds.variables['time'])
         self.global_vars_dict['title'] = 'Measure of pressure at %s degrees latitude, %s degrees longitude  by %s' \
         ' from the date range of %s to %s' % (self.latitude, self.longitude, self.global_vars_dict["creator_name"], \
                                                   self.global_vars_dict["time_coverage_start"], \
@@ -286,27 +290,29 @@ class DataStore(object):
 
     def get_instrument_var(self, ds):
 
-        instrument = ds.createVariable("instrument","i4")
+        instrument = nc.create_variable(ds, "instrument","i4", profile=self.output_profile)
         for x in self.instrument_var:
             instrument.setncattr(x,self.instrument_var[x])
 
     def get_time_var(self,ds):
 
-        time = ds.createVariable("time","f8",("time",))
+        time = nc.create_variable(ds, "time","f8",("time",), profile=self.output_profile)
         for x in self.time_var:
             time.setncattr(x,self.time_var[x])
         time[:] = self.utc_millisecond_data
 
     def get_lat_var(self, ds):
 
-        lat = ds.createVariable("latitude","f8",fill_value=self.fill_value)
+        lat = nc.create_variable(ds, "latitude","f8",
+                                 profile=self.output_profile, fill_value=self.fill_value)
         for x in self.lat_var:
             lat.setncattr(x,self.lat_var[x])
         lat[:] = self.latitude
 
     def get_lon_var(self, ds):
 
-        lon = ds.createVariable("longitude","f8",fill_value=self.fill_value)
+        lon = nc.create_variable(ds, "longitude","f8",
+                                 profile=self.output_profile, fill_value=self.fill_value)
         for x in self.lon_var:
             lon.setncattr(x,self.lon_var[x])
         lon[:] = self.longitude
@@ -314,11 +320,11 @@ class DataStore(object):
     def get_z_var(self, ds, time_dimen_bool=False):
 
         if time_dimen_bool is False:
-            z = ds.createVariable("altitude", "f8",
-                                  fill_value=self.fill_value)
+            z = nc.create_variable(ds, "altitude", "f8",
+                                   profile=self.output_profile, fill_value=self.fill_value)
         else:
-            z = ds.createVariable("altitude", "f8",("time",),
-                                  fill_value=self.fill_value)
+            z = nc.create_variable(ds, "altitude", "f8",("time",),
+                                   profile=self.output_profile, fill_value=self.fill_value)
         for x in self.z_var:
             z.setncattr(x,self.z_var[x])
         z[:] = self.z_data
@@ -326,16 +332,16 @@ class DataStore(object):
     def get_z_qc_var(self, ds):
 
         if self.z_name is not None:
-            z_qc = ds.createVariable(self.z_name,'i4',('time'))
+            z_qc = nc.create_variable(ds, self.z_name, qc.DATATYPE,('time'), profile=self.output_profile)
         else:
-            z_qc = ds.createVariable("altitude_qc",'i4',('time'))
+            z_qc = nc.create_variable(ds, "altitude_qc", qc.DATATYPE,('time'), profile=self.output_profile)
         for x in self.z_var_qc:
             z_qc.setncattr(x,self.z_var_qc[x])
-        z_qc[:] = self.z_qc_data
+        z_qc[:] = qc.as_flags(self.z_qc_data)
         
     def get_station_id(self, ds):
 
-        st_id = ds.createVariable('station_id','S1',('station_id'))
+        st_id = nc.create_variable(ds, 'station_id','S1',('station_id'), profile=self.output_profile)
         for x in self.station_id:
             st_id.setncattr(x,self.station_id[x])
         st_id[:] = list(self.global_vars_dict['stn_station_number'])
@@ -343,9 +349,9 @@ class DataStore(object):
     def get_pressure_var(self, ds):
 
         if self.pressure_name is not None:
-            pressure = ds.createVariable(self.pressure_name,"f8",("time",))
+            pressure = nc.create_variable(ds, self.pressure_name,"f8",("time",), profile=self.output_profile)
         else:
-            pressure = ds.createVariable("sea_water_pressure","f8",("time",))
+            pressure = nc.create_variable(ds, "sea_water_pressure","f8",("time",), profile=self.output_profile)
         for x in self.pressure_var:
             if self.pressure_var[x] is None:
                 pressure.setncattr(x,'N/A')
@@ -355,42 +361,42 @@ class DataStore(object):
 
     def get_pressure_qc_var(self, ds):
 
-        pressure_qc = ds.createVariable("pressure_qc",'i4',('time'))
+        pressure_qc = nc.create_variable(ds, "pressure_qc", qc.DATATYPE,('time'), profile=self.output_profile)
         for x in self.pressure_var_qc:
             pressure_qc.setncattr(x,self.pressure_var_qc[x])
-        pressure_qc[:] = self.pressure_qc_data
+        pressure_qc[:] = qc.as_flags(self.pressure_qc_data)
 
     def get_temperature_var(self, ds):
 
-        temperature = ds.createVariable("temperature_at_transducer","f8", ("time",))
+        temperature = nc.create_variable(ds, "temperature_at_transducer","f8", ("time",), profile=self.output_profile)
         for x in self.temperature_var:
             temperature.setncattr(x,self.temp_var[x])
         temperature[:] = self.temperature_data
 
     def get_temperature_qc_var(self, ds):
 
-        temperature_qc = ds.createVariable("temperature_qc",'i4',('time'))
+        temperature_qc = nc.create_variable(ds, "temperature_qc", qc.DATATYPE,('time'), profile=self.output_profile)
         for x in self.temp_var_qc:
             temperature_qc.setncattr(x,self.temp_var_qc[x])
-        temperature_qc[:] = self.temperature_qc_data
+        temperature_qc[:] = qc.as_flags(self.temperature_qc_data)
         
     def get_u_var(self, ds):
 
-        u = ds.createVariable("u", 'f8', ('time'))
+        u = nc.create_variable(ds, "u", 'f8', ('time'), profile=self.output_profile)
         for x in self.u_var:
             u.setncattr(x,self.u_var[x])
         u[:] = self.u_data
     
     def get_v_var(self, ds):
 
-        v = ds.createVariable("v",'f8',('time'))
+        v = nc.create_variable(ds, "v",'f8',('time'), profile=self.output_profile)
         for x in self.v_var:
             v.setncattr(x,self.v_var[x])
         v[:] = self.v_data
         
     def get_gust_var(self, ds):
 
-        gust = ds.createVariable("wind_gust", 'f8', ('time'))
+        gust = nc.create_variable(ds, "wind_gust", 'f8', ('time'), profile=self.output_profile)
         for x in self.gust_var:
             gust.setncattr(x,self.gust_var[x])
         gust[:] = self.gust_data
@@ -400,9 +406,11 @@ class DataStore(object):
             if self.global_vars_dict[x] is not None:
                 ds.setncattr(x,self.global_vars_dict[x])
 
-    def get_time_duration(self):
-        first_milli = self.utc_millisecond_data[0]
-        second_milli = self.utc_millisecond_data[-1]
+    def get_time_duration(self, time=None):
+        if time is None:
+            time = self.utc_millisecond_data
+        first_milli = time[0]
+        second_milli = time[-1]
         self.global_vars_dict["time_coverage_start"] = \
             uc.convert_ms_to_datestring(first_milli, pytz.utc)
 